@@ -4,6 +4,21 @@ import requests
 import time
 import json
 import datetime
+import codecs
+import hashlib
+import threading
+import itertools
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+from requests.adapters import HTTPAdapter
+from typing import NamedTuple, Optional, Tuple
+from collections import Counter
+from domain_index import DomainSuffixIndex
+from pipeline_metrics import PipelineMetrics, metrics_path_from_argv
+from rule_writer import write_rule_file
+from rule_hits import load_unhit_rules, select_unhit_rules, save_dropped_rules
+import rule_snapshot
+import input_fingerprint
 
 # 获取北京时间
 def get_beijing_time():
@@ -44,6 +59,16 @@ def get_beijing_time():
 # 文件路径配置
 COMBINED_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "Black.txt")
 WHITE_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "White.txt")
+# 白名单冲突报告默认路径（报告目录不入库）
+CONFLICT_REPORT_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "reports", "conflicts.json")
+# 源缓存目录：保存每个源清洗后的规则及其 ETag / Last-Modified 校验信息
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "cache", "sources")
+# 输入指纹文件（输入未变化时跳过处理，见 input_fingerprint.py）
+FINGERPRINT_FILE = input_fingerprint.FINGERPRINT_FILE
+# Black.txt 的二进制快照（解析结果，供精简脚本与规则匹配直接加载，见 rule_snapshot.py）
+SNAPSHOT_FILE = rule_snapshot.SNAPSHOT_FILE
+# 缓存格式版本，清洗逻辑变化时递增以使旧缓存失效
+CACHE_FORMAT_VERSION = 1
 
 # 黑名单源
 BLACKLIST_SOURCES = {
@@ -90,20 +115,26 @@ WHITELIST_SOURCES = {
 #    "冷漠白名单         　     ": "https://file-git.trli.club/file-hosts/allow/Domains",            暂时别用qq.com被白名单了
 #
 
-def remove_comments_and_blank_lines(rules):
-    """移除规则中的注释和空行（保留正则中的 ! 和 #）"""
-    result = []
-    for raw in rules:
+# 内联注释：以空白跟随的 ! 或 # 片段
+_INLINE_COMMENT_RE = re.compile(r"\s[!#].*$")
+
+def iter_clean_rules(lines):
+    """逐行移除注释和空行的生成器（保留正则中的 ! 和 #）"""
+    for raw in lines:
         line = raw.strip()
         # 跳过空行和以 ! 或 # 开头的整行注释
         if not line or line.startswith("!") or line.startswith("#"):
             continue
         # 仅移除以空白跟随的内联注释片段，例如："rule  # comment" 或 "rule  ! comment"
         # 避免误删正则中的 "?!"、"#[...]" 等模式
-        line = re.sub(r"\s[!#].*$", "", line).strip()
+        if "!" in line or "#" in line:
+            line = _INLINE_COMMENT_RE.sub("", line).strip()
         if line:
-            result.append(line)
-    return result
+            yield line
+
+def remove_comments_and_blank_lines(rules):
+    """移除规则中的注释和空行（保留正则中的 ! 和 #）"""
+    return list(iter_clean_rules(rules))
 
 def extract_whitelist_from_blacklist(blacklist_rules):
     """从黑名单规则中提取规则"""
@@ -124,55 +155,80 @@ def deduplicate_rules(rules):
             result.append(rule)
     return result
 
-def parse_rule_components(rule: str):
+# 规则解析用的预编译正则
+_HOSTS_RULE_RE = re.compile(r'(?:0\.0\.0\.0|127\.0\.0\.1|::1?)\s+([^\s#]+)')
+_RULE_DOMAIN_RE = re.compile(r'[^\^\$\s]+')
+_PLAIN_DOMAIN_RE = re.compile(r'[A-Za-z0-9.-]+\.[A-Za-z0-9.-]+')
+
+class ParsedRule(NamedTuple):
+    """单条规则的解析结果（NamedTuple 无实例字典，适合大量保存）"""
+    text: str
+    domain: Optional[str] = None
+    is_comment: bool = False
+    is_regex: bool = False
+    is_whitelist: bool = False
+    is_hosts: bool = False
+    is_basic_adguard: bool = False
+    has_modifiers: bool = False
+    modifiers: Tuple[str, ...] = ()
+
+    @property
+    def is_plain_domain(self) -> bool:
+        """是否为无修饰、非正则、无通配的纯域名规则"""
+        return bool(self.domain) and not self.has_modifiers and not self.is_regex and "*" not in self.domain
+
+def parse_rule(rule: str) -> ParsedRule:
+    """单次扫描解析规则，返回 ParsedRule"""
     s = rule.strip()
-    comps = {
-        "is_comment": s.startswith("#") or s.startswith("!"),
-        "is_regex": s.startswith("/") and s.endswith("/"),
-        "is_whitelist": s.startswith("@@"),
-        "is_hosts": False,
-        "is_basic_adguard": False,
-        "domain": None,
-        "has_modifiers": False,
-        "modifiers": []
-    }
-    if not s or comps["is_comment"]:
-        return comps
+    if not s:
+        return ParsedRule(s)
+    first = s[0]
+    if first == "#" or first == "!":
+        return ParsedRule(s, is_comment=True)
+    is_regex = first == "/" and s.endswith("/")
+    is_whitelist = s.startswith("@@")
     # hosts 格式
-    m = re.match(r'^(?:0\.0\.0\.0|127\.0\.0\.1|::1?)\s+([^\s#]+)', s)
-    if m:
-        comps["is_hosts"] = True
-        comps["domain"] = m.group(1).strip()
-        return comps
+    if first in "01:":
+        m = _HOSTS_RULE_RE.match(s)
+        if m:
+            return ParsedRule(s, m.group(1), is_regex=is_regex, is_whitelist=is_whitelist, is_hosts=True)
     # 是否包含修饰符
-    if "$" in s:
-        comps["has_modifiers"] = True
-        mods = s[s.find("$")+1:]
-        comps["modifiers"] = [x.strip() for x in mods.split(",") if x.strip()]
+    dollar = s.find("$")
+    has_modifiers = dollar >= 0
+    modifiers = tuple(x.strip() for x in s[dollar+1:].split(",") if x.strip()) if has_modifiers else ()
     # AdGuard 基本语法 ||domain^ 或 @@||domain^
-    if s.startswith("@@||"):
-        rest = s[4:]
-        dm = re.match(r'^([^\^\$\s]+)', rest)
+    start = 4 if s.startswith("@@||") else 2 if s.startswith("||") else -1
+    if start >= 0:
+        dm = _RULE_DOMAIN_RE.match(s, start)
         if dm:
-            comps["is_basic_adguard"] = True
-            comps["domain"] = dm.group(1)
-            return comps
-    if s.startswith("||"):
-        rest = s[2:]
-        dm = re.match(r'^([^\^\$\s]+)', rest)
-        if dm:
-            comps["is_basic_adguard"] = True
-            comps["domain"] = dm.group(1)
-            return comps
+            return ParsedRule(s, dm.group(), False, is_regex, is_whitelist, False, True, has_modifiers, modifiers)
     # 纯域名行（Domains-only syntax）
-    if ' ' not in s and not s.startswith('|'):
-        rest = s[2:] if s.startswith("@@") else s
-        dm = re.match(r'^([^\^\$\s]+)', rest)
+    domain = None
+    if ' ' not in s and first != '|':
+        dm = _RULE_DOMAIN_RE.match(s, 2 if is_whitelist else 0)
         if dm:
-            dom = dm.group(1)
-            if re.match(r'^[A-Za-z0-9.-]+\.[A-Za-z0-9.-]+$', dom) and "*" not in dom:
-                comps["domain"] = dom
-    return comps
+            dom = dm.group()
+            if "*" not in dom and _PLAIN_DOMAIN_RE.fullmatch(dom):
+                domain = dom
+    return ParsedRule(s, domain, False, is_regex, is_whitelist, False, False, has_modifiers, modifiers)
+
+def parse_rules(rules):
+    """批量解析规则（已解析的 ParsedRule 原样保留），供后续各阶段复用"""
+    return [rule if isinstance(rule, ParsedRule) else parse_rule(rule) for rule in rules]
+
+def parse_rule_components(rule: str):
+    """兼容旧接口：以字典形式返回 parse_rule 的解析结果"""
+    c = parse_rule(rule)
+    return {
+        "is_comment": c.is_comment,
+        "is_regex": c.is_regex,
+        "is_whitelist": c.is_whitelist,
+        "is_hosts": c.is_hosts,
+        "is_basic_adguard": c.is_basic_adguard,
+        "domain": c.domain,
+        "has_modifiers": c.has_modifiers,
+        "modifiers": list(c.modifiers)
+    }
 
 def format_whitelist_rule(rule):
     """白名单规则尽量保留原始格式；仅在缺少 @@ 时最小补全"""
@@ -196,76 +252,269 @@ def format_whitelist_rule(rule):
     # 其他情况保持原样
     return s
 
-def download_blacklist_sources():
+# 下载并发配置：整体线程数与单个主机的并发上限（替代固定的 sleep 限速）
+MAX_DOWNLOAD_WORKERS = 8
+PER_HOST_CONCURRENCY = 4
+DOWNLOAD_TIMEOUT = 30
+# 流式读取响应体的块大小
+DOWNLOAD_CHUNK_SIZE = 256 * 1024
+
+_http_session = None
+_host_semaphores = {}
+_download_lock = threading.Lock()
+
+def get_http_session():
+    """获取共享的 requests 会话（连接池复用 TLS 连接）"""
+    global _http_session
+    with _download_lock:
+        if _http_session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=MAX_DOWNLOAD_WORKERS, pool_maxsize=MAX_DOWNLOAD_WORKERS)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            _http_session = session
+        return _http_session
+
+def _get_host_semaphore(url):
+    """按主机名返回并发信号量，限制对同一主机的同时请求数"""
+    host = urlparse(url).netloc
+    with _download_lock:
+        if host not in _host_semaphores:
+            _host_semaphores[host] = threading.BoundedSemaphore(PER_HOST_CONCURRENCY)
+        return _host_semaphores[host]
+
+def _cache_paths(url):
+    """返回源缓存的规则文件与元数据文件路径（以 URL 哈希命名）"""
+    key = hashlib.sha1(url.encode("utf-8")).hexdigest()[:16]
+    return os.path.join(CACHE_DIR, key + ".txt"), os.path.join(CACHE_DIR, key + ".json")
+
+def load_cached_source(url):
+    """读取源缓存元数据，返回 (元数据, 规则文件路径)；缓存不存在或版本不符时返回 (None, None)"""
+    rules_path, meta_path = _cache_paths(url)
+    try:
+        with open(meta_path, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return None, None
+    if meta.get("version") != CACHE_FORMAT_VERSION or meta.get("url") != url or not os.path.exists(rules_path):
+        return None, None
+    return meta, rules_path
+
+def iter_cached_rules(rules_path):
+    """逐行读取缓存的清洗后规则"""
+    with open(rules_path, "r", encoding="utf-8") as f:
+        for line in f:
+            rule = line.rstrip("\n")
+            if rule:
+                yield rule
+
+def _write_atomic(path, write):
+    """先写临时文件再替换，避免中断时留下半截缓存"""
+    tmp_path = path + ".tmp"
+    try:
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            result = write(f)
+        os.replace(tmp_path, path)
+        return result
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+def store_source_rules(name, url, rules, response):
+    """把清洗后的规则流式写入缓存，并保存响应校验信息；返回 (规则文件路径, 规则数)"""
+    rules_path, meta_path = _cache_paths(url)
+    os.makedirs(CACHE_DIR, exist_ok=True)
+
+    def write_rules(f):
+        count = 0
+        for rule in rules:
+            f.write(rule + "\n")
+            count += 1
+        return count
+
+    count = _write_atomic(rules_path, write_rules)
+    meta = {
+        "version": CACHE_FORMAT_VERSION,
+        "name": name.strip(),
+        "url": url,
+        "etag": response.headers.get("ETag"),
+        "last_modified": response.headers.get("Last-Modified"),
+        "fetched_at": datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "rules": count,
+    }
+    try:
+        _write_atomic(meta_path, lambda f: f.write(json.dumps(meta, ensure_ascii=False, indent=2)))
+    except OSError as e:
+        # 元数据写入失败只影响下次的条件请求，不影响本次规则
+        print(f"写入缓存元数据失败 {name} ({url}): {e}")
+    return rules_path, count
+
+def iter_response_lines(response):
+    """流式读取响应体：按块增量解码并按 \\n 切分，不在内存中保留完整响应"""
+    decoder = codecs.getincrementaldecoder(response.encoding or "utf-8")(errors="replace")
+    pending = ""
+    for chunk in response.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE):
+        pending += decoder.decode(chunk)
+        lines = pending.split("\n")
+        pending = lines.pop()
+        yield from lines
+    pending += decoder.decode(b"", final=True)
+    if pending:
+        yield pending
+
+def fetch_source(name, url, offline=False):
+    """下载单个规则源并清洗，返回包含缓存规则文件路径、规则数与耗时的结果字典
+
+    响应体按块流式解码、清洗并写入缓存文件，不保留整份响应文本；
+    带上缓存的 ETag / Last-Modified 发送条件请求，304 时直接复用缓存的清洗结果；
+    离线模式只读缓存。
+    """
+    result = {"name": name, "url": url, "path": None, "count": 0, "elapsed": 0.0, "cpu": 0.0, "error": None, "status": "下载"}
+    start = time.perf_counter()
+    start_cpu = time.thread_time()
+    meta, cached_path = load_cached_source(url)
+    try:
+        if offline:
+            if cached_path is None:
+                raise RuntimeError("离线模式下没有可用缓存")
+            result["status"] = "缓存"
+        else:
+            headers = {}
+            if cached_path is not None:
+                if meta.get("etag"):
+                    headers["If-None-Match"] = meta["etag"]
+                if meta.get("last_modified"):
+                    headers["If-Modified-Since"] = meta["last_modified"]
+            with _get_host_semaphore(url):
+                with get_http_session().get(url, timeout=DOWNLOAD_TIMEOUT, headers=headers, stream=True) as response:
+                    if response.status_code == 304 and cached_path is not None:
+                        result["status"] = "未修改"
+                    else:
+                        response.raise_for_status()
+                        # 处理不同格式的规则文件，并移除注释和空行
+                        result["path"], result["count"] = store_source_rules(
+                            name, url, iter_clean_rules(iter_response_lines(response)), response)
+    except Exception as e:
+        if not offline and cached_path is not None:
+            # 下载失败时回退到上次成功的缓存，避免整个源的规则丢失
+            print(f"下载 {name} 失败 ({url}): {e}，改用缓存")
+            result["status"] = "缓存"
+        else:
+            result["error"] = e
+    if result["status"] != "下载":
+        result["path"], result["count"] = cached_path, meta.get("rules", 0)
+    result["elapsed"] = time.perf_counter() - start
+    result["cpu"] = time.thread_time() - start_cpu
+    return result
+
+def fetch_sources(sources, offline=False):
+    """并发下载多个规则源（(名称, 地址) 序列），结果按源的定义顺序返回（保证输出稳定）"""
+    items = list(sources)
+    if not items:
+        return []
+    workers = min(MAX_DOWNLOAD_WORKERS, len(items))
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(fetch_source, name, url, offline) for name, url in items]
+        results = [future.result() for future in futures]
+
+    for r in results:
+        if r["error"] is None:
+            print(f"成功获取 {r['name']}（{r['status']}），获取到 {r['count']} 条规则，耗时 {r['elapsed']:.2f} 秒")
+        else:
+            print(f"下载 {r['name']} 失败 ({r['url']}): {r['error']}，耗时 {r['elapsed']:.2f} 秒")
+    return results
+
+def iter_source_rules(results):
+    """按源顺序逐条读出下载结果中的规则（从缓存文件流式读取）"""
+    for r in results:
+        if r["path"]:
+            yield from iter_cached_rules(r["path"])
+
+def collect_source_rules(black_results, white_results):
+    """流式读取各源规则，插入时去重（dict 作为有序集合），返回 (黑名单, 白名单)
+
+    黑名单源中的 @@ 规则直接归入白名单，结果与"先提取、再拼接、再去重"完全一致，
+    但不再保留未去重的完整规则列表。
+    """
+    blacklist = {}
+    whitelist = {}
+    black_total = 0
+    extracted_total = 0
+    for rule in iter_source_rules(black_results):
+        # 假设白名单规则在黑名单中以特定格式存在，例如以@@开头（AdGuard格式）
+        if rule.startswith("@@"):
+            whitelist[rule] = None
+            extracted_total += 1
+        else:
+            blacklist[rule] = None
+            black_total += 1
+    print(f"从黑名单中提取的白名单规则数量: {extracted_total}")
+    print(f"过滤后的黑名单规则数量: {black_total}")
+    print(f"去重后的黑名单规则数量: {len(blacklist)}")
+
+    downloaded_total = 0
+    for rule in iter_source_rules(white_results):
+        whitelist[rule] = None
+        downloaded_total += 1
+    print(f"下载的白名单规则数量: {downloaded_total}")
+    print(f"合并去重后的白名单规则数量: {len(whitelist)}")
+    return list(blacklist), list(whitelist)
+
+def source_rules_by_url(results, urls):
+    """从下载结果中读出指定地址的源规则，返回 {地址: 规则列表}（没有可用结果的地址不出现）"""
+    wanted = set(urls)
+    return {r["url"]: list(iter_cached_rules(r["path"])) for r in results if r["url"] in wanted and r["path"]}
+
+def download_all_sources(offline=False):
+    """在同一个线程池中并发下载全部黑名单与白名单源（offline=True 时仅使用缓存）
+
+    返回 (黑名单源结果, 白名单源结果)，规则本身留在缓存文件中，由 iter_source_rules 流式读取。
+    """
+    print(f"开始并发下载 {len(BLACKLIST_SOURCES)} 个黑名单源和 {len(WHITELIST_SOURCES)} 个白名单源...")
+    start = time.perf_counter()
+    black_items = list(BLACKLIST_SOURCES.items())
+    results = fetch_sources(black_items + list(WHITELIST_SOURCES.items()), offline)
+    elapsed = time.perf_counter() - start
+    slowest = max((r["elapsed"] for r in results), default=0.0)
+    print(f"全部源下载完成，总耗时 {elapsed:.2f} 秒（最慢单源 {slowest:.2f} 秒）")
+
+    black_results, white_results = results[:len(black_items)], results[len(black_items):]
+    print(f"黑名单源共获取到 {sum(r['count'] for r in black_results)} 条规则，"
+          f"白名单源共获取到 {sum(r['count'] for r in white_results)} 条规则")
+    return black_results, white_results
+
+def download_blacklist_sources(offline=False):
     """下载所有黑名单源的规则"""
-    all_blacklist_rules = []
-    
     print(f"开始下载 {len(BLACKLIST_SOURCES)} 个黑名单源...")
-    
-    for name, url in BLACKLIST_SOURCES.items():
-        try:
-            print(f"正在下载 {name} ({url})...")
-            response = requests.get(url, timeout=30)  # 增加超时时间
-            response.raise_for_status()
-            
-            # 处理不同格式的规则文件
-            rules = response.text.split("\n")
-            # 移除注释和空行
-            cleaned_rules = remove_comments_and_blank_lines(rules)
-            
-            all_blacklist_rules.extend(cleaned_rules)
-            print(f"成功下载 {name}，获取到 {len(cleaned_rules)} 条规则")
-            
-            # 添加延迟以避免请求过于频繁
-            time.sleep(1)
-        except Exception as e:
-            print(f"下载 {name} 失败 ({url}): {e}")
-    
+    all_blacklist_rules = list(iter_source_rules(fetch_sources(BLACKLIST_SOURCES.items(), offline)))
     print(f"所有黑名单源下载完成，共获取到 {len(all_blacklist_rules)} 条规则")
     return all_blacklist_rules
 
-def download_whitelist_sources():
+def download_whitelist_sources(offline=False):
     """下载所有白名单源的规则"""
-    all_whitelist_rules = []
-    
     print(f"开始下载 {len(WHITELIST_SOURCES)} 个白名单源...")
-    
-    for name, url in WHITELIST_SOURCES.items():
-        try:
-            print(f"正在下载 {name} ({url})...")
-            response = requests.get(url, timeout=30)  # 增加超时时间
-            response.raise_for_status()
-            
-            # 处理不同格式的规则文件
-            rules = response.text.split("\n")
-            # 移除注释和空行
-            cleaned_rules = remove_comments_and_blank_lines(rules)
-            
-            all_whitelist_rules.extend(cleaned_rules)
-            print(f"成功下载 {name}，获取到 {len(cleaned_rules)} 条规则")
-            
-            # 添加延迟以避免请求过于频繁
-            time.sleep(1)
-        except Exception as e:
-            print(f"下载 {name} 失败 ({url}): {e}")
-    
+    all_whitelist_rules = list(iter_source_rules(fetch_sources(WHITELIST_SOURCES.items(), offline)))
     print(f"所有白名单源下载完成，共获取到 {len(all_whitelist_rules)} 条规则")
     return all_whitelist_rules
 
 def extract_domains_from_rules(rules, is_whitelist=False):
-    """从规则中提取域名（黑名单仅统计无修饰的纯域名规则）"""
+    """从规则中提取域名（黑名单仅统计无修饰的纯域名规则）；规则可为文本或 ParsedRule"""
     domains = set()
     for rule in rules:
-        c = parse_rule_components(rule)
-        if c["domain"] and "*" not in c["domain"]:
-            if not is_whitelist and (c["has_modifiers"] or c["is_regex"]):
+        c = rule if isinstance(rule, ParsedRule) else parse_rule(rule)
+        if c.domain and "*" not in c.domain:
+            if not is_whitelist and (c.has_modifiers or c.is_regex):
                 continue
-            domains.add(c["domain"])
+            domains.add(c.domain)
     return domains
 
 def remove_conflicting_rules(blacklist_rules, whitelist_rules):
-    """移除重复并报告潜在冲突（不删除高级规则，避免误伤）"""
-    blacklist_domains = extract_domains_from_rules(blacklist_rules, is_whitelist=False)
+    """移除重复并报告潜在冲突（不删除高级规则，避免误伤）
+
+    规则可为文本或 ParsedRule；每条规则只解析一次，返回值保持传入的类型。
+    """
+    parsed_blacklist = parse_rules(blacklist_rules)
+    blacklist_domains = extract_domains_from_rules(parsed_blacklist, is_whitelist=False)
     whitelist_domains = extract_domains_from_rules(whitelist_rules, is_whitelist=True)
     conflicting_domains = blacklist_domains.intersection(whitelist_domains)
     print(f"发现 {len(conflicting_domains)} 个潜在冲突域名（保留两侧规则，避免误删）")
@@ -273,12 +522,11 @@ def remove_conflicting_rules(blacklist_rules, whitelist_rules):
     # 黑名单：仅对无修饰的纯域名按域名去重；保留带修饰/正则/通配的高级规则
     filtered_blacklist = []
     processed_domains = set()
-    for rule in blacklist_rules:
-        c = parse_rule_components(rule)
-        if c["domain"] and not c["has_modifiers"] and not c["is_regex"] and "*" not in c["domain"]:
-            if c["domain"] in processed_domains:
+    for rule, c in zip(blacklist_rules, parsed_blacklist):
+        if c.is_plain_domain:
+            if c.domain in processed_domains:
                 continue
-            processed_domains.add(c["domain"])
+            processed_domains.add(c.domain)
         filtered_blacklist.append(rule)
 
     # 白名单保持原样（已在上游做文本去重）
@@ -287,6 +535,126 @@ def remove_conflicting_rules(blacklist_rules, whitelist_rules):
 
     return filtered_blacklist, filtered_whitelist
 
+def is_parent_block_rule(c: ParsedRule) -> bool:
+    """是否为可覆盖全部子域的 ||domain^ 基础拦截规则（无修饰、非白名单、域名合法）"""
+    return (c.is_basic_adguard and not c.is_whitelist and not c.has_modifiers
+            and c.text == f"||{c.domain}^" and _PLAIN_DOMAIN_RE.fullmatch(c.domain) is not None)
+
+def is_exact_domain_block_rule(c: ParsedRule) -> bool:
+    """是否为只拦截某个域名（及其子域）的黑名单规则：||domain^、纯域名行或 0.0.0.0 domain 形式的 hosts 行
+
+    ||ads.example.com、||ads.example.com| 与 ||ads.example.com/path 等没有 ^ 结尾的写法按子串匹配，
+    还会拦截 ads.example.community 等其他域名，不能视为被父域或白名单完全覆盖。
+    """
+    if not c.domain or c.is_whitelist or c.is_regex or c.has_modifiers or _PLAIN_DOMAIN_RE.fullmatch(c.domain) is None:
+        return False
+    if c.is_hosts:
+        return len(c.text.split()) == 2
+    if c.is_basic_adguard:
+        return c.text == f"||{c.domain}^"
+    return c.text == c.domain
+
+def prune_covered_subdomains(blacklist_rules):
+    """删除已被父域 ||domain^ 规则覆盖的子域规则
+
+    AdGuard 的 || 锚点本身就会匹配所有子域，因此在 ||example.com^ 存在时，
+    ||ads.example.com^、ads.example.com、0.0.0.0 ads.example.com 都是冗余的；
+    没有 ^ 结尾的 ||ads.example.com 等写法还会匹配其他域名，予以保留（见 is_exact_domain_block_rule）。
+    规则可为文本或 ParsedRule，返回 (保留的规则, 报告字典)，保留的规则类型与传入一致。
+    """
+    parsed = parse_rules(blacklist_rules)
+    parents = DomainSuffixIndex(c.domain for c in parsed if is_parent_block_rule(c))
+
+    kept = []
+    removed_by_parent = Counter()
+    for rule, c in zip(blacklist_rules, parsed):
+        if is_exact_domain_block_rule(c):
+            # 父域规则自身只检查严格父域，其余纯域名规则连同自身域名一起检查
+            covering = parents.find_covering(c.domain, include_self=not is_parent_block_rule(c))
+            if covering is not None:
+                removed_by_parent[covering[0]] += 1
+                continue
+        kept.append(rule)
+
+    removed = sum(removed_by_parent.values())
+    report = {
+        "parent_rules": len(parents),
+        "removed": removed,
+        "top_parents": removed_by_parent.most_common(10),
+    }
+    print(f"子域冗余规则清理: 父域规则 {len(parents)} 条，删除被覆盖的子域规则 {removed} 条")
+    for domain, count in report["top_parents"][:5]:
+        print(f"  ||{domain}^ 覆盖了 {count} 条规则")
+    return kept, report
+
+def is_full_allow_rule(c: ParsedRule) -> bool:
+    """是否为无条件的 @@||domain^ 白名单规则（对该域及全部子域完全放行）
+
+    仅带 $important 的白名单规则优先级更高，同样视为完全放行。
+    """
+    return (c.is_basic_adguard and c.is_whitelist
+            and all(m == "important" for m in c.modifiers)
+            and _PLAIN_DOMAIN_RE.fullmatch(c.domain) is not None)
+
+def resolve_whitelist_conflicts(blacklist_rules, whitelist_rules, prune=True, report_file=None):
+    """找出被同域或父域 @@ 规则完全抵消的黑名单规则，并（prune=True 时）将其删除
+
+    白名单中无条件放行的 @@||domain^ 规则建立后缀索引；黑名单中 ||domain^、纯域名行与 hosts 行
+    （见 is_exact_domain_block_rule）若落在某条白名单规则之下，在 AdGuard Home 中永远不会生效，可以安全删除。
+    带修饰符（如 $important）、正则、通配以及没有 ^ 结尾的 ||domain 等规则还可能拦截白名单之外的域名，
+    只记入报告，不会删除。
+    规则可为文本或 ParsedRule，返回 (保留的规则, 报告字典)，保留的规则类型与传入一致。
+    """
+    parsed_whitelist = parse_rules(whitelist_rules)
+    allow_index = DomainSuffixIndex()
+    for c in parsed_whitelist:
+        if is_full_allow_rule(c):
+            allow_index.add(c.domain, c.text)
+    whitelist_domains = extract_domains_from_rules(parsed_whitelist, is_whitelist=True)
+
+    parsed_blacklist = parse_rules(blacklist_rules)
+    kept = []
+    shadowed = []
+    overlapping = []
+    for rule, c in zip(blacklist_rules, parsed_blacklist):
+        if c.domain and "*" not in c.domain and not c.is_whitelist:
+            covering = allow_index.find_covering(c.domain)
+            if covering is not None:
+                entry = {"rule": c.text, "domain": c.domain, "whitelist_rule": covering[1], "whitelist_domain": covering[0]}
+                if is_exact_domain_block_rule(c):
+                    shadowed.append(entry)
+                    if prune:
+                        continue
+                else:
+                    overlapping.append(entry)
+            elif c.domain in whitelist_domains:
+                # 同域白名单带修饰符，只在部分情况下放行，两侧都保留
+                overlapping.append({"rule": c.text, "domain": c.domain, "whitelist_rule": None, "whitelist_domain": c.domain})
+        kept.append(rule)
+
+    report = {
+        "generated_at": datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "pruned": prune,
+        "allow_rules_indexed": len(allow_index),
+        "shadowed_count": len(shadowed),
+        "overlapping_count": len(overlapping),
+        "shadowed": shadowed,
+        "overlapping": overlapping,
+    }
+    action = "已删除" if prune else "未删除（仅报告）"
+    print(f"白名单冲突处理: 索引 {len(allow_index)} 条 @@ 规则，{len(shadowed)} 条黑名单规则被完全抵消{action}，"
+          f"{len(overlapping)} 条高级规则与白名单重叠（保留）")
+
+    if report_file:
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(report_file)), exist_ok=True)
+            with open(report_file, "w", encoding="utf-8") as f:
+                json.dump(report, f, ensure_ascii=False, indent=2)
+            print(f"冲突报告已写入: {report_file}")
+        except OSError as e:
+            print(f"写入冲突报告失败 {report_file}: {e}")
+    return kept, report
+
 def process_rules(rules):
     """处理规则，去除不需要的内容"""
     original_rules = []  # 原规则
@@ -321,136 +689,249 @@ def process_rules(rules):
     final_rules = usable_extracted + usable_original
     return final_rules
 
-def main(generate_white_file=True, override_time: str = None):
-    print("开始处理AdGuardHome规则...")
-    
-    # 获取当前北京时间或使用传入的统一时间戳
-    current_time = override_time if override_time else get_beijing_time()
-    
-    # 下载所有黑名单源
-    blacklist_rules = download_blacklist_sources()
-    
-    # 从黑名单中提取白名单规则
-    filtered_blacklist, extracted_whitelist = extract_whitelist_from_blacklist(blacklist_rules)
-    print(f"从黑名单中提取的白名单规则数量: {len(extracted_whitelist)}")
-    print(f"过滤后的黑名单规则数量: {len(filtered_blacklist)}")
-    
-    # 黑名单去重
-    deduplicated_blacklist = deduplicate_rules(filtered_blacklist)
-    print(f"去重后的黑名单规则数量: {len(deduplicated_blacklist)}")
-    
-    # 下载白名单源
-    downloaded_whitelist = download_whitelist_sources()
-    print(f"下载的白名单规则数量: {len(downloaded_whitelist)}")
-    
-    # 合并提取的白名单和下载的白名单
-    merged_whitelist = extracted_whitelist + downloaded_whitelist
-    
-    # 去重
-    deduplicated_whitelist = deduplicate_rules(merged_whitelist)
-    print(f"合并去重后的白名单规则数量: {len(deduplicated_whitelist)}")
-    
-    # 移除冲突和重复的规则
-    final_blacklist, filtered_whitelist = remove_conflicting_rules(deduplicated_blacklist, deduplicated_whitelist)
-    print(f"移除冲突规则后的黑名单数量: {len(final_blacklist)}")
-    print(f"过滤后的白名单数量: {len(filtered_whitelist)}")
-    
-    # 直接合并黑名单和白名单到 Black.txt，不创建临时文件
-    # 准备黑名单内容（过滤掉以[开头且以]结尾的行）
-    blacklist_content_lines = []
-    for rule in final_blacklist:
-        if not (rule.startswith('[') and rule.endswith(']')):
-            blacklist_content_lines.append(rule)
-    
-    # 对黑名单规则进行额外处理
-    processed_blacklist = process_rules(blacklist_content_lines)
-    
-    # 准备白名单内容（过滤掉以[开头且以]结尾的行）
-    whitelist_content_lines = []
-    for rule in filtered_whitelist:
-        if not (rule.startswith('[') and rule.endswith(']')):
-            whitelist_content_lines.append(rule)
-    
-    # 处理白名单规则，确保它们遵循 AdGuardHome 格式
-    formatted_whitelist_content_lines = []
-    for line in whitelist_content_lines:
+def normalize_whitelist_rules(whitelist_rules):
+    """过滤、格式化并统一白名单规则为 @@|| 开头的 AdGuardHome 格式"""
+    normalized_whitelist_lines = []
+    for line in whitelist_rules:
+        # 过滤掉以[开头且以]结尾的行
+        if line.startswith('[') and line.endswith(']'):
+            continue
         line = line.strip()
         # 跳过空行
         if not line:
             continue
-        # 格式化白名单规则
-        formatted_rule = format_whitelist_rule(line)
-        formatted_whitelist_content_lines.append(formatted_rule)
-
-    # 先过滤白名单内容（去除空行、特殊字符和路径分隔符）-----------------------------------
-    filtered_whitelist_lines = []
-    for line in formatted_whitelist_content_lines:
-        if str(line).strip() and not (
+        # 格式化白名单规则，确保它们遵循 AdGuardHome 格式
+        line = format_whitelist_rule(line)
+
+        # 过滤白名单内容（去除空行、特殊字符和路径分隔符）-----------------------------------
+        if not str(line).strip() or (
             "!" in line or                    # 包含特殊字符
             "/" in line or                    # 包含/
             line.startswith((".", "-"))       # 特定开头
         ):
-            filtered_whitelist_lines.append(line)
+            continue
 
-    # 统一白名单格式：若不是 @@|| 开头，则移除行内的 @ 与 |，并前置 @@||
-    normalized_whitelist_lines = []
-    for line in filtered_whitelist_lines:
+        # 统一白名单格式：若不是 @@|| 开头，则移除行内的 @ 与 |，并前置 @@||
         s = str(line).strip()
         if s.startswith('@@||'):
             normalized_whitelist_lines.append(s)
         else:
             sanitized = re.sub(r'[@|]', '', s)
             normalized_whitelist_lines.append('@@||' + sanitized)
+    return normalized_whitelist_lines
+
+def main(generate_white_file=True, override_time: str = None, offline=False, prune_subdomains=True,
+         prune_whitelisted=False, conflict_report: str = None, metrics: PipelineMetrics = None,
+         metrics_file: str = None, force=False, drop_unhit_days: int = None, drop_unhit_dry_run=False,
+         drop_unhit_max_ratio: float = None):
+    """生成 Black.txt / White.txt，并返回本次结果供同一进程中的后续脚本直接使用（见 run_pipeline.py）
 
-    # 根据最终将写入的有效规则行数进行统计，确保与文件一致
-    blacklist_count = sum(1 for l in processed_blacklist if str(l).strip())
-    whitelist_count = len(normalized_whitelist_lines)  # 使用规范化后的白名单数量
-    total_count = blacklist_count + whitelist_count
+    返回字典：updated_time 为写入文件头的更新时间；blacklist / whitelist 为写入文件的黑名单与白名单规则；
+    sources 为各规则源的下载结果（规则在缓存文件中，可用 iter_cached_rules 读取）。
+    各源内容、选项与脚本版本都与上次相同时跳过处理（force=True 时不跳过），此时返回的 skipped 为 True，
+    不含 blacklist / whitelist，Black.txt / White.txt 保持原样。
+    drop_unhit_days 为正整数时删除最近 drop_unhit_days 天没有命中的黑名单规则（命中记录见 rule_hits.py）；
+    drop_unhit_dry_run=True 时只报告不删除，待删除的规则超过黑名单的 drop_unhit_max_ratio 时不删除。
+    """
+    print("开始处理AdGuardHome规则..." if not offline else "开始处理AdGuardHome规则（离线模式，仅使用缓存）...")
+    # 未传入指标收集器时自行创建，并在结束时写出指标文件
+    own_metrics = metrics is None
+    if own_metrics:
+        metrics = PipelineMetrics("adguard_rules_merger")
     
-    # 合并黑名单和格式化后的白名单到 Black.txt
-    with open(COMBINED_FILE, "w", encoding="utf-8-sig") as f:
-        # 写入新的文件头部信息
-        f.write(f"# 更新时间: {current_time}\n")
-        f.write(f"# 总规则数：{total_count} (黑名单: {blacklist_count}, 白名单: {whitelist_count})\n")
-        f.write(f"# 作者名称: Menghuibanxian  酷安名: 梦半仙\n")
-        f.write(f"# 作者主页: https://github.com/Menghuibanxian/AdguardHome\n")
-        f.write("\n")
-        
-        # 写入处理后的黑名单内容
-        for line in processed_blacklist:
-            if str(line).strip():
-                f.write(f"{line}\n")
-        
-        # 写入规范化后的白名单内容到Black.txt
-        for line in normalized_whitelist_lines:
-            f.write(f"{line}\n")
-
-    # 如果需要生成单独的White.txt文件
-    if generate_white_file:
-        # 单独生成White.txt文件
-        with open(WHITE_FILE, "w", encoding="utf-8-sig") as f:
-            # 写入白名单文件头部信息（使用过滤后的实际规则数量）
-            f.write(f"# 更新时间: {current_time}\n")
-            f.write(f"# 白名单规则数：{len(normalized_whitelist_lines)}\n")  # 使用规范化后的实际数量
-            f.write(f"# 作者名称: Menghuibanxian  酷安名: 梦半仙\n")
-            f.write(f"# 作者主页: https://github.com/Menghuibanxian/AdguardHome\n")
-            f.write("\n")
-            
-            # 写入规范化后的白名单内容到White.txt
-            for line in normalized_whitelist_lines:
-                f.write(f"{line}\n")
-        
-        print("AdGuardHome规则处理完成！Black.txt和White.txt文件已生成。")
+    # 获取当前北京时间或使用传入的统一时间戳（离线模式不访问网络，直接用本地时间）
+    if override_time:
+        current_time = override_time
+    elif offline:
+        current_time = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
     else:
-        # 如果不需要生成White.txt文件，删除已存在的文件
-        if os.path.exists(WHITE_FILE):
-            os.remove(WHITE_FILE)
-        print("AdGuardHome规则处理完成！Black.txt文件已生成。")
+        current_time = get_beijing_time()
+    
+    # 并发下载所有黑名单源和白名单源（下载与清洗在工作线程中流式完成）
+    with metrics.stage("download") as st:
+        black_results, white_results = download_all_sources(offline)
+        st.rules_out = sum(r["count"] for r in black_results + white_results)
+    for kind, results in (("black", black_results), ("white", white_results)):
+        for r in results:
+            metrics.record("download_source", r["elapsed"], r["cpu"], rules_out=r["count"],
+                           source=r["name"].strip(), kind=kind, status=r["status"], error=str(r["error"]) if r["error"] else None)
+    
+    # 长期没有命中的规则（命中记录不足时为 None，不删除）
+    unhit_rules = load_unhit_rules(drop_unhit_days) if drop_unhit_days else None
+    
+    # 输入指纹：各源清洗后的规则内容、运行选项、待删除的未命中规则与脚本版本
+    fingerprint = input_fingerprint.compute_fingerprint({
+        "sources": [[r["url"], input_fingerprint.file_digest(r["path"])] for r in black_results + white_results],
+        "options": {"white_file": generate_white_file, "prune_subdomains": prune_subdomains,
+                    "prune_whitelisted": prune_whitelisted, "conflict_report": bool(conflict_report),
+                    "drop_unhit_days": drop_unhit_days, "drop_unhit_dry_run": drop_unhit_dry_run,
+                    "drop_unhit_max_ratio": drop_unhit_max_ratio},
+        "unhit_rules": input_fingerprint.lines_digest(sorted(unhit_rules)) if unhit_rules is not None else None,
+    })
+    output_files = [COMBINED_FILE] + ([WHITE_FILE] if generate_white_file else [])
+    result = {"updated_time": current_time, "white_file": generate_white_file,
+              "sources": black_results + white_results, "skipped": False}
+    if not force and input_fingerprint.is_unchanged("adguard_rules_merger", fingerprint, output_files, FINGERPRINT_FILE):
+        print("规则源与脚本均未变化，跳过处理，Black.txt / White.txt 保持不变（--force 可强制重新生成）")
+        metrics.extra["skipped"] = True
+        # 快照缺失或过期（如缓存未恢复）时按现有 Black.txt 补写
+        try:
+            if rule_snapshot.ensure_snapshot(COMBINED_FILE, SNAPSHOT_FILE):
+                print(f"已按 Black.txt 重新生成规则快照: {SNAPSHOT_FILE}")
+        except OSError as e:
+            print(f"生成规则快照失败 {SNAPSHOT_FILE}: {e}")
+        if own_metrics:
+            metrics.write(metrics_file)
+        result["skipped"] = True
+        return result
+    previous_outputs = {} if force else (
+        input_fingerprint.get_fingerprint("adguard_rules_merger", FINGERPRINT_FILE).get("outputs") or {})
+    
+    # 流式读取各源规则：从黑名单中提取白名单规则，并在插入时去重
+    with metrics.stage("dedupe") as st:
+        st.rules_in = sum(r["count"] for r in black_results + white_results)
+        deduplicated_blacklist, deduplicated_whitelist = collect_source_rules(black_results, white_results)
+        st.rules_out = len(deduplicated_blacklist) + len(deduplicated_whitelist)
+    
+    # 黑名单规则只解析一次，解析结果贯穿后续各阶段
+    with metrics.stage("parse") as st:
+        parsed_blacklist = parse_rules(deduplicated_blacklist)
+        st.rules_in = st.rules_out = len(parsed_blacklist)
+    del deduplicated_blacklist
+    
+    # 移除冲突和重复的规则
+    with metrics.stage("conflict") as st:
+        st.rules_in = len(parsed_blacklist)
+        final_blacklist, filtered_whitelist = remove_conflicting_rules(parsed_blacklist, deduplicated_whitelist)
+        st.rules_out = len(final_blacklist)
+    del parsed_blacklist, deduplicated_whitelist
+    print(f"移除冲突规则后的黑名单数量: {len(final_blacklist)}")
+    
+    # 删除已被父域 ||domain^ 覆盖的子域规则
+    if prune_subdomains:
+        with metrics.stage("prune_subdomains") as st:
+            st.rules_in = len(final_blacklist)
+            final_blacklist, _ = prune_covered_subdomains(final_blacklist)
+            st.rules_out = len(final_blacklist)
+        print(f"清理子域冗余后的黑名单数量: {len(final_blacklist)}")
+    print(f"过滤后的白名单数量: {len(filtered_whitelist)}")
+    
+    # 白名单：过滤、格式化并统一为 AdGuardHome 格式
+    with metrics.stage("normalize_whitelist") as st:
+        st.rules_in = len(filtered_whitelist)
+        normalized_whitelist_lines = normalize_whitelist_rules(filtered_whitelist)
+        st.rules_out = len(normalized_whitelist_lines)
+    
+    # 删除被最终白名单完全抵消的黑名单规则（可选），并输出冲突报告
+    if prune_whitelisted or conflict_report:
+        with metrics.stage("whitelist_conflict") as st:
+            st.rules_in = len(final_blacklist)
+            final_blacklist, _ = resolve_whitelist_conflicts(
+                final_blacklist, normalized_whitelist_lines, prune=prune_whitelisted,
+                report_file=conflict_report or CONFLICT_REPORT_FILE)
+            st.rules_out = len(final_blacklist)
+        print(f"处理白名单冲突后的黑名单数量: {len(final_blacklist)}")
+    
+    # 直接合并黑名单和白名单到 Black.txt，不创建临时文件
+    # 准备黑名单内容（过滤掉以[开头且以]结尾的行），并进行额外处理
+    with metrics.stage("process_rules") as st:
+        st.rules_in = len(final_blacklist)
+        processed_blacklist = process_rules(
+            rule.text for rule in final_blacklist if not (rule.text.startswith('[') and rule.text.endswith(']')))
+        st.rules_out = len(processed_blacklist)
+    del final_blacklist
+    
+    # 删除长期没有命中的规则；删除的规则另存一份，聚合脚本继续为其归因，出现流量后下次合并时恢复
+    dropped_rules = []
+    if unhit_rules:
+        with metrics.stage("drop_unhit") as st:
+            st.rules_in = len(processed_blacklist)
+            dropped_rules = select_unhit_rules(processed_blacklist, unhit_rules, os.path.basename(COMBINED_FILE),
+                                               drop_unhit_max_ratio, drop_unhit_dry_run)
+            if dropped_rules:
+                dropped = set(dropped_rules)
+                processed_blacklist = [rule for rule in processed_blacklist if rule not in dropped]
+            st.rules_out = len(processed_blacklist)
+        if dropped_rules:
+            print(f"删除最近 {drop_unhit_days} 天没有命中的规则 {len(dropped_rules)} 条，剩余黑名单 {len(processed_blacklist)} 条")
+    save_dropped_rules(dropped_rules)
+
+    with metrics.stage("write") as st:
+        # 合并黑名单和格式化后的白名单到 Black.txt；规则数在写出的同一遍中统计，确保与文件一致
+        def black_header(counts):
+            blacklist_count, whitelist_count = counts
+            return [
+                f"# 更新时间: {current_time}",
+                f"# 总规则数：{blacklist_count + whitelist_count} (黑名单: {blacklist_count}, 白名单: {whitelist_count})",
+                f"# 作者名称: Menghuibanxian  酷安名: 梦半仙",
+                f"# 作者主页: https://github.com/Menghuibanxian/AdguardHome",
+                "",
+            ]
+        # 规则内容与上次相同时不改写文件，文件头的更新时间也不变
+        black_written = write_rule_file(
+            COMBINED_FILE, (processed_blacklist, normalized_whitelist_lines), black_header,
+            unchanged_sha256=(previous_outputs.get(os.path.basename(COMBINED_FILE)) or {}).get("sha256"))
+        st.rules_in = len(processed_blacklist) + len(normalized_whitelist_lines)
+        st.rules_out = sum(black_written["counts"])
+        outputs = {os.path.basename(COMBINED_FILE): black_written}
+
+        # 如果需要生成单独的White.txt文件
+        if generate_white_file:
+            # 单独生成White.txt文件，头部写入过滤后的实际规则数量
+            def white_header(counts):
+                return [
+                    f"# 更新时间: {current_time}",
+                    f"# 白名单规则数：{counts[0]}",
+                    f"# 作者名称: Menghuibanxian  酷安名: 梦半仙",
+                    f"# 作者主页: https://github.com/Menghuibanxian/AdguardHome",
+                    "",
+                ]
+            outputs[os.path.basename(WHITE_FILE)] = write_rule_file(
+                WHITE_FILE, (normalized_whitelist_lines,), white_header,
+                unchanged_sha256=(previous_outputs.get(os.path.basename(WHITE_FILE)) or {}).get("sha256"))
+        
+            print("AdGuardHome规则处理完成！Black.txt和White.txt文件已生成。")
+        else:
+            # 如果不需要生成White.txt文件，删除已存在的文件
+            if os.path.exists(WHITE_FILE):
+                os.remove(WHITE_FILE)
+            print("AdGuardHome规则处理完成！Black.txt文件已生成。")
+    metrics.extra["outputs"] = outputs
+    
+    # 写出 Black.txt 的二进制快照，后续阶段直接加载解析结果，不再重新解析文本
+    with metrics.stage("snapshot") as st:
+        st.rules_in = len(processed_blacklist) + len(normalized_whitelist_lines)
+        try:
+            st.rules_out = rule_snapshot.write_snapshot(
+                itertools.chain(processed_blacklist, normalized_whitelist_lines), COMBINED_FILE, SNAPSHOT_FILE)
+        except OSError as e:
+            print(f"写入规则快照失败 {SNAPSHOT_FILE}: {e}")
+    for name, written in outputs.items():
+        if written["skipped"]:
+            print(f"{name} 的规则内容未变化，保留原文件")
+    # 写出成功后记录指纹与输出文件哈希
+    output_paths = {os.path.basename(COMBINED_FILE): COMBINED_FILE, os.path.basename(WHITE_FILE): WHITE_FILE}
+    input_fingerprint.save_fingerprint(
+        "adguard_rules_merger", fingerprint,
+        {name: input_fingerprint.output_record(output_paths[name], written) for name, written in outputs.items()},
+        FINGERPRINT_FILE)
+
+    if own_metrics:
+        metrics.write(metrics_file)
+    result["blacklist"] = processed_blacklist
+    result["whitelist"] = normalized_whitelist_lines
+    return result
 
 if __name__ == "__main__":
     import sys
     # 解析参数：是否生成 White.txt，以及统一时间戳
     generate_white_file = "--no-white-file" not in sys.argv
+    # --offline：不访问网络，仅用 scripts/cache 中的缓存重建 Black.txt / White.txt
+    offline = "--offline" in sys.argv
+    # --keep-subdomains：保留已被父域规则覆盖的子域规则
+    prune_subdomains = "--keep-subdomains" not in sys.argv
+    # --prune-whitelisted：删除被 @@ 规则完全抵消的黑名单规则，并写出冲突报告
+    prune_whitelisted = "--prune-whitelisted" in sys.argv
     override_time = None
     if "--timestamp" in sys.argv:
         try:
@@ -458,4 +939,32 @@ if __name__ == "__main__":
             override_time = sys.argv[idx+1]
         except Exception:
             pass
-    main(generate_white_file, override_time)
+    # --conflict-report 路径：指定冲突报告文件（单独使用时只报告不删除）
+    conflict_report = None
+    if "--conflict-report" in sys.argv:
+        try:
+            idx = sys.argv.index("--conflict-report")
+            conflict_report = sys.argv[idx+1]
+        except Exception:
+            pass
+    # --metrics 路径：指定性能指标 JSON 文件（默认写入 scripts/reports/metrics/）
+    metrics_file = metrics_path_from_argv(sys.argv)
+    # --drop-unhit-days N：删除最近 N 天没有命中的黑名单规则（需要聚合脚本的规则命中记录）
+    drop_unhit_days = None
+    if "--drop-unhit-days" in sys.argv:
+        try:
+            drop_unhit_days = int(sys.argv[sys.argv.index("--drop-unhit-days") + 1])
+        except (IndexError, ValueError):
+            pass
+    # --drop-unhit-max-percent P：待删除的规则超过黑名单的 P% 时不删除（默认 10）
+    drop_unhit_max_ratio = None
+    if "--drop-unhit-max-percent" in sys.argv:
+        try:
+            drop_unhit_max_ratio = float(sys.argv[sys.argv.index("--drop-unhit-max-percent") + 1]) / 100
+        except (IndexError, ValueError):
+            pass
+    # --drop-unhit-dry-run：只报告未命中的规则，不删除
+    # --force：输入未变化时也重新生成
+    main(generate_white_file, override_time, offline, prune_subdomains, prune_whitelisted, conflict_report,
+         metrics_file=metrics_file, force="--force" in sys.argv, drop_unhit_days=drop_unhit_days,
+         drop_unhit_dry_run="--drop-unhit-dry-run" in sys.argv, drop_unhit_max_ratio=drop_unhit_max_ratio)
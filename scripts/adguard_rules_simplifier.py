@@ -3,21 +3,52 @@
 
 import os
 import re
+import sqlite3
 import requests
 import datetime
+from itertools import compress
 from urllib.parse import urlparse
-from typing import Set, List, Tuple
+from typing import Dict, Set, List, Optional, Tuple
+from pipeline_metrics import PipelineMetrics, metrics_path_from_argv
+from domain_count_store import DomainCountStore, STORE_FILE, iter_text_counts
+from domain_index import collect_parent_domains
+from rule_order import order_rules, ORDER_MODES, DEFAULT_ORDER
+from rule_writer import write_rule_file
+from rule_hits import load_unhit_rules, select_unhit_rules
+from rule_reader import read_rule_lines
+from rule_snapshot import (open_snapshot, select_flags, SNAPSHOT_FILE, KIND_SUFFIX, KIND_SHIFT, KIND_MASK,
+                           FLAG_PIPE, FLAG_EXCEPTION)
+import input_fingerprint
 
 class AdGuardRulesSimplifier:
     def __init__(self):
         self.base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
         # 域名文件位于 scripts/logs 下
         self.domain_file = os.path.join(self.base_dir, "scripts", "logs", "domain name.txt")
+        # 域名计数存储（与 domain name.txt 一致时直接读取，免去解析文本）
+        self.count_store_file = STORE_FILE
+        # 只保留最近 recent_days 天内查询次数 ≥ min_hits 的域名（recent_days 为 None 时按全部累计计数筛选）
+        self.recent_days = None
+        self.min_hits = 1
+        # ||domain^ 规则在查询日志中出现过其子域名时也保留；False 时只做精确匹配
+        self.suffix_match = True
+        # 黑名单输出顺序：reverse-lexical（默认）/ lexical / hits / domain，见 rule_order.py
+        self.output_order = DEFAULT_ORDER
+        # 删除最近 drop_unhit_days 天没有命中的 Black.txt 规则（None 时不删除，命中记录见 rule_hits.py）
+        self.drop_unhit_days = None
+        # 只报告未命中的规则不删除；待删除的规则超过 drop_unhit_max_ratio（None 时为 rule_hits.MAX_DROP_RATIO）时不删除
+        self.drop_unhit_dry_run = False
+        self.drop_unhit_max_ratio = None
+        # 输入指纹文件；force 为 True 时输入未变化也重新生成
+        self.fingerprint_file = input_fingerprint.FINGERPRINT_FILE
+        self.force = False
         # 输出文件改为 pure black.txt，位于仓库根目录
         self.output_file = os.path.join(self.base_dir, "pure black.txt")
         
         # 输入规则从本地合并产物 Black.txt 读取，避免远程依赖
         self.black_url = os.path.join(self.base_dir, "Black.txt")
+        # 合并脚本写出的 Black.txt 快照，与 Black.txt 一致时直接读取解析结果
+        self.snapshot_file = SNAPSHOT_FILE
         # 白名单来源：本地生成的 White.txt
         self.white_file = os.path.join(self.base_dir, "White.txt")
         self.autumn_url = "https://raw.githubusercontent.com/TG-Twilight/AWAvenue-Ads-Rule/main/AWAvenue-Ads-Rule.txt"
@@ -42,12 +73,15 @@ class AdGuardRulesSimplifier:
         # 回退：当前北京时间
         return (datetime.datetime.utcnow() + datetime.timedelta(hours=8)).strftime("%Y-%m-%d %H:%M:%S")
         
-    def download_rules(self, url: str) -> List[str]:
-        """加载规则文件：支持本地文件路径或HTTP(S)链接"""
+    def download_rules(self, url: str, skip_comments: bool = False) -> List[str]:
+        """加载规则文件：支持本地文件路径或HTTP(S)链接；skip_comments 为 True 时按 remove_comments 删除注释与空行"""
         # 如果传入的是本地路径，直接读取文件
         if os.path.exists(url):
             try:
                 print(f"读取本地规则: {url}")
+                if skip_comments:
+                    # 映射读取，注释行在字节层面跳过、不解码（见 rule_reader.py）
+                    return read_rule_lines(url, "@!#")
                 with open(url, 'r', encoding='utf-8', errors='ignore') as f:
                     return [line.rstrip('\n') for line in f]
             except Exception as e:
@@ -58,15 +92,25 @@ class AdGuardRulesSimplifier:
             print(f"正在下载规则: {url}")
             response = requests.get(url, timeout=30)
             response.raise_for_status()
-            return response.text.splitlines()
+            lines = response.text.splitlines()
+            return self.remove_comments(lines) if skip_comments else lines
         except Exception as e:
             print(f"下载规则失败 {url}: {e}")
             return []
     
     def load_domain_list(self) -> Set[str]:
-        """加载domain name.txt中的域名"""
+        """加载domain name.txt中的域名（优先从计数存储读取，存储与文本不一致时先从文本导入）"""
         domains = set()
         if os.path.exists(self.domain_file):
+            try:
+                with DomainCountStore(self.count_store_file) as store:
+                    if store.sync_with_text(self.domain_file):
+                        print("域名计数存储与 domain name.txt 不一致，已重新导入")
+                    domains = {domain.lower() for domain in self.select_domains(store)}
+                print(f"加载了 {len(domains)} 个域名")
+                return domains
+            except (sqlite3.Error, OSError) as e:
+                print(f"读取域名计数存储失败，改为解析文本: {e}")
             try:
                 with open(self.domain_file, 'r', encoding='utf-8') as f:
                     for line in f:
@@ -82,6 +126,68 @@ class AdGuardRulesSimplifier:
             print("域名文件不存在")
         return domains
     
+    def select_domains(self, store: DomainCountStore) -> Set[str]:
+        """按 recent_days / min_hits 从计数存储中选出域名；分桶历史不足 recent_days 天时改用全部累计计数"""
+        if self.recent_days:
+            since = store.bucket_history_start()
+            cutoff = (datetime.datetime.now() - datetime.timedelta(days=self.recent_days - 1)).strftime("%Y-%m-%d")
+            if since is not None and since <= cutoff:
+                domains = store.recent_domains(self.recent_days, self.min_hits)
+                print(f"最近 {self.recent_days} 天内查询 ≥ {self.min_hits} 次的域名: {len(domains)} 个")
+                return domains
+            print(f"分桶统计自 {since or '（无数据）'} 起，不足最近 {self.recent_days} 天，改用全部累计计数")
+        if self.min_hits > 1:
+            domains = store.frequent_domains(self.min_hits)
+            print(f"累计查询 ≥ {self.min_hits} 次的域名: {len(domains)} 个")
+            return domains
+        return set(store.iter_domains())
+    
+    def load_domain_counts(self) -> Dict[str, int]:
+        """加载 domain name.txt 中各域名的累计查询次数（供 hits 输出顺序使用）"""
+        if not os.path.exists(self.domain_file):
+            return {}
+        try:
+            with DomainCountStore(self.count_store_file) as store:
+                store.sync_with_text(self.domain_file)
+                return {domain.lower(): count for domain, count in store.iter_sorted()}
+        except (sqlite3.Error, OSError) as e:
+            print(f"读取域名计数存储失败，改为解析文本: {e}")
+        counts = {}
+        for domain, count in iter_text_counts(self.domain_file):
+            domain = domain.lower()
+            counts[domain] = counts.get(domain, 0) + count
+        return counts
+    
+    def load_source_rules(self, url: str, inputs: dict) -> List[str]:
+        """加载规则源：合并脚本在同一进程中已获取过时直接使用其结果，否则读取或下载"""
+        source_rules = inputs.get("source_rules") or {}
+        if url in source_rules:
+            print(f"使用合并脚本已获取的规则: {url}")
+            return source_rules[url]
+        return self.download_rules(url)
+    
+    def load_black_snapshot(self):
+        """Black.txt 与快照一致时从快照读取黑名单，返回 (规则, |开头的规则, 其域名（需另行提取时为 None）, 其余规则)；
+        快照不存在或已过期时返回 None"""
+        snapshot = open_snapshot(self.black_url, self.snapshot_file)
+        if snapshot is None:
+            return None
+        with snapshot:
+            flags = bytes(snapshot.flags)
+            all_rules = snapshot.rules()
+            all_keys = snapshot.keys()
+        # 与 remove_comments 一致，跳过 @ 开头的规则（快照中没有注释与空行）；按标志整列筛选，不逐条判断
+        rules = list(compress(all_rules, select_flags(flags, lambda f: not f & FLAG_EXCEPTION)))
+        pipe = select_flags(flags, lambda f: f & FLAG_PIPE)
+        pipe_rules = list(compress(all_rules, pipe))
+        remaining_rules = list(compress(all_rules, select_flags(flags, lambda f: not f & (FLAG_PIPE | FLAG_EXCEPTION))))
+        # ||domain^ 规则的匹配键即 extract_domain_from_rule 提取的域名，其余 | 开头的规则另行提取
+        suffix = KIND_SUFFIX << KIND_SHIFT
+        pipe_domains = [key if f & KIND_MASK == suffix else None
+                        for key, f in zip(compress(all_keys, pipe), compress(flags, pipe))]
+        print(f"读取规则快照: {self.snapshot_file}（{len(rules)} 条规则）")
+        return rules, pipe_rules, pipe_domains, remaining_rules
+    
     def remove_comments(self, rules: List[str]) -> List[str]:
         """删除@！#开头的注释规则"""
         cleaned_rules = []
@@ -96,14 +202,8 @@ class AdGuardRulesSimplifier:
         whitelist = []
         if os.path.exists(self.white_file):
             try:
-                with open(self.white_file, 'r', encoding='utf-8', errors='ignore') as f:
-                    for line in f:
-                        s = line.strip().lstrip('\ufeff')
-                        # 跳过头部注释和空行
-                        if not s or s.startswith('#') or s.startswith('!'):
-                            continue
-                        # 保留 @@ 开头及已格式化的白名单规则
-                        whitelist.append(s)
+                # 与 filter_whitelist 一致：跳过 # ! 开头的注释和空行
+                whitelist = read_rule_lines(self.white_file, "#!")
                 print(f"读取 White.txt 白名单规则: {len(whitelist)} 条")
             except Exception as e:
                 print(f"读取 White.txt 失败: {e}")
@@ -111,13 +211,24 @@ class AdGuardRulesSimplifier:
             print("White.txt 文件不存在，跳过追加白名单")
         return whitelist
     
+    def filter_whitelist(self, lines) -> List[str]:
+        """跳过注释和空行，保留 @@ 开头及已格式化的白名单规则原样"""
+        whitelist = []
+        for line in lines:
+            s = line.strip().lstrip('\ufeff')
+            # 跳过头部注释和空行
+            if not s or s.startswith('#') or s.startswith('!'):
+                continue
+            whitelist.append(s)
+        return whitelist
+    
     def extract_pipe_rules(self, rules: List[str]) -> Tuple[List[str], List[str]]:
         """提取|开头的规则并从原规则中删除"""
         pipe_rules = []
         remaining_rules = []
         
+        # 传入的规则已去除首尾空白（remove_comments / read_rule_lines）
         for rule in rules:
-            rule = rule.strip()
             if rule.startswith('|'):
                 pipe_rules.append(rule)
             else:
@@ -146,18 +257,39 @@ class AdGuardRulesSimplifier:
         return domain.lower().strip()
     
     def match_domains_and_restore(self, pipe_rules: List[str], remaining_rules: List[str], 
-                                 domain_set: Set[str]) -> List[str]:
-        """将提取规则的域名与domain name.txt匹配，匹配上的放回原规则"""
+                                 domain_set: Set[str], pipe_domains: List[Optional[str]] = None) -> List[str]:
+        """将提取规则的域名与domain name.txt匹配，匹配上的放回原规则
+
+        ||example.com^ 同时匹配 example.com 与其任意子域名，||*.example.com^ 只匹配子域名，
+        |http://example.com 仍为精确匹配；suffix_match 为 False 时全部精确匹配。
+        pipe_domains 为与 pipe_rules 对应的已知域名（来自快照），为 None 的项再从规则中提取。
+        """
         restored_rules = remaining_rules.copy()
         matched_count = 0
+        suffix_matched = 0
+        # 查询日志中所有域名的父域集合，只构建一次，每条规则一次集合查询
+        parent_set = collect_parent_domains(domain_set) if self.suffix_match else set()
         
-        for rule in pipe_rules:
-            domain = self.extract_domain_from_rule(rule)
+        if pipe_domains is None:
+            pipe_domains = [None] * len(pipe_rules)
+        for rule, domain in zip(pipe_rules, pipe_domains):
+            if domain is None:
+                domain = self.extract_domain_from_rule(rule)
             if domain in domain_set:
                 restored_rules.append(rule)
                 matched_count += 1
+            elif rule.startswith('||') and parent_set:
+                if domain.startswith('*.'):
+                    domain = domain[2:]
+                if domain in parent_set:
+                    restored_rules.append(rule)
+                    matched_count += 1
+                    suffix_matched += 1
         
-        print(f"匹配并恢复了 {matched_count} 个规则")
+        if self.suffix_match:
+            print(f"匹配并恢复了 {matched_count} 个规则（其中 {suffix_matched} 个由子域名匹配）")
+        else:
+            print(f"匹配并恢复了 {matched_count} 个规则")
         return restored_rules
     
     def process_hosts_file(self, hosts_lines: List[str]) -> List[str]:
@@ -173,8 +305,8 @@ class AdGuardRulesSimplifier:
                     adguard_rules.append(f"||{domain}^")
         return adguard_rules
     
-    def merge_and_deduplicate(self, *rule_lists: List[str]) -> List[str]:
-        """合并多个规则列表并去重"""
+    def merge_and_deduplicate(self, *rule_lists: List[str], order: str = "lexical") -> List[str]:
+        """合并多个规则列表并去重，按 order（见 rule_order.py）一次排序输出"""
         all_rules = set()
         
         for rules in rule_lists:
@@ -183,101 +315,219 @@ class AdGuardRulesSimplifier:
                 if rule and not rule.startswith(('@', '!', '#')):
                     all_rules.add(rule)
         
-        return sorted(list(all_rules))
+        domain_counts = self.load_domain_counts() if order == "hits" else None
+        return order_rules(all_rules, order, domain_counts)
 
     def reverse_rules(self, rules: List[str]) -> List[str]:
         """仅倒序规则列表（不影响文件头部注释）"""
         return list(reversed(rules))
     
-    def save_rules(self, rules: List[str], filename: str = None, black_count: int = None, updated_time: str = None, whitelist_rules: List[str] = None, whitelist_count: int = None):
-        """保存规则到文件，头部与 Black.txt 一致，并将白名单追加到底部"""
+    def save_rules(self, rules: List[str], filename: str = None, black_count: int = None, updated_time: str = None, whitelist_rules: List[str] = None, whitelist_count: int = None, unchanged_sha256: str = None):
+        """保存规则到文件，头部与 Black.txt 一致，并将白名单追加到底部
+
+        规则数未给出时在写出的同一遍中统计；先写临时文件再原子替换（见 rule_writer.py）。
+        unchanged_sha256 为上次写出的规则内容哈希，内容相同时保留原文件（不更新文件头的时间）。
+        返回 write_rule_file 的结果（各部分规则数与内容哈希），保存失败时返回 None。
+        """
         if filename is None:
             filename = self.output_file
         if updated_time is None:
             # 使用北京时间（UTC+8）
             updated_time = (datetime.datetime.utcnow() + datetime.timedelta(hours=8)).strftime("%Y-%m-%d %H:%M:%S")
-        # 规则计数
         if rules is None:
             rules = []
         if whitelist_rules is None:
             whitelist_rules = []
-        if black_count is None:
-            black_count = len([r for r in rules if str(r).strip()])
-        if whitelist_count is None:
-            whitelist_count = len([w for w in whitelist_rules if str(w).strip()])
-        total_count = black_count + whitelist_count
+
+        def header(counts):
+            # 规则计数
+            black = counts[0] if black_count is None else black_count
+            white = counts[1] if whitelist_count is None else whitelist_count
+            return [
+                f"# 更新时间: {updated_time}",
+                f"# 总规则数：{black + white} (黑名单: {black}, 白名单: {white})",
+                f"# 作者名称: Menghuibanxian  酷安名: 梦半仙",
+                f"# 作者主页: https://github.com/Menghuibanxian/AdguardHome",
+                "",
+            ]
 
         try:
-            with open(filename, 'w', encoding='utf-8-sig') as f:
-                f.write(f"# 更新时间: {updated_time}\n")
-                f.write(f"# 总规则数：{total_count} (黑名单: {black_count}, 白名单: {whitelist_count})\n")
-                f.write(f"# 作者名称: Menghuibanxian  酷安名: 梦半仙\n")
-                f.write(f"# 作者主页: https://github.com/Menghuibanxian/AdguardHome\n")
-                f.write("\n")
-                # 写入黑名单
-                for rule in rules:
-                    if str(rule).strip():
-                        f.write(rule + "\n")
-                # 追加白名单到底部
-                for w in whitelist_rules:
-                    if str(w).strip():
-                        f.write(w + "\n")
+            # 写入黑名单，并追加白名单到底部
+            written = write_rule_file(filename, (rules, whitelist_rules), header, unchanged_sha256=unchanged_sha256)
+            if written["skipped"]:
+                print(f"规则内容未变化，保留原文件: {filename}")
+                return written
+            black = written["counts"][0] if black_count is None else black_count
+            white = written["counts"][1] if whitelist_count is None else whitelist_count
             print(f"规则已保存到: {filename}")
-            print(f"黑名单: {black_count}，白名单: {whitelist_count}，总计: {total_count}")
+            print(f"黑名单: {black}，白名单: {white}，总计: {black + white}")
+            return written
         except Exception as e:
             print(f"保存规则失败: {e}")
+            return None
     
-    def run(self, override_time: str = None):
-        """运行主程序"""
+    def run(self, override_time: str = None, metrics: PipelineMetrics = None, metrics_file: str = None,
+            inputs: dict = None):
+        """运行主程序
+
+        inputs 用于在同一进程中接收合并脚本的结果（见 run_pipeline.py），给出的部分不再从文件读取或重新下载：
+        black_rules 为 Black.txt 中的规则，whitelist_rules 为 White.txt 中的白名单，
+        source_rules 为 {规则源地址: 清洗后的规则列表}。
+        """
+        # 未传入指标收集器时自行创建，并在结束时写出指标文件
+        own_metrics = metrics is None
+        if own_metrics:
+            metrics = PipelineMetrics("adguard_rules_simplifier")
+        try:
+            self._run(override_time, metrics, inputs or {})
+        finally:
+            if own_metrics:
+                metrics.write(metrics_file)
+
+    def compute_input_fingerprint(self, black_rules: List[str], autumn_raw: List[str], github_hosts: List[str],
+                          whitelist_rules: List[str], unhit_rules: Set[str] = None) -> str:
+        """本次输入的指纹：各规则输入内容、domain name.txt、待删除的未命中规则、筛选与输出选项及脚本版本"""
+        return input_fingerprint.compute_fingerprint({
+            "black": input_fingerprint.lines_digest(black_rules),
+            "autumn": input_fingerprint.lines_digest(autumn_raw),
+            "github": input_fingerprint.lines_digest(github_hosts),
+            "white": input_fingerprint.lines_digest(whitelist_rules),
+            "domains": input_fingerprint.file_digest(self.domain_file),
+            "unhit_rules": input_fingerprint.lines_digest(sorted(unhit_rules)) if unhit_rules is not None else None,
+            "options": {
+                "recent_days": self.recent_days,
+                "min_hits": self.min_hits,
+                "suffix_match": self.suffix_match,
+                "output_order": self.output_order,
+                "drop_unhit_days": self.drop_unhit_days,
+                "drop_unhit_dry_run": self.drop_unhit_dry_run,
+                "drop_unhit_max_ratio": self.drop_unhit_max_ratio,
+                # 按最近天数筛选的结果随日期变化
+                "today": datetime.date.today().isoformat() if self.recent_days else None,
+            },
+        })
+
+    def _run(self, override_time: str, metrics: PipelineMetrics, inputs: dict):
         print("=== AdGuard规则简化器 ===")
         
-        # 1. 加载域名列表
-        print("\n1. 加载域名列表...")
-        domain_set = self.load_domain_list()
-        
-        # 2. 下载并处理Black.txt规则
-        print("\n2. 处理Black.txt规则...")
-        black_rules = self.download_rules(self.black_url)
+        # 0. 读取全部输入，输入与上次相同则跳过后续处理
+        print("\n0. 读取输入...")
+        with metrics.stage("load_inputs") as st:
+            black_snapshot = None
+            if "black_rules" in inputs:
+                print("使用合并脚本生成的 Black.txt 规则")
+                black_rules = inputs["black_rules"]
+            else:
+                black_snapshot = self.load_black_snapshot()
+                black_rules = black_snapshot[0] if black_snapshot else self.download_rules(self.black_url, skip_comments=True)
+            autumn_raw = self.load_source_rules(self.autumn_url, inputs)
+            github_hosts = self.load_source_rules(self.github_url, inputs)
+            if "whitelist_rules" in inputs:
+                whitelist_rules = self.filter_whitelist(inputs["whitelist_rules"])
+                print(f"使用合并脚本生成的白名单规则: {len(whitelist_rules)} 条")
+            else:
+                whitelist_rules = self.load_whitelist_from_white()
+            st.rules_out = len(black_rules) + len(autumn_raw) + len(github_hosts) + len(whitelist_rules)
         if not black_rules:
             print("无法下载Black.txt规则，跳过处理")
             return
         
-        # 删除注释
-        black_rules = self.remove_comments(black_rules)
+        # 删除注释（含文件头，指纹只取决于规则内容）；快照与自行读取的规则已不含注释
+        with metrics.stage("remove_comments") as st:
+            st.rules_in = len(black_rules)
+            if "black_rules" in inputs:
+                black_rules = self.remove_comments(black_rules)
+            st.rules_out = len(black_rules)
         print(f"删除注释后剩余 {len(black_rules)} 个规则")
         
-        # 提取|开头的规则
-        pipe_rules, remaining_rules = self.extract_pipe_rules(black_rules)
+        # 长期没有命中的规则（命中记录不足时为 None，不删除）
+        unhit_rules = None
+        if self.drop_unhit_days:
+            unhit_rules = load_unhit_rules(self.drop_unhit_days, self.count_store_file)
+        
+        fingerprint = self.compute_input_fingerprint(black_rules, autumn_raw, github_hosts, whitelist_rules,
+                                                     unhit_rules)
+        if not self.force and input_fingerprint.is_unchanged(
+                "adguard_rules_simplifier", fingerprint, [self.output_file], self.fingerprint_file):
+            print(f"输入与脚本均未变化，跳过处理，{os.path.basename(self.output_file)} 保持不变（--force 可强制重新生成）")
+            metrics.extra["skipped"] = True
+            return
         
-        # 匹配域名并恢复规则
-        final_black_rules = self.match_domains_and_restore(pipe_rules, remaining_rules, domain_set)
+        # 1. 加载域名列表
+        print("\n1. 加载域名列表...")
+        with metrics.stage("load_domains") as st:
+            domain_set = self.load_domain_list()
+            st.rules_out = len(domain_set)
+        
+        # 2. 处理Black.txt规则
+        print("\n2. 处理Black.txt规则...")
+        # 提取|开头的规则，匹配域名并恢复规则
+        with metrics.stage("match_domains") as st:
+            st.rules_in = len(black_rules)
+            if black_snapshot is None:
+                pipe_rules, remaining_rules = self.extract_pipe_rules(black_rules)
+                pipe_domains = None
+            else:
+                _, pipe_rules, pipe_domains, remaining_rules = black_snapshot
+                print(f"提取了 {len(pipe_rules)} 个|开头的规则")
+            final_black_rules = self.match_domains_and_restore(pipe_rules, remaining_rules, domain_set, pipe_domains)
+            st.rules_out = len(final_black_rules)
         
-        # 3. 下载并处理秋风规则
+        # 删除长期没有命中的规则（只针对 Black.txt，不影响秋风规则与 GitHub 加速规则）
+        if unhit_rules:
+            with metrics.stage("drop_unhit") as st:
+                st.rules_in = len(final_black_rules)
+                dropped = set(select_unhit_rules(final_black_rules, unhit_rules, os.path.basename(self.output_file),
+                                                 self.drop_unhit_max_ratio, self.drop_unhit_dry_run))
+                if dropped:
+                    final_black_rules = [rule for rule in final_black_rules if rule not in dropped]
+                st.rules_out = len(final_black_rules)
+            if dropped:
+                print(f"删除最近 {self.drop_unhit_days} 天没有命中的规则 {len(dropped)} 条，"
+                      f"剩余 {len(final_black_rules)} 条")
+        
+        # 3. 处理秋风规则
         print("\n3. 处理秋风规则...")
-        autumn_rules = self.download_rules(self.autumn_url)
-        autumn_rules = self.remove_comments(autumn_rules)
+        with metrics.stage("load_autumn") as st:
+            st.rules_in = len(autumn_raw)
+            autumn_rules = self.remove_comments(autumn_raw)
+            st.rules_out = len(autumn_rules)
         print(f"秋风规则: {len(autumn_rules)} 个")
         
-        # 4. 下载并处理GitHub加速规则
+        # 4. 处理GitHub加速规则
         print("\n4. 处理GitHub加速规则...")
-        github_hosts = self.download_rules(self.github_url)
-        github_rules = self.process_hosts_file(github_hosts)
+        with metrics.stage("load_github") as st:
+            st.rules_in = len(github_hosts)
+            github_rules = self.process_hosts_file(github_hosts)
+            st.rules_out = len(github_rules)
         print(f"GitHub加速规则: {len(github_rules)} 个")
         
         # 5. 合并所有规则并去重
         print("\n5. 合并规则并去重...")
-        final_rules = self.merge_and_deduplicate(final_black_rules, autumn_rules, github_rules)
-
-        # 5.1 倒序规则（保持文件头部注释在顶部）
-        final_rules = self.reverse_rules(final_rules)
+        with metrics.stage("merge") as st:
+            st.rules_in = len(final_black_rules) + len(autumn_rules) + len(github_rules)
+            # 直接按输出顺序排序（默认与原先“升序后倒序”的结果相同），不再整表倒序复制
+            final_rules = self.merge_and_deduplicate(final_black_rules, autumn_rules, github_rules,
+                                                     order=self.output_order)
+            st.rules_out = len(final_rules)
         
-        # 6. 读取 White.txt 并保存最终规则（白名单追加到底部）
+        # 6. 保存最终规则（白名单追加到底部）；规则内容与上次相同时保留原文件
         print("\n6. 保存最终规则并追加白名单...")
         updated_time = override_time if override_time else self.read_updated_time_from_black()
-        whitelist_rules = self.load_whitelist_from_white()
-        black_count = len([r for r in final_rules if str(r).strip()])
-        white_count = len([w for w in whitelist_rules if str(w).strip()])
-        self.save_rules(final_rules, updated_time=updated_time, black_count=black_count, whitelist_rules=whitelist_rules, whitelist_count=white_count)
+        previous = input_fingerprint.get_fingerprint("adguard_rules_simplifier", self.fingerprint_file)
+        previous_output = (previous.get("outputs") or {}).get(os.path.basename(self.output_file)) or {}
+        with metrics.stage("write") as st:
+            written = self.save_rules(final_rules, updated_time=updated_time, whitelist_rules=whitelist_rules,
+                                      unchanged_sha256=None if self.force else previous_output.get("sha256"))
+            st.rules_in = len(final_rules) + len(whitelist_rules)
+            st.rules_out = sum(written["counts"]) if written else 0
+        if written:
+            metrics.extra["outputs"] = {os.path.basename(self.output_file): written}
+            # 写出成功后记录指纹
+            input_fingerprint.save_fingerprint(
+                "adguard_rules_simplifier", fingerprint,
+                {os.path.basename(self.output_file): input_fingerprint.output_record(self.output_file, written)},
+                self.fingerprint_file)
         
         print("\n=== 处理完成 ===")
 
@@ -291,4 +541,40 @@ if __name__ == "__main__":
             override_time = sys.argv[idx+1]
         except Exception:
             pass
-    simplifier.run(override_time)
+    # --recent-days N / --min-hits K：只保留最近 N 天内查询次数 ≥ K 的域名对应的规则
+    for flag, attr in (("--recent-days", "recent_days"), ("--min-hits", "min_hits")):
+        if flag in sys.argv:
+            try:
+                setattr(simplifier, attr, int(sys.argv[sys.argv.index(flag) + 1]))
+            except (IndexError, ValueError):
+                pass
+    # --order reverse-lexical|lexical|hits|domain：黑名单输出顺序
+    if "--order" in sys.argv:
+        try:
+            order = sys.argv[sys.argv.index("--order") + 1]
+            if order in ORDER_MODES:
+                simplifier.output_order = order
+            else:
+                print(f"未知的输出顺序 {order}（可选: {', '.join(ORDER_MODES)}），使用默认顺序 {DEFAULT_ORDER}")
+        except IndexError:
+            pass
+    # --exact-match：只保留域名与查询日志精确相同的规则（不按子域名匹配）
+    if "--exact-match" in sys.argv:
+        simplifier.suffix_match = False
+    # --drop-unhit-days N：删除最近 N 天没有命中的 Black.txt 规则（需要聚合脚本的规则命中记录）
+    if "--drop-unhit-days" in sys.argv:
+        try:
+            simplifier.drop_unhit_days = int(sys.argv[sys.argv.index("--drop-unhit-days") + 1])
+        except (IndexError, ValueError):
+            pass
+    # --drop-unhit-max-percent P：待删除的规则超过 P% 时不删除（默认 10）；--drop-unhit-dry-run：只报告不删除
+    if "--drop-unhit-max-percent" in sys.argv:
+        try:
+            simplifier.drop_unhit_max_ratio = float(sys.argv[sys.argv.index("--drop-unhit-max-percent") + 1]) / 100
+        except (IndexError, ValueError):
+            pass
+    simplifier.drop_unhit_dry_run = "--drop-unhit-dry-run" in sys.argv
+    # --force：输入未变化时也重新生成
+    simplifier.force = "--force" in sys.argv
+    # --metrics 路径：指定性能指标 JSON 文件（默认写入 scripts/reports/metrics/）
+    simplifier.run(override_time, metrics_file=metrics_path_from_argv(sys.argv))
@@ -7,6 +7,15 @@ from collections import Counter, defaultdict
 from datetime import datetime
 import glob
 import shutil
+import time
+import hashlib
+from concurrent.futures import ProcessPoolExecutor
+from pipeline_metrics import PipelineMetrics, metrics_path_from_argv
+from event_dedup import EventDeduper, DEFAULT_WINDOW_MINUTES
+from querylog_fields import iter_chunk_fields, resolve_backend
+from domain_count_store import DomainCountStore, STORE_FILE
+from heavy_hitters import HeavyHitters, DEFAULT_SKETCH_MB
+from rule_hits import load_attribution_matcher, attribute_hits
 
 # 仓库根目录
 REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -15,6 +24,29 @@ LOGS_DIR = os.path.join(REPO_ROOT, "scripts", "logs")
 # 域名统计文件位于 logs 目录
 OUTPUT_FILE = os.path.join(LOGS_DIR, "domain name.txt")
 LOG_FILE = os.path.join(LOGS_DIR, "log")
+# 域名累计计数存储（domain name.txt 由它导出，见 domain_count_store.py）
+COUNT_STORE_FILE = STORE_FILE
+# 实时模式下逐文件记录已读字节偏移的检查点
+CHECKPOINT_FILE = os.path.join(LOGS_DIR, "checkpoint.json")
+CHECKPOINT_VERSION = 1
+# 文件头指纹的字节数，用于识别被截断重写或 inode 被复用的文件
+HEAD_FINGERPRINT_BYTES = 1024
+# 实时模式额外匹配 AdGuard Home 轮转出的 querylog.json.1
+LIVE_LOG_PATTERNS = ("querylog*.json", "querylog*.json.[0-9]*")
+# 日志总量达到该字节数才启用多进程分片统计
+PARALLEL_MIN_BYTES = 32 * 1024 * 1024
+# 单个分片的最小字节数
+MIN_SHARD_BYTES = 8 * 1024 * 1024
+# 分块读取 querylog 的块大小
+READ_BLOCK_SIZE = 4 * 1024 * 1024
+# 字段提取后端：auto 优先使用 orjson，未安装时使用字节正则（见 querylog_fields.py）
+QUERYLOG_BACKEND = "auto"
+# 事件去重精确保留的时间窗口（分钟）与兜底布隆过滤器大小（MB，0 表示不启用）；
+# 布隆过滤器的假阳性会把新事件误判为重复而丢弃，默认不启用，由 --dedup-bloom-mb 显式开启
+DEDUP_WINDOW_MINUTES = DEFAULT_WINDOW_MINUTES
+DEDUP_BLOOM_MB = 0
+# 近似模式（--approx-top）的 Count-Min Sketch 大小（MB）
+APPROX_SKETCH_MB = DEFAULT_SKETCH_MB
 
 # 读取上次处理的最新日志信息
 def read_latest_log_info():
@@ -46,7 +78,7 @@ def save_latest_log_info(domain, timestamp):
     else:
         print(f"Warning: Invalid domain or timestamp: domain='{domain}', timestamp='{timestamp}', formatted='{formatted_time}'")
 
-# 合并现有的domain name.txt与新统计结果
+# 合并现有的domain name.txt与新统计结果（聚合流程已改用 DomainCountStore，保留供脚本外部调用）
 def merge_domain_counts(new_counts):
     existing_counts = {}
     
@@ -104,132 +136,467 @@ def format_timestamp(timestamp):
     print(f"Warning: Could not format timestamp: {timestamp}")
     return ""
 
-def main():
+def load_checkpoint():
+    """读取实时模式检查点，返回 {"设备号:inode": 记录}；文件不存在或版本不符时返回空字典"""
+    try:
+        with open(CHECKPOINT_FILE, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+    except FileNotFoundError:
+        return {}
+    except (OSError, ValueError) as e:
+        print(f"Error reading checkpoint file: {e}")
+        return {}
+    if not isinstance(data, dict) or data.get("version") != CHECKPOINT_VERSION or not isinstance(data.get("files"), dict):
+        print("Checkpoint format not recognized, reading all querylog files from start")
+        return {}
+    return data["files"]
+
+def save_checkpoint(files):
+    """原子写入检查点（先写临时文件再替换），避免中断时留下半截 JSON"""
+    tmp_file = CHECKPOINT_FILE + ".tmp"
+    with open(tmp_file, 'w', encoding='utf-8') as f:
+        json.dump({
+            "version": CHECKPOINT_VERSION,
+            "updated_at": datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            "files": files,
+        }, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_file, CHECKPOINT_FILE)
+
+def head_fingerprint(f, length):
+    """返回文件前 length 字节的 SHA-1"""
+    f.seek(0)
+    return hashlib.sha1(f.read(length)).hexdigest()
+
+def last_complete_line_end(f, start, size):
+    """返回 [start, size) 内最后一个换行符之后的偏移；没有完整行时返回 start"""
+    pos = size
+    while pos > start:
+        block = min(64 * 1024, pos - start)
+        f.seek(pos - block)
+        idx = f.read(block).rfind(b"\n")
+        if idx >= 0:
+            return pos - block + idx + 1
+        pos -= block
+    return start
+
+def plan_incremental_ranges(log_files, checkpoint):
+    """按检查点确定每个文件需要读取的新字节范围
+
+    返回 ([(文件, 起始偏移, 结束偏移), ...], 新检查点)。文件以 "设备号:inode" 标识，改名轮转
+    （querylog.json -> querylog.json.1）后仍从上次的偏移继续读；文件变短或文件头指纹不符
+    （被截断重写、inode 复用）时从头读取。只读到最后一个完整行，正在写入的半行留给下一次运行。
+    已不存在的文件不再保留在新检查点中。
+    """
+    ranges = []
+    new_checkpoint = {}
+    for log_file in log_files:
+        name = os.path.basename(log_file)
+        try:
+            st = os.stat(log_file)
+            key = f"{st.st_dev}:{st.st_ino}"
+            record = checkpoint.get(key) or {}
+            offset = record.get("offset", 0)
+            with open(log_file, 'rb') as f:
+                if offset > st.st_size:
+                    print(f"Detected truncated file: {name}, reading from start")
+                    offset = 0
+                elif offset and head_fingerprint(f, record.get("head_len", 0)) != record.get("head"):
+                    print(f"Detected replaced file: {name}, reading from start")
+                    offset = 0
+                elif offset and record.get("path") != name:
+                    print(f"Detected rotated file: {record.get('path')} -> {name}, resuming at byte {offset}")
+                end = last_complete_line_end(f, offset, st.st_size)
+                head_len = min(end, HEAD_FINGERPRINT_BYTES)
+                new_checkpoint[key] = {
+                    "path": name,
+                    "size": st.st_size,
+                    "offset": end,
+                    "head_len": head_len,
+                    "head": head_fingerprint(f, head_len),
+                }
+        except OSError as e:
+            print(f"Error reading {log_file}: {e}")
+            continue
+        if end > offset:
+            ranges.append((log_file, offset, end))
+    return ranges, new_checkpoint
+
+def iter_log_chunks(log_file, start=0, end=None, block_size=None):
+    """按字节范围分块读取 NDJSON 日志，产出只包含完整行的 bytes 块（不解码、不逐行切分）
+
+    start 不在行首时跳过被截断的首行（它属于上一个分片）；只包含起始偏移小于 end 的行。
+    """
+    block_size = block_size or READ_BLOCK_SIZE
+    with open(log_file, 'rb') as f:
+        if start > 0:
+            f.seek(start - 1)
+            if f.read(1) != b"\n":
+                f.readline()
+        pos = f.tell()
+        rest = b""
+        while end is None or pos < end:
+            block = f.read(block_size)
+            if not block:
+                # 文件末尾没有换行符的最后一行
+                if rest:
+                    yield rest
+                return
+            data = rest + block
+            cut = data.rfind(b"\n") + 1
+            if cut == 0:
+                rest = data
+                continue
+            chunk, rest = data[:cut], data[cut:]
+            if end is not None and pos + cut > end:
+                # 截到起始偏移不小于 end 的第一行之前
+                yield chunk[:chunk.find(b"\n", end - pos - 1) + 1]
+                return
+            yield chunk
+            pos += cut
+
+def iter_log_records(log_file, start=0, end=None, backend="regex"):
+    """逐行产出日志的 (QH, T, IP, QT) 字段，无效行产出 None（backend 见 querylog_fields.py）"""
+    for chunk in iter_log_chunks(log_file, start, end):
+        yield from iter_chunk_fields(chunk, backend)
+
+def hour_bucket(timestamp):
+    """取时间戳的小时部分（"YYYY-MM-DDTHH"，按日志中的本地时间）作为分桶键"""
+    return str(timestamp)[:13]
+
+def count_log_entries(records, last_domain, last_timestamp, hourly_counts, dedup, head_keys=None, heavy=None):
+    """统计日志记录（iter_log_records 产出的字段元组）中的新事件，按 (域名, 小时) 计入 hourly_counts
+
+    dedup 为 EventDeduper。给出 head_keys 时（多进程分片模式），时间不晚于第一个事件所在分钟加去重窗口的新事件键
+    按出现顺序追加到 head_keys，它们可能与上一分片末尾的事件重复，由主进程再核对一次。
+    heavy 为 HeavyHitters 时为近似模式：新事件只按域名计入 heavy，不写 hourly_counts。
+    返回 (读取行数, 新事件数, 最新域名, 最新时间戳)。
+    """
+    latest_domain = None
+    latest_timestamp = None
+    new_events = 0
+    lines_read = 0
+    for fields in records:
+        lines_read += 1
+        # 忽略无效的JSON行
+        if fields is None:
+            continue
+        # 域名 (QH字段)、时间 (T字段)、客户端IP (IP字段)、查询类型 (QT字段)
+        domain, timestamp, client_ip, query_type = fields
+        
+        # 如果找到域名
+        if domain and timestamp:
+            # 检查是否需要跳过这条记录
+            # 规则1: 如果域名和时间戳完全匹配，则跳过
+            # 规则2: 如果时间戳早于或等于上次处理的时间戳，则跳过
+            if last_domain and last_timestamp:
+                # 格式化当前时间戳（只有存在上次记录时才需要比较）
+                formatted_current = format_timestamp(timestamp)
+                if (domain == last_domain and formatted_current == last_timestamp) or formatted_current < last_timestamp:
+                    continue
+            
+            # 更新最新日志信息
+            if latest_timestamp is None or timestamp > latest_timestamp:
+                latest_domain = domain
+                latest_timestamp = timestamp
+            
+            # 创建唯一键以避免重复计数
+            if client_ip and query_type:
+                event_key = (domain, timestamp, client_ip, query_type)
+                # 如果这个事件之前见过，则跳过
+                if not dedup.add(event_key, timestamp):
+                    continue
+                if head_keys is not None and dedup.minute(timestamp) <= dedup.first + dedup.window:
+                    head_keys.append(event_key)
+            # 缺少客户端IP或查询类型的记录以所在行区分，每行只读一次，无需保存去重键
+            if heavy is None:
+                hourly_counts[domain, hour_bucket(timestamp)] += 1
+            else:
+                heavy.add(domain)
+            new_events += 1
+    return lines_read, new_events, latest_domain, latest_timestamp
+
+def process_log_file(log_file, last_domain, last_timestamp, hourly_counts, dedup, start=0, end=None, backend="auto",
+                     heavy=None):
+    """解析单个 querylog 文件的 [start, end) 字节范围，把新事件按 (域名, 小时) 计入 hourly_counts
+
+    返回 (读取行数, 新事件数, 本文件最新域名, 本文件最新时间戳)。
+    """
+    try:
+        return count_log_entries(iter_log_records(log_file, start, end, backend),
+                                 last_domain, last_timestamp, hourly_counts, dedup, heavy=heavy)
+    except Exception as e:
+        print(f"Error processing {log_file}: {e}")
+        return 0, 0, None, None
+
+def plan_log_shards(ranges, workers):
+    """把各文件待读的字节范围 [(文件, 起始偏移, 结束偏移), ...] 切分为分片（按文件与偏移排序）"""
+    total = sum(end - start for _, start, end in ranges)
+    # 每个进程约分到 4 个分片，以平衡不同文件大小带来的负载差异
+    shard_bytes = max(MIN_SHARD_BYTES, -(-total // (workers * 4)))
+    shards = []
+    for log_file, start, end in ranges:
+        while start < end:
+            shard_end = min(start + shard_bytes, end)
+            shards.append((log_file, start, shard_end))
+            start = shard_end
+    return shards
+
+def parse_log_shard(task):
+    """进程池工作函数：用与主进程相同的去重窗口统计一个分片，返回部分计数与分片首尾的事件键
+
+    分片内的重复在工作进程中去掉；只有开头（head_keys）与结尾（tail_keys，去重窗口中剩下的键）
+    一个窗口内的事件可能与相邻分片重复，交给主进程核对。传回的数据量与分片大小无关。
+    """
+    log_file, start, end, last_domain, last_timestamp, backend, window, bloom_mb = task
+    start_wall, start_cpu = time.perf_counter(), time.process_time()
+    counts = Counter()
+    dedup = EventDeduper(window, bloom_mb)
+    head_keys = []
+    try:
+        lines_read, new_events, latest_domain, latest_timestamp = count_log_entries(
+            iter_log_records(log_file, start, end, backend), last_domain, last_timestamp, counts, dedup, head_keys)
+    except Exception as e:
+        print(f"Error processing {log_file} [{start}, {end}): {e}")
+        lines_read, new_events, latest_domain, latest_timestamp = 0, 0, None, None
+    return {
+        "file": log_file,
+        "start": start,
+        "end": end,
+        "counts": counts,
+        "head_keys": head_keys,
+        # 已在 head_keys 中的键不重复传回
+        "tail_keys": dedup.window_keys(dedup.first + dedup.window) if dedup.first is not None else [],
+        "dedup": dedup.stats(),
+        "lines": lines_read,
+        "events": new_events,
+        "latest_domain": latest_domain,
+        "latest_timestamp": latest_timestamp,
+        "wall_time": time.perf_counter() - start_wall,
+        "cpu_time": time.process_time() - start_cpu,
+    }
+
+def aggregate_parallel(ranges, last_domain, last_timestamp, workers, metrics, dedup, backend="auto"):
+    """多进程分片统计各文件的待读字节范围，分片内各自去重，跨分片的重复由 dedup 按分片顺序核对分片首尾的事件键
+
+    querylog 按时间顺序写入时结果与串行逐文件处理一致。布隆过滤器（若启用）在每个工作进程中各建一个，
+    只对本分片的迟到事件生效。
+
+    返回 ((域名, 小时) 计数, 新事件数, 最新域名, 最新时间戳)。
+    """
+    shards = plan_log_shards(ranges, workers)
+    print(f"Parallel aggregation: {len(shards)} shards across {workers} processes")
+    hourly_counts = Counter()
+    latest_domain = None
+    latest_timestamp = None
+    total_events = 0
+    bloom_mb = dedup.bloom.size_bytes() / 1024 / 1024 if dedup.bloom is not None else 0
+    tasks = [(f, start, end, last_domain, last_timestamp, backend, dedup.window, bloom_mb) for f, start, end in shards]
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        # map 按提交顺序返回，归并顺序与串行处理顺序一致
+        for r in executor.map(parse_log_shard, tasks):
+            hourly_counts.update(r["counts"])
+            events = r["events"]
+            # 扣除与之前分片重复的事件，再记下本分片末尾窗口内的键供下一分片核对
+            for key in r["head_keys"]:
+                if not dedup.add(key, key[1]):
+                    hourly_counts[key[0], hour_bucket(key[1])] -= 1
+                    events -= 1
+            for key in r["tail_keys"]:
+                dedup.add(key, key[1])
+            total_events += events
+            # 按分片顺序比较，时间戳相同时保留先出现的记录
+            if r["latest_timestamp"] is not None and (latest_timestamp is None or r["latest_timestamp"] > latest_timestamp):
+                latest_domain = r["latest_domain"]
+                latest_timestamp = r["latest_timestamp"]
+            metrics.record("log_parse", r["wall_time"], r["cpu_time"], rules_in=r["lines"], rules_out=events,
+                           file=os.path.basename(r["file"]), start=r["start"], end=r["end"],
+                           boundary_keys=len(r["head_keys"]) + len(r["tail_keys"]),
+                           late_events=r["dedup"]["late_events"], late_duplicates=r["dedup"]["late_duplicates"])
+    return hourly_counts, total_events, latest_domain, latest_timestamp
+
+def main(metrics=None, metrics_file=None, workers=None, logs_dir=None, live=False,
+         dedup_window=None, dedup_bloom_mb=None, backend=None, approx_top=None, sketch_mb=None,
+         attribute_rules=True):
+    """聚合 querylog；workers 为进程数（默认 CPU 核数，1 表示串行）
+
+    logs_dir 为 querylog 所在目录（默认 scripts/logs）。live=True 时为实时模式：按检查点只读取
+    新追加的完整行，不删除日志，可对 AdGuard Home 正在写入的 querylog.json 反复运行。
+    dedup_window / dedup_bloom_mb 控制事件去重的内存上限（见 event_dedup.py）；
+    backend 为字段提取后端 auto / orjson / regex / json（见 querylog_fields.py）。
+    approx_top 为正整数时使用固定内存的近似模式：本次新事件用 sketch_mb MB 的 Count-Min Sketch 计数，
+    只把估计次数最高的 approx_top 个域名并入累计结果，domain name.txt 只导出累计次数最高的 approx_top 个域名
+    （计数存储不删除其余域名，之后的精确模式、--recent-days 与规则命中归因仍使用完整历史）；
+    近似模式串行处理，不记录时间分桶（见 heavy_hitters.py）。
+    attribute_rules=True 时把新事件归到 Black.txt 中起决定作用的规则上，按天累计规则命中次数（见 rule_hits.py）。
+    """
+    # 未传入指标收集器时自行创建，并在结束时写出指标文件
+    own_metrics = metrics is None
+    if own_metrics:
+        metrics = PipelineMetrics("aggregate_domains")
+    try:
+        dedup = EventDeduper(DEDUP_WINDOW_MINUTES if dedup_window is None else dedup_window,
+                             DEDUP_BLOOM_MB if dedup_bloom_mb is None else dedup_bloom_mb)
+        heavy = None
+        if approx_top:
+            heavy = HeavyHitters(approx_top, APPROX_SKETCH_MB if sketch_mb is None else sketch_mb)
+        _aggregate(metrics, workers, logs_dir, live, dedup, resolve_backend(backend or QUERYLOG_BACKEND), heavy,
+                   attribute_rules)
+        metrics.extra["dedup"] = dedup.stats()
+        if heavy is not None:
+            metrics.extra["approx"] = heavy.stats()
+    finally:
+        if own_metrics:
+            metrics.write(metrics_file)
+
+def _aggregate(metrics, workers, logs_dir, live, dedup, backend, heavy=None, attribute_rules=True):
     # 获取所有日志文件
-    log_files = glob.glob(os.path.join(LOGS_DIR, "querylog*.json"))
+    patterns = LIVE_LOG_PATTERNS if live else ("querylog*.json",)
+    log_files = set()
+    for pattern in patterns:
+        log_files.update(glob.glob(os.path.join(logs_dir or LOGS_DIR, pattern)))
     
     # 如果没有找到querylog文件，直接退出
     if not log_files:
         print("No querylog files found. No updates needed.")
         return
     
-    # 读取上次处理的最新日志信息
-    last_domain, last_timestamp = read_latest_log_info()
-    if last_domain and last_timestamp:
-        print(f"Last processed log: domain={last_domain}, timestamp={last_timestamp}")
-    
     # 按文件名排序（通常包含时间戳）
-    log_files.sort()
-    
-    # 域名计数器
-    domain_counts = Counter()
+    log_files = sorted(log_files)
     
-    # 用于去重的集合
-    seen_events = set()
+    if live:
+        # 实时模式由检查点保证每个字节只读一次，不再按时间戳过滤
+        last_domain, last_timestamp = None, None
+        ranges, checkpoint = plan_incremental_ranges(log_files, load_checkpoint())
+        print(f"Live mode: {sum(end - start for _, start, end in ranges)} new bytes in {len(ranges)} files")
+    else:
+        # 读取上次处理的最新日志信息
+        last_domain, last_timestamp = read_latest_log_info()
+        if last_domain and last_timestamp:
+            print(f"Last processed log: domain={last_domain}, timestamp={last_timestamp}")
+        ranges = [(f, 0, os.path.getsize(f)) for f in log_files]
     
-    # 最新的日志信息
-    latest_domain = None
-    latest_timestamp = None
+    # 日志总量较小或只有一个进程时串行处理，避免进程池的启动开销
+    workers = workers or os.cpu_count() or 1
+    if heavy is not None:
+        # 分片结果为各自的 (域名, 小时) 部分计数，内存随域名数增长，近似模式只串行处理
+        print(f"Approximate mode: top {heavy.top_k} domains, {heavy.sketch.size_bytes() / 1024 / 1024:.1f} MB sketch")
+        workers = 1
+    total_bytes = sum(end - start for _, start, end in ranges)
+    parse_start = time.perf_counter()
+    if workers > 1 and total_bytes >= PARALLEL_MIN_BYTES:
+        hourly_counts, total_events, latest_domain, latest_timestamp = aggregate_parallel(
+            ranges, last_domain, last_timestamp, workers, metrics, dedup, backend)
+    else:
+        # (域名, 小时) 计数器
+        hourly_counts = Counter()
+        
+        # 最新的日志信息
+        latest_domain = None
+        latest_timestamp = None
+        
+        # 处理每个日志文件
+        total_events = 0
+        for log_file, start, end in ranges:
+            with metrics.stage("log_parse", file=os.path.basename(log_file), start=start, end=end) as st:
+                lines_read, new_events, file_domain, file_timestamp = process_log_file(
+                    log_file, last_domain, last_timestamp, hourly_counts, dedup, start, end, backend, heavy)
+                st.rules_in, st.rules_out = lines_read, new_events
+            total_events += new_events
+            # 按文件顺序比较，时间戳相同时保留先出现的记录
+            if file_timestamp is not None and (latest_timestamp is None or file_timestamp > latest_timestamp):
+                latest_domain = file_domain
+                latest_timestamp = file_timestamp
     
-    # 处理每个日志文件
-    total_events = 0
-    for log_file in log_files:
-        try:
-            with open(log_file, 'r', encoding='utf-8', errors='ignore') as f:
-                # 逐行读取NDJSON格式
-                line_index = 0
-                for line in f:
-                    line = line.strip()
-                    if not line:
-                        continue
-                    
-                    try:
-                        # 解析JSON对象
-                        entry = json.loads(line)
-                        
-                        # 提取域名 (QH字段)
-                        domain = None
-                        if 'QH' in entry:
-                            domain = entry['QH']
-                        
-                        # 提取时间 (T字段)
-                        timestamp = None
-                        if 'T' in entry:
-                            timestamp = entry['T']
-                        
-                        # 提取客户端IP (IP字段)
-                        client_ip = None
-                        if 'IP' in entry:
-                            client_ip = entry['IP']
-                        
-                        # 提取查询类型 (QT字段)
-                        query_type = None
-                        if 'QT' in entry:
-                            query_type = entry['QT']
-                        
-                        # 如果找到域名
-                        if domain and timestamp:
-                            # 格式化当前时间戳
-                            formatted_current = format_timestamp(timestamp)
-                            
-                            # 检查是否需要跳过这条记录
-                            # 规则1: 如果域名和时间戳完全匹配，则跳过
-                            # 规则2: 如果时间戳早于或等于上次处理的时间戳，则跳过
-                            if last_domain and last_timestamp:
-                                if (domain == last_domain and formatted_current == last_timestamp) or formatted_current < last_timestamp:
-                                    continue
-                            
-                            # 更新最新日志信息
-                            if latest_timestamp is None or timestamp > latest_timestamp:
-                                latest_domain = domain
-                                latest_timestamp = timestamp
-                            
-                            # 创建唯一键以避免重复计数
-                            event_key = None
-                            if client_ip and query_type:
-                                event_key = (domain, timestamp, client_ip, query_type)
-                            else:
-                                # 如果缺少客户端IP或查询类型，则使用文件名+行号作为唯一键
-                                event_key = (domain, os.path.basename(log_file), line_index)
-                            
-                            # 如果这个事件之前没见过，则计数
-                            if event_key not in seen_events:
-                                domain_counts[domain] += 1
-                                seen_events.add(event_key)
-                                total_events += 1
-                        
-                    except json.JSONDecodeError:
-                        # 忽略无效的JSON行
-                        pass
-                    
-                    line_index += 1
-                    
-        except Exception as e:
-            print(f"Error processing {log_file}: {e}")
+    # 解析吞吐量（MB/s）
+    parse_time = time.perf_counter() - parse_start
+    mb_per_sec = total_bytes / 1024 / 1024 / parse_time if parse_time > 0 else 0.0
+    metrics.extra["querylog"] = {"backend": backend, "bytes": total_bytes, "mb_per_sec": round(mb_per_sec, 2)}
+    print(f"Parsed {total_bytes / 1024 / 1024:.1f} MB of querylog in {parse_time:.2f}s "
+          f"({mb_per_sec:.1f} MB/s, backend={backend})")
     
     # 如果没有处理任何新事件，直接退出
     if total_events == 0:
         print("No new events to process. No updates needed.")
+        if live:
+            save_checkpoint(checkpoint)
         return
     
-    # 合并与现有结果
-    merged_counts = merge_domain_counts(domain_counts)
-    
-    # 按计数降序和域名升序排序
-    sorted_domains = sorted(merged_counts.items(), key=lambda x: (-x[1], x[0]))
+    # 由 (域名, 小时) 计数汇总出各域名的新增计数；近似模式直接取估计次数最高的域名
+    if heavy is not None:
+        domain_counts = dict(heavy.top())
+        stats = heavy.stats()
+        print(f"Approximate counts: top {len(domain_counts)} domains from {stats['events']} events, "
+              f"overestimate bound {stats['error_bound']}")
+    else:
+        domain_counts = Counter()
+        for (domain, _), count in hourly_counts.items():
+            domain_counts[domain] += count
     
-    # 写入结果文件
-    with open(OUTPUT_FILE, 'w', encoding='utf-8') as f:
-        for domain, count in sorted_domains:
-            f.write(f"{domain} {count}\n")
+    with DomainCountStore(COUNT_STORE_FILE) as store:
+        # 合并与现有结果：存储与 domain name.txt 不一致时先从文本导入，再累加新计数
+        with metrics.stage("merge_counts") as st:
+            st.rules_in = len(domain_counts)
+            if store.sync_with_text(OUTPUT_FILE):
+                print(f"Imported '{OUTPUT_FILE}' into count store '{COUNT_STORE_FILE}'")
+            store.upsert(domain_counts)
+            st.rules_out = len(store)
+        
+        # 记入小时桶，并把旧的小时桶合并为天桶、删除过期的天桶（近似模式没有小时计数，只做合并与过期）
+        with metrics.stage("time_buckets") as st:
+            st.rules_in = len(hourly_counts)
+            store.upsert_hourly(hourly_counts)
+            rolled, expired = store.compact()
+            st.rules_out = rolled
+        print(f"Time buckets: {len(hourly_counts)} hourly updates, {rolled} hourly rows rolled up, {expired} daily rows expired")
+        
+        # 规则命中归因：每个域名只匹配一次，命中次数按日期计入起决定作用的规则，并登记当前规则列表
+        if attribute_rules:
+            with metrics.stage("rule_hits") as st:
+                st.rules_in = len(domain_counts)
+                matcher, rules = load_attribution_matcher()
+                if matcher is None:
+                    print("Rule hits: Black.txt not found, skipping attribution")
+                else:
+                    today = datetime.now().strftime("%Y-%m-%d")
+                    if heavy is not None:
+                        # 近似模式没有时间分桶，全部计入今天
+                        hits = attribute_hits(matcher, domain_counts, today)
+                        day_events = {today: total_events}
+                    else:
+                        hits = attribute_hits(matcher, hourly_counts)
+                        day_events = Counter()
+                        for (_, hour), count in hourly_counts.items():
+                            day_events[str(hour)[:10]] += count
+                    store.upsert_rule_hits(hits)
+                    # 记录哪些天的日志参与了归因，删除未命中规则前据此确认命中记录没有中断
+                    store.record_attributed_days(day_events)
+                    added = store.register_rules(rules, today)
+                    hit_rules = len({rule for rule, _ in hits})
+                    st.rules_out = hit_rules
+                    print(f"Rule hits: {matcher.cache_misses} domains matched against {len(rules)} rules, "
+                          f"{hit_rules} rules hit, {added} new rules registered")
+        
+        # 按计数降序和域名升序导出结果文件；近似模式只导出累计次数最高的 K 个域名，存储中的精确历史保持不变
+        with metrics.stage("write") as st:
+            st.rules_in = len(store)
+            written = store.export_text(OUTPUT_FILE, heavy.top_k if heavy is not None else None)
+            st.rules_out = written
+        if heavy is not None and written < st.rules_in:
+            print(f"Approximate mode: exported the top {written} of {st.rules_in} domains")
     
-    print(f"Wrote '{OUTPUT_FILE}' with {len(sorted_domains)} domains. Unique events: {total_events}")
+    print(f"Wrote '{OUTPUT_FILE}' with {written} domains. Unique events: {total_events}")
     
     # 保存最新日志信息
     if latest_domain and latest_timestamp:
         save_latest_log_info(latest_domain, latest_timestamp)
         print(f"Saved latest log info to '{LOG_FILE}'")
     
+    # 实时模式保留日志，只在结果写入后推进检查点
+    if live:
+        save_checkpoint(checkpoint)
+        print(f"Saved checkpoint to '{CHECKPOINT_FILE}'")
+        return
+    
     # 删除所有querylog开头的文件
     for log_file in log_files:
         try:
@@ -239,4 +606,54 @@ def main():
             print(f"Error deleting {log_file}: {e}")
 
 if __name__ == "__main__":
-    main()
+    # --workers N：统计 querylog 的进程数（默认 CPU 核数，1 表示串行）
+    workers = None
+    if "--workers" in sys.argv:
+        try:
+            workers = int(sys.argv[sys.argv.index("--workers") + 1])
+        except (IndexError, ValueError):
+            pass
+    # --logs-dir 目录：querylog 所在目录（默认 scripts/logs）
+    logs_dir = None
+    if "--logs-dir" in sys.argv:
+        try:
+            logs_dir = sys.argv[sys.argv.index("--logs-dir") + 1]
+        except IndexError:
+            pass
+    # --dedup-window 分钟 / --dedup-bloom-mb MB：事件去重的时间窗口与布隆过滤器大小（0 表示不启用）
+    dedup_window = dedup_bloom_mb = None
+    if "--dedup-window" in sys.argv:
+        try:
+            dedup_window = int(sys.argv[sys.argv.index("--dedup-window") + 1])
+        except (IndexError, ValueError):
+            pass
+    if "--dedup-bloom-mb" in sys.argv:
+        try:
+            dedup_bloom_mb = float(sys.argv[sys.argv.index("--dedup-bloom-mb") + 1])
+        except (IndexError, ValueError):
+            pass
+    # --json-backend auto|orjson|regex|json：querylog 字段提取后端
+    backend = None
+    if "--json-backend" in sys.argv:
+        try:
+            backend = sys.argv[sys.argv.index("--json-backend") + 1]
+        except IndexError:
+            pass
+    # --approx-top K / --sketch-mb MB：固定内存的近似模式，本次只并入估计次数最高的 K 个域名，domain name.txt 只导出前 K 个
+    approx_top = sketch_mb = None
+    if "--approx-top" in sys.argv:
+        try:
+            approx_top = int(sys.argv[sys.argv.index("--approx-top") + 1])
+        except (IndexError, ValueError):
+            pass
+    if "--sketch-mb" in sys.argv:
+        try:
+            sketch_mb = float(sys.argv[sys.argv.index("--sketch-mb") + 1])
+        except (IndexError, ValueError):
+            pass
+    # --live：实时模式，按检查点增量读取且不删除日志
+    # --no-rule-hits：不做规则命中归因
+    # --metrics 路径：指定性能指标 JSON 文件（默认写入 scripts/reports/metrics/）
+    main(metrics_file=metrics_path_from_argv(sys.argv), workers=workers, logs_dir=logs_dir, live="--live" in sys.argv,
+         dedup_window=dedup_window, dedup_bloom_mb=dedup_bloom_mb, backend=backend,
+         approx_top=approx_top, sketch_mb=sketch_mb, attribute_rules="--no-rule-hits" not in sys.argv)
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""规则解析微基准：对比旧版 parse_rule_components 与单次扫描的 parse_rule
+
+用法: python scripts/benchmarks/bench_parse_rules.py [--rules 200000] [--repeat 3]
+"""
+
+import os
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import adguard_rules_merger as merger
+from fixtures import rule_fixture, load_rules
+
+def legacy_parse_rule_components(rule: str):
+    """旧版实现（每条规则构造字典并执行未预编译的 re.match），仅用于对比"""
+    s = rule.strip()
+    comps = {
+        "is_comment": s.startswith("#") or s.startswith("!"),
+        "is_regex": s.startswith("/") and s.endswith("/"),
+        "is_whitelist": s.startswith("@@"),
+        "is_hosts": False,
+        "is_basic_adguard": False,
+        "domain": None,
+        "has_modifiers": False,
+        "modifiers": []
+    }
+    if not s or comps["is_comment"]:
+        return comps
+    m = re.match(r'^(?:0\.0\.0\.0|127\.0\.0\.1|::1?)\s+([^\s#]+)', s)
+    if m:
+        comps["is_hosts"] = True
+        comps["domain"] = m.group(1).strip()
+        return comps
+    if "$" in s:
+        comps["has_modifiers"] = True
+        mods = s[s.find("$")+1:]
+        comps["modifiers"] = [x.strip() for x in mods.split(",") if x.strip()]
+    if s.startswith("@@||"):
+        rest = s[4:]
+        dm = re.match(r'^([^\^\$\s]+)', rest)
+        if dm:
+            comps["is_basic_adguard"] = True
+            comps["domain"] = dm.group(1)
+            return comps
+    if s.startswith("||"):
+        rest = s[2:]
+        dm = re.match(r'^([^\^\$\s]+)', rest)
+        if dm:
+            comps["is_basic_adguard"] = True
+            comps["domain"] = dm.group(1)
+            return comps
+    if ' ' not in s and not s.startswith('|'):
+        rest = s[2:] if s.startswith("@@") else s
+        dm = re.match(r'^([^\^\$\s]+)', rest)
+        if dm:
+            dom = dm.group(1)
+            if re.match(r'^[A-Za-z0-9.-]+\.[A-Za-z0-9.-]+$', dom) and "*" not in dom:
+                comps["domain"] = dom
+    return comps
+
+def legacy_remove_conflicting_rules(blacklist_rules, whitelist_rules):
+    """旧版冲突处理：整份黑名单解析两遍"""
+    def extract(rules, is_whitelist):
+        domains = set()
+        for rule in rules:
+            c = legacy_parse_rule_components(rule)
+            if c["domain"] and "*" not in c["domain"]:
+                if not is_whitelist and (c["has_modifiers"] or c["is_regex"]):
+                    continue
+                domains.add(c["domain"])
+        return domains
+    extract(blacklist_rules, False).intersection(extract(whitelist_rules, True))
+    filtered = []
+    processed = set()
+    for rule in blacklist_rules:
+        c = legacy_parse_rule_components(rule)
+        if c["domain"] and not c["has_modifiers"] and not c["is_regex"] and "*" not in c["domain"]:
+            if c["domain"] in processed:
+                continue
+            processed.add(c["domain"])
+        filtered.append(rule)
+    return filtered, whitelist_rules[:]
+
+def best_of(repeat, func, *args):
+    """多次运行取最短耗时"""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(*args)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+def check_equivalence(rules):
+    """确认新旧解析结果一致"""
+    for rule in rules:
+        if merger.parse_rule_components(rule) != legacy_parse_rule_components(rule):
+            raise AssertionError(f"解析结果不一致: {rule!r}")
+
+def main():
+    count = 200000
+    repeat = 3
+    if "--rules" in sys.argv:
+        count = int(sys.argv[sys.argv.index("--rules") + 1])
+    if "--repeat" in sys.argv:
+        repeat = int(sys.argv[sys.argv.index("--repeat") + 1])
+
+    path = rule_fixture(count)
+    rules = load_rules(path)
+    blacklist = [r for r in rules if not r.startswith("@@")]
+    whitelist = [r for r in rules if r.startswith("@@")]
+    print(f"夹具: {path} ({len(rules)} 条规则)")
+
+    check_equivalence(rules)
+    print("新旧解析结果一致")
+
+    before = best_of(repeat, lambda: [legacy_parse_rule_components(r) for r in rules])
+    after = best_of(repeat, lambda: [merger.parse_rule(r) for r in rules])
+    print(f"解析        旧版: {len(rules) / before:>12,.0f} 条/秒   新版: {len(rules) / after:>12,.0f} 条/秒   提升 {before / after:.2f}x")
+
+    # 冲突处理会打印统计信息，基准期间静默
+    stdout = sys.stdout
+    sys.stdout = open(os.devnull, "w")
+    try:
+        before = best_of(repeat, legacy_remove_conflicting_rules, blacklist, whitelist)
+        after = best_of(repeat, lambda: merger.remove_conflicting_rules(merger.parse_rules(blacklist), whitelist))
+    finally:
+        sys.stdout.close()
+        sys.stdout = stdout
+    print(f"冲突处理    旧版: {len(blacklist) / before:>12,.0f} 条/秒   新版: {len(blacklist) / after:>12,.0f} 条/秒   提升 {before / after:.2f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""基准测试用的合成数据：AdGuard 语法规则列表与 AdGuard Home querylog（固定随机种子，结果可复现）"""
+
+import os
+import json
+import base64
+import random
+import datetime
+
+# 生成的夹具文件缓存目录（不入库，首次运行时生成）
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+# querylog 生成逻辑的版本号，写入夹具文件名，生成逻辑变化后自动重新生成
+QUERYLOG_FIXTURE_VERSION = 2
+
+_LABELS = ["ad", "ads", "track", "log", "stat", "cdn", "api", "img", "pix", "m", "sdk", "push", "analytics", "beacon"]
+_TLDS = ["com", "net", "cn", "org", "io", "com.cn", "top", "xyz"]
+_MODIFIERS = ["important", "third-party", "client=192.168.1.2", "dnstype=AAAA", "denyallow=example.com", "ctag=device_phone"]
+
+def random_domain(rng: random.Random) -> str:
+    """生成一个 2~4 级的随机域名"""
+    depth = rng.choice((0, 1, 1, 2))
+    labels = [f"{rng.choice(_LABELS)}{rng.randint(0, 999)}" for _ in range(depth)]
+    labels.append(f"site{rng.randint(0, 49999)}")
+    return ".".join(labels) + "." + rng.choice(_TLDS)
+
+def generate_rule_lines(count: int, seed: int = 20240101):
+    """按真实规则源的大致比例生成 AdGuard 语法规则行"""
+    rng = random.Random(seed)
+    for _ in range(count):
+        domain = random_domain(rng)
+        k = rng.random()
+        if k < 0.45:
+            yield f"||{domain}^"
+        elif k < 0.70:
+            yield f"{rng.choice(('0.0.0.0', '127.0.0.1'))} {domain}"
+        elif k < 0.78:
+            yield domain
+        elif k < 0.86:
+            yield f"||{domain}^${','.join(rng.sample(_MODIFIERS, rng.randint(1, 2)))}"
+        elif k < 0.91:
+            yield f"@@||{domain}^"
+        elif k < 0.94:
+            yield f"/^{rng.choice(_LABELS)}[0-9]+\\.{domain.split('.')[-2]}\\./"
+        elif k < 0.97:
+            yield f"||*.{domain}^" if rng.random() < 0.5 else f"||{rng.choice(_LABELS)}*.{domain}^"
+        else:
+            yield f"|https://{domain}/{rng.choice(_LABELS)}"
+
+def _write_fixture(path, lines):
+    """把生成的行写入夹具文件（先写临时文件，避免中断后留下半截夹具）"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        for line in lines:
+            f.write(line + "\n")
+    os.replace(tmp_path, path)
+
+def rule_fixture(count: int = 200000, seed: int = 20240101) -> str:
+    """返回规则夹具文件路径，不存在时按固定种子生成"""
+    path = os.path.join(FIXTURES_DIR, f"rules_{count}_{seed}.txt")
+    if not os.path.exists(path):
+        _write_fixture(path, generate_rule_lines(count, seed))
+    return path
+
+def generate_querylog_lines(target_bytes: int, seed: int = 20240101, domain_pool: int = 200000,
+                            duplicate_ratio: float = 0.01, start: str = "2025-11-01T00:00:00+08:00"):
+    """生成 AdGuard Home querylog NDJSON 行，直到累计字节数达到 target_bytes
+
+    域名六成来自长尾分布的热门域名，其余均匀取自固定域名池，另有少量随机标签子域；
+    时间戳单调递增，并按 duplicate_ratio 重复写出已出现过的事件，用于检验去重。
+    """
+    rng = random.Random(seed)
+    pool_rng = random.Random(seed + 1)
+    pool = [random_domain(pool_rng) for _ in range(domain_pool)]
+    clients = [f"192.168.{rng.randint(0, 3)}.{rng.randint(2, 254)}" for _ in range(64)]
+    upstreams = ["https://dns.alidns.com:443/dns-query", "https://doh.pub:443/dns-query", "223.5.5.5:53"]
+    current = datetime.datetime.fromisoformat(start)
+    recent = []
+    written = 0
+    while written < target_bytes:
+        if recent and rng.random() < duplicate_ratio:
+            line = rng.choice(recent)
+        else:
+            current += datetime.timedelta(microseconds=rng.randint(1, 200000))
+            k = rng.random()
+            if k < 0.6:
+                # paretovariate 产生长尾分布：少量热门域名占大部分查询
+                domain = pool[min(int(rng.paretovariate(1.1)) - 1, domain_pool - 1)]
+            elif k < 0.95:
+                domain = pool[rng.randrange(domain_pool)]
+            else:
+                # CDN / 追踪类的随机标签子域，几乎每次都不同
+                domain = f"{rng.getrandbits(48):x}.{pool[rng.randrange(domain_pool)]}"
+            entry = {
+                "T": current.isoformat(timespec="microseconds"),
+                "QH": domain,
+                "QT": rng.choice(("A", "A", "AAAA", "HTTPS")),
+                "QC": "IN",
+                "CP": "",
+                "Upstream": rng.choice(upstreams),
+                "Answer": base64.b64encode(rng.randbytes(rng.randint(30, 270))).decode("ascii"),
+                "Result": {"IsFiltered": rng.random() < 0.2, "Reason": rng.choice((0, 3, 7))},
+                "Elapsed": rng.randint(100000, 90000000),
+                "IP": rng.choice(clients),
+            }
+            line = json.dumps(entry, separators=(",", ":"))
+            recent.append(line)
+            if len(recent) > 1000:
+                recent = recent[500:]
+        written += len(line) + 1
+        yield line
+
+def querylog_fixture(size_mb: int = 50, seed: int = 20240101) -> str:
+    """返回 querylog 夹具文件路径（约 size_mb MB），不存在时按固定种子生成"""
+    path = os.path.join(FIXTURES_DIR, f"querylog_v{QUERYLOG_FIXTURE_VERSION}_{size_mb}mb_{seed}.json")
+    if not os.path.exists(path):
+        _write_fixture(path, generate_querylog_lines(size_mb * 1024 * 1024, seed))
+    return path
+
+def rules_file_with_header(rules_path: str, out_path: str) -> str:
+    """把规则夹具包装成带头部注释的 Black.txt 格式文件"""
+    if not os.path.exists(out_path):
+        with open(rules_path, "r", encoding="utf-8") as src:
+            lines = [line.rstrip("\n") for line in src]
+        header = ["# 更新时间: 2025-11-01 00:00:00", f"# 总规则数：{len(lines)}", ""]
+        _write_fixture(out_path, header + lines)
+    return out_path
+
+def load_rules(path: str):
+    """读取夹具规则文件"""
+    with open(path, "r", encoding="utf-8") as f:
+        return [line.rstrip("\n") for line in f if line.strip()]
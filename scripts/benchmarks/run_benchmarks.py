@@ -0,0 +1,481 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""离线基准测试套件：用合成规则列表与 querylog 对流水线各环节计时
+
+用法:
+    python scripts/benchmarks/run_benchmarks.py [--scale small|medium|large] [--rules N] [--querylog-mb M]
+                                                [--target 名称 ...] [--repeat N] [--label 标签]
+    python scripts/benchmarks/run_benchmarks.py --compare 旧结果.json 新结果.json
+
+规模:
+    small   规则 10 万行，querylog 约 50 MB
+    medium  规则 100 万行，querylog 约 300 MB
+    large   规则 500 万行，querylog 约 1.2 GB
+
+每个目标在独立的子进程中运行，记录最短墙钟时间、CPU 时间与子进程峰值内存；
+结果写入 scripts/benchmarks/results/<标签>.json（默认标签为当前 git 提交），便于跨提交比较。
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import datetime
+import tempfile
+import subprocess
+import multiprocessing
+from contextlib import redirect_stdout
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+SCRIPTS_DIR = os.path.dirname(BENCH_DIR)
+RESULTS_DIR = os.path.join(BENCH_DIR, "results")
+sys.path.insert(0, SCRIPTS_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+import fixtures
+from pipeline_metrics import peak_rss_kb
+
+SCALES = {
+    "small": {"rules": 100000, "querylog_mb": 50},
+    "medium": {"rules": 1000000, "querylog_mb": 300},
+    "large": {"rules": 5000000, "querylog_mb": 1200},
+}
+
+def _quiet(func, *args, **kwargs):
+    """执行函数并丢弃其打印输出"""
+    with open(os.devnull, "w") as devnull, redirect_stdout(devnull):
+        return func(*args, **kwargs)
+
+def _link_or_copy(src, dst):
+    """优先使用硬链接放置输入文件（聚合脚本会删除 querylog，硬链接不影响夹具本身）"""
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copyfile(src, dst)
+
+# ---------------------------------------------------------------- 目标
+# 每个目标接收 (夹具信息, 工作目录)，返回 (计时函数, 处理条目数[, 报告函数])；计时函数只包含被测代码，
+# 可选的报告函数在计时结束后调用，返回的字典写入结果的 "report" 字段
+
+def target_deduplicate_rules(inputs, workdir):
+    import adguard_rules_merger as merger
+    rules = fixtures.load_rules(inputs["rules"])
+    return (lambda: merger.deduplicate_rules(rules)), len(rules)
+
+def target_remove_conflicting_rules(inputs, workdir):
+    import adguard_rules_merger as merger
+    rules = fixtures.load_rules(inputs["rules"])
+    blacklist = [r for r in rules if not r.startswith("@@")]
+    whitelist = [r for r in rules if r.startswith("@@")]
+    return (lambda: _quiet(merger.remove_conflicting_rules, blacklist, whitelist)), len(rules)
+
+def target_process_rules(inputs, workdir):
+    import adguard_rules_merger as merger
+    rules = fixtures.load_rules(inputs["rules"])
+    return (lambda: merger.process_rules(rules)), len(rules)
+
+def _prepare_aggregate(inputs, workdir):
+    """在工作目录中摆放 querylog，并把聚合脚本的路径常量指向工作目录"""
+    import aggregate_domains
+    logs_dir = os.path.join(workdir, "logs")
+    os.makedirs(logs_dir, exist_ok=True)
+    _link_or_copy(inputs["querylog"], os.path.join(logs_dir, "querylog.json"))
+    aggregate_domains.LOGS_DIR = logs_dir
+    aggregate_domains.OUTPUT_FILE = os.path.join(logs_dir, "domain name.txt")
+    aggregate_domains.LOG_FILE = os.path.join(logs_dir, "log")
+    aggregate_domains.COUNT_STORE_FILE = os.path.join(workdir, "domain_counts.sqlite3")
+    return aggregate_domains
+
+def target_aggregate_domains(inputs, workdir):
+    aggregate_domains = _prepare_aggregate(inputs, workdir)
+    metrics_file = os.path.join(workdir, "metrics.json")
+    return (lambda: _quiet(aggregate_domains.main, metrics_file=metrics_file)), os.path.getsize(inputs["querylog"])
+
+def target_simplifier_run(inputs, workdir):
+    from adguard_rules_simplifier import AdGuardRulesSimplifier
+    # 先用聚合脚本生成 domain name.txt，作为简化器的输入（不计时）
+    aggregate_domains = _prepare_aggregate(inputs, workdir)
+    _quiet(aggregate_domains.main, metrics_file=os.path.join(workdir, "metrics.json"))
+    simplifier = AdGuardRulesSimplifier()
+    simplifier.domain_file = aggregate_domains.OUTPUT_FILE
+    simplifier.count_store_file = aggregate_domains.COUNT_STORE_FILE
+    simplifier.black_url = fixtures.rules_file_with_header(inputs["rules"], os.path.join(workdir, "Black.txt"))
+    simplifier.white_file = os.path.join(workdir, "White.txt")
+    simplifier.output_file = os.path.join(workdir, "pure black.txt")
+    # 每次重复都完整运行，不因输入未变化而跳过
+    simplifier.fingerprint_file = os.path.join(workdir, "fingerprint.json")
+    simplifier.force = True
+    # 秋风与 GitHub 加速规则改用本地夹具，避免网络影响计时
+    simplifier.autumn_url = inputs["rules_small"]
+    simplifier.github_url = inputs["rules_small"]
+    metrics_file = os.path.join(workdir, "simplifier-metrics.json")
+    return (lambda: _quiet(simplifier.run, "2025-11-01 00:00:00", metrics_file=metrics_file)), len(fixtures.load_rules(inputs["rules"]))
+
+# 去重准确性评估的配置：(时间窗口分钟数, 布隆过滤器 MB)
+DEDUP_CONFIGS = [(60, 0), (60, 16), (0, 16), (0, 1), (0, 0.125)]
+
+def _querylog_event_keys(path):
+    """按文件顺序提取 querylog 中的 (域名, 时间, IP, 类型) 事件键"""
+    keys = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            entry = json.loads(line)
+            keys.append((entry["QH"], entry["T"], entry["IP"], entry["QT"]))
+    return keys
+
+def _dedup_accuracy(keys, window, bloom_mb):
+    """与精确集合去重逐条比对，统计误丢的新事件（假阳性）与漏判的重复事件"""
+    from event_dedup import EventDeduper
+    dedup = EventDeduper(window, bloom_mb)
+    exact = set()
+    false_duplicates = missed_duplicates = 0
+    for key in keys:
+        is_new = key not in exact
+        exact.add(key)
+        if dedup.add(key, key[1]) != is_new:
+            if is_new:
+                false_duplicates += 1
+            else:
+                missed_duplicates += 1
+    stats = dedup.stats()
+    unique = len(exact)
+    return {
+        "events": len(keys),
+        "unique": unique,
+        "false_duplicates": false_duplicates,
+        "false_duplicate_rate": round(false_duplicates / unique, 8) if unique else 0,
+        "missed_duplicates": missed_duplicates,
+        "late_events": stats["late_events"],
+        "bloom_expected_fp_rate": stats["bloom_expected_fp_rate"],
+    }
+
+def target_event_dedup(inputs, workdir):
+    import aggregate_domains
+    from event_dedup import EventDeduper
+    keys = _querylog_event_keys(inputs["querylog"])
+    # 模拟先读 querylog.json 再读轮转出的 querylog.json.1：后半段在前，前半段全部成为迟到事件
+    half = len(keys) // 2
+    keys = keys[half:] + keys[:half]
+
+    def run():
+        dedup = EventDeduper(aggregate_domains.DEDUP_WINDOW_MINUTES, aggregate_domains.DEDUP_BLOOM_MB)
+        for key in keys:
+            dedup.add(key, key[1])
+
+    def report():
+        return {f"window_{w}m_bloom_{b}mb": _dedup_accuracy(keys, w, b) for w, b in DEDUP_CONFIGS}
+
+    return run, len(keys), report
+
+def _extract_mb_per_sec(path, backend):
+    """只计分块读取与字段提取（不含统计与去重）的吞吐量"""
+    import aggregate_domains
+    from querylog_fields import resolve_backend
+    backend = resolve_backend(backend)
+    start = time.perf_counter()
+    for _ in aggregate_domains.iter_log_records(path, backend=backend):
+        pass
+    return round(os.path.getsize(path) / 1024 / 1024 / (time.perf_counter() - start), 2)
+
+def target_querylog_fields(inputs, workdir):
+    import querylog_fields
+    path = inputs["querylog"]
+
+    def report():
+        backends = ["json", "regex"] + (["orjson"] if querylog_fields.orjson is not None else [])
+        return {"mb_per_sec": {backend: _extract_mb_per_sec(path, backend) for backend in backends}}
+
+    return (lambda: _extract_mb_per_sec(path, "auto")), os.path.getsize(path), report
+
+# 近似计数准确性评估的配置：(top_k, Sketch MB)
+APPROX_CONFIGS = [(1000, 1), (1000, 8), (10000, 1), (10000, 8)]
+
+def _approx_accuracy(domains, exact, top_k, sketch_mb):
+    """与精确计数比对：top_k 召回率、返回域名的计数相对误差"""
+    from heavy_hitters import HeavyHitters
+    heavy = HeavyHitters(top_k, sketch_mb)
+    for domain in domains:
+        heavy.add(domain)
+    approx = heavy.top()
+    exact_top = {domain for domain, _ in exact.most_common(top_k)}
+    # 与第 top_k 名次数相同的域名都算作正确的 top_k 成员
+    threshold = exact.most_common(top_k)[-1][1] if exact else 0
+    hits = sum(1 for domain, _ in approx if domain in exact_top or exact[domain] >= threshold)
+    errors = [(count - exact[domain]) / exact[domain] for domain, count in approx]
+    return {
+        "recall": round(hits / len(exact_top), 6) if exact_top else 1.0,
+        "mean_relative_error": round(sum(errors) / len(errors), 6) if errors else 0.0,
+        "max_relative_error": round(max(errors), 6) if errors else 0.0,
+        "sketch_mb": heavy.stats()["sketch_mb"],
+    }
+
+def target_approx_counts(inputs, workdir):
+    from collections import Counter
+    from heavy_hitters import HeavyHitters
+    domains = [key[0] for key in _querylog_event_keys(inputs["querylog"])]
+
+    def run():
+        heavy = HeavyHitters(APPROX_CONFIGS[0][0], APPROX_CONFIGS[0][1])
+        for domain in domains:
+            heavy.add(domain)
+        heavy.top()
+
+    def report():
+        exact = Counter(domains)
+        result = {"events": len(domains), "distinct_domains": len(exact)}
+        for top_k, sketch_mb in APPROX_CONFIGS:
+            result[f"top_{top_k}_sketch_{sketch_mb}mb"] = _approx_accuracy(domains, exact, top_k, sketch_mb)
+        return result
+
+    return run, len(domains), report
+
+# 规则匹配的已知结果：(规则, 主机名, 期望结果)，与 AdGuard Home 的匹配语义一致
+MATCHER_CASES = [
+    ("||ads.example.com^", "ads.example.com", "blocked"),
+    ("||ads.example.com^", "x.ads.example.com", "blocked"),
+    ("0.0.0.0 hosts.example.com", "sub.hosts.example.com", "none"),
+    # 没有 ^ 结尾的 || 规则按前缀子串匹配，还会命中其他域名
+    ("||ads.example.com", "ads.example.com", "blocked"),
+    ("||ads.example.com", "ads.example.community", "blocked"),
+    # 纯域名行只匹配域名本身
+    ("plain.org", "plain.org", "blocked"),
+    ("plain.org", "sub.plain.org", "none"),
+    # 不是合法域名的无锚点模式按子串匹配
+    ("-ad.sm.cn", "foo-ad.sm.cn", "blocked"),
+    ("-ad.sm.cn", "ad.sm.cn", "none"),
+    (".x.com", "a.x.com", "blocked"),
+    (".x.com", "x.com", "none"),
+    ("*-ad.sm.cn*", "foo-ad.sm.cn", "blocked"),
+    ("/^ad[0-9]+\\./", "ad12.example.com", "blocked"),
+]
+
+def check_matcher_cases(cases=MATCHER_CASES):
+    """逐条核对已知结果，返回不一致的 [(规则, 主机名, 期望, 实际), ...]"""
+    from rule_matcher import RuleMatcher
+    failed = []
+    for rule, host, expected in cases:
+        verdict = RuleMatcher([rule]).classify(host).verdict
+        if verdict != expected:
+            failed.append((rule, host, expected, verdict))
+    return failed
+
+# 子域清理前后必须得到相同结论的 (规则列表, 主机名)
+PRUNE_CASES = [
+    (["||example.com^", "||ads.example.com^"], "ads.example.com"),
+    (["||example.com^", "ads.example.com"], "ads.example.com"),
+    (["||example.com^", "0.0.0.0 ads.example.com"], "ads.example.com"),
+    (["||example.com^", "||ads.example.com"], "ads.example.community"),
+    (["||example.com^", "||ads.example.com|"], "ads.example.community"),
+    (["||example.com^", "||ads.example.com/path"], "ads.example.com.evil.org"),
+]
+
+def check_prune_cases(cases=PRUNE_CASES):
+    """核对 prune_covered_subdomains 不改变匹配结论，返回不一致的 [(规则列表, 主机名, 清理前, 清理后), ...]"""
+    from rule_matcher import RuleMatcher
+    from adguard_rules_merger import prune_covered_subdomains
+    failed = []
+    for rules, host in cases:
+        kept, _ = _quiet(prune_covered_subdomains, rules)
+        before = RuleMatcher(rules).classify(host).verdict
+        after = RuleMatcher(kept).classify(host).verdict
+        if before != after:
+            failed.append((rules, host, before, after))
+    return failed
+
+def target_rule_matcher(inputs, workdir):
+    from collections import Counter
+    from rule_matcher import RuleMatcher
+    rules = fixtures.load_rules(inputs["rules"])
+    hosts = [key[0] for key in _querylog_event_keys(inputs["querylog"])]
+
+    def run():
+        # 每次重复都重新建立匹配器，计时包含规则加载与空缓存下的匹配
+        matcher = RuleMatcher(rules)
+        for _ in matcher.classify_many(hosts):
+            pass
+
+    def report():
+        start = time.perf_counter()
+        matcher = RuleMatcher(rules)
+        load_seconds = time.perf_counter() - start
+        start = time.perf_counter()
+        verdicts = Counter(result.verdict for _, result in matcher.classify_many(hosts))
+        return {
+            "load_seconds": round(load_seconds, 3),
+            "match_seconds": round(time.perf_counter() - start, 3),
+            "distinct_hosts": matcher.cache_misses,
+            "verdicts": dict(verdicts),
+            "matcher": matcher.stats(),
+            "cases_failed": check_matcher_cases(),
+            "prune_cases_failed": check_prune_cases(),
+        }
+
+    return run, len(hosts), report
+
+def target_rule_snapshot(inputs, workdir):
+    from rule_matcher import load_matcher
+    from rule_snapshot import ensure_snapshot
+    black_file = fixtures.rules_file_with_header(inputs["rules"], os.path.join(workdir, "Black.txt"))
+    snapshot_file = os.path.join(workdir, "Black.snapshot")
+    start = time.perf_counter()
+    ensure_snapshot(black_file, snapshot_file)
+    build_seconds = time.perf_counter() - start
+
+    def run():
+        # 计时包含快照校验（Black.txt 的 SHA-256）与匹配器的建立
+        load_matcher(black_file, snapshot_file)
+
+    def report():
+        start = time.perf_counter()
+        _, text_rules = load_matcher(black_file, os.path.join(workdir, "missing.snapshot"))
+        text_seconds = time.perf_counter() - start
+        start = time.perf_counter()
+        _, snapshot_rules = load_matcher(black_file, snapshot_file)
+        snapshot_seconds = time.perf_counter() - start
+        return {
+            "build_seconds": round(build_seconds, 3),
+            "snapshot_bytes": os.path.getsize(snapshot_file),
+            "text_load_seconds": round(text_seconds, 3),
+            "snapshot_load_seconds": round(snapshot_seconds, 3),
+            "same_rules": text_rules == snapshot_rules,
+        }
+
+    return run, len(fixtures.load_rules(inputs["rules"])), report
+
+# 目标处理条目的计量单位（未列出的为规则条数）
+TARGET_UNITS = {
+    "aggregate_domains.main": "bytes",
+    "event_dedup": "events",
+    "querylog_fields": "bytes",
+    "approx_counts": "events",
+    "rule_matcher": "events",
+}
+
+TARGETS = {
+    "deduplicate_rules": target_deduplicate_rules,
+    "remove_conflicting_rules": target_remove_conflicting_rules,
+    "process_rules": target_process_rules,
+    "aggregate_domains.main": target_aggregate_domains,
+    "AdGuardRulesSimplifier.run": target_simplifier_run,
+    "event_dedup": target_event_dedup,
+    "querylog_fields": target_querylog_fields,
+    "approx_counts": target_approx_counts,
+    "rule_matcher": target_rule_matcher,
+    "rule_snapshot": target_rule_snapshot,
+}
+
+# ---------------------------------------------------------------- 运行
+
+def _run_target(name, inputs, repeat, queue):
+    """子进程入口：准备输入后重复计时，回传最短耗时与峰值内存"""
+    best_wall = best_cpu = None
+    items = 0
+    report = None
+    for _ in range(repeat):
+        workdir = tempfile.mkdtemp(prefix="adg-bench-")
+        try:
+            func, items, *rest = TARGETS[name](inputs, workdir)
+            start_wall, start_cpu = time.perf_counter(), time.process_time()
+            func()
+            wall, cpu = time.perf_counter() - start_wall, time.process_time() - start_cpu
+            if rest and report is None:
+                report = rest[0]()
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+        if best_wall is None or wall < best_wall:
+            best_wall, best_cpu = wall, cpu
+    result = {"wall_time": round(best_wall, 6), "cpu_time": round(best_cpu, 6), "peak_rss_kb": peak_rss_kb(),
+              "items": items, "unit": TARGET_UNITS.get(name, "rules"),
+              "items_per_sec": round(items / best_wall, 1) if best_wall else None}
+    if report is not None:
+        result["report"] = report
+    queue.put(result)
+
+def run_target(name, inputs, repeat):
+    """在独立子进程中运行单个目标，避免前一个目标的内存影响峰值统计"""
+    ctx = multiprocessing.get_context("spawn")
+    queue = ctx.Queue()
+    proc = ctx.Process(target=_run_target, args=(name, inputs, repeat, queue))
+    proc.start()
+    proc.join()
+    if proc.exitcode != 0:
+        return {"error": f"子进程退出码 {proc.exitcode}"}
+    return queue.get()
+
+def git_commit():
+    """返回当前 git 提交的短哈希，不在 git 仓库中时返回 None"""
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=SCRIPTS_DIR,
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def compare(old_path, new_path):
+    """对比两份结果文件，打印各目标的耗时变化"""
+    with open(old_path, "r", encoding="utf-8") as f:
+        old = json.load(f)
+    with open(new_path, "r", encoding="utf-8") as f:
+        new = json.load(f)
+    print(f"{'目标':<30}{old.get('label', '旧'):>14}{new.get('label', '新'):>14}{'变化':>10}")
+    for name, result in new["results"].items():
+        before = old["results"].get(name, {}).get("wall_time")
+        after = result.get("wall_time")
+        if before and after:
+            print(f"{name:<30}{before:>13.3f}s{after:>13.3f}s{before / after:>9.2f}x")
+        else:
+            print(f"{name:<30}{str(before):>14}{str(after):>14}{'-':>10}")
+
+def _arg(argv, name, default=None):
+    if name in argv:
+        try:
+            return argv[argv.index(name) + 1]
+        except IndexError:
+            pass
+    return default
+
+def main(argv):
+    if "--compare" in argv:
+        idx = argv.index("--compare")
+        compare(argv[idx + 1], argv[idx + 2])
+        return
+
+    scale = _arg(argv, "--scale", "small")
+    rules = int(_arg(argv, "--rules", SCALES[scale]["rules"]))
+    querylog_mb = int(_arg(argv, "--querylog-mb", SCALES[scale]["querylog_mb"]))
+    repeat = int(_arg(argv, "--repeat", 1))
+    names = [argv[i + 1] for i, a in enumerate(argv) if a == "--target" and i + 1 < len(argv)] or list(TARGETS)
+    label = _arg(argv, "--label") or git_commit() or datetime.datetime.now().strftime("%Y%m%d-%H%M%S")
+
+    print(f"准备夹具: 规则 {rules} 行，querylog 约 {querylog_mb} MB（首次生成较慢）...")
+    inputs = {
+        "rules": fixtures.rule_fixture(rules),
+        "rules_small": fixtures.rule_fixture(min(rules, 20000)),
+        "querylog": fixtures.querylog_fixture(querylog_mb),
+    }
+
+    results = {}
+    for name in names:
+        if name not in TARGETS:
+            print(f"未知目标: {name}（可选: {', '.join(TARGETS)}）")
+            continue
+        print(f"运行 {name} ...")
+        results[name] = run_target(name, inputs, repeat)
+        print(f"  {results[name]}")
+
+    report = {
+        "label": label,
+        "git_commit": git_commit(),
+        "created_at": datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "python": sys.version.split()[0],
+        "scale": {"rules": rules, "querylog_mb": querylog_mb, "repeat": repeat},
+        "results": results,
+    }
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    path = os.path.join(RESULTS_DIR, f"{label}.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"结果已写入: {path}")
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,328 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""域名累计计数的持久化存储（SQLite）
+
+domain name.txt 仍是入库的权威文本，由本存储导出；存储本身放在 scripts/cache（不入库，由 Actions 缓存持久化）。
+- 每次打开时核对文本文件的 SHA-1 与上次导出时记录的是否一致，不一致（首次使用、缓存丢失、文本被手工修改）
+  时从文本重新导入；
+- 新计数以 UPSERT 累加，不再解析整个文本；
+- 导出时按 (计数降序, 域名升序) 索引顺序流式写出，不在 Python 中排序。
+
+另外按时间分桶保存计数，用于筛选“最近 N 天内查询次数 ≥ K”的域名：
+- 新计数先记入小时桶（按日志时间戳中的本地时间，"YYYY-MM-DDTHH"）；
+- 比存储中最新小时早 HOURLY_RETENTION_HOURS 以上的小时桶合并为天桶（"YYYY-MM-DD"）；
+- 比最新一天早 DAILY_RETENTION_DAYS 以上的天桶被删除。
+分桶数据只存在于本存储中，不能从 domain name.txt 重建；缓存丢失后从头累积。
+
+规则命中归因（见 rule_hits.py）也保存在这里：rule_hits 按天记录每条规则的命中次数（与天桶一同过期），
+rule_first_seen 记录当前规则列表中每条规则首次出现的日期，attributed_days 记录每天参与归因的查询次数
+（某天没有记录说明那天的日志没有聚合，那天没有命中不能说明规则无用）。
+"""
+
+import os
+import hashlib
+import sqlite3
+from datetime import datetime, timedelta
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+STORE_FILE = os.path.join(REPO_ROOT, "scripts", "cache", "domain_counts.sqlite3")
+# 导出时每次写入的行数
+EXPORT_BATCH_ROWS = 10000
+# 小时桶保留的小时数，更早的合并为天桶
+HOURLY_RETENTION_HOURS = 48
+# 天桶保留的天数，更早的删除
+DAILY_RETENTION_DAYS = 400
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS domain_counts (
+    domain TEXT PRIMARY KEY,
+    count INTEGER NOT NULL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS domain_counts_order ON domain_counts (count DESC, domain);
+CREATE TABLE IF NOT EXISTS hourly_counts (
+    hour TEXT NOT NULL,
+    domain TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (hour, domain)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS daily_counts (
+    day TEXT NOT NULL,
+    domain TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (day, domain)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS rule_hits (
+    day TEXT NOT NULL,
+    rule TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (day, rule)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS rule_first_seen (
+    rule TEXT PRIMARY KEY,
+    day TEXT NOT NULL
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS attributed_days (
+    day TEXT PRIMARY KEY,
+    events INTEGER NOT NULL
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+def file_sha1(path):
+    """计算文件内容的 SHA-1，文件不存在时返回 None"""
+    digest = hashlib.sha1()
+    try:
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(block)
+    except FileNotFoundError:
+        return None
+    return digest.hexdigest()
+
+def iter_text_counts(text_file):
+    """逐行解析 domain name.txt，产出 (域名, 计数)；格式不符的行打印警告后跳过"""
+    with open(text_file, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                parts = line.rsplit(' ', 1)
+                if len(parts) == 2:
+                    domain, count = parts
+                    try:
+                        yield domain, int(count)
+                    except ValueError:
+                        print(f"Warning: Invalid count format in line: {line}")
+
+class DomainCountStore:
+    """域名计数存储；可用作上下文管理器，退出时关闭连接（未提交的修改会回滚）"""
+
+    def __init__(self, path=STORE_FILE):
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        try:
+            self.conn = self._connect()
+        except sqlite3.DatabaseError as e:
+            # 缓存文件损坏时直接丢弃重建，数据会从 domain name.txt 重新导入
+            print(f"Domain count store is unreadable ({e}), rebuilding: {path}")
+            for suffix in ("", "-wal", "-shm"):
+                try:
+                    os.remove(path + suffix)
+                except FileNotFoundError:
+                    pass
+            self.conn = self._connect()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.executescript(_SCHEMA)
+        conn.commit()
+        return conn
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def close(self):
+        self.conn.close()
+
+    def __len__(self):
+        return self.conn.execute("SELECT COUNT(*) FROM domain_counts").fetchone()[0]
+
+    def _get_meta(self, key):
+        row = self.conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def _set_meta(self, key, value):
+        self.conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value))
+
+    def is_synced(self, text_file):
+        """存储内容是否与 text_file 一致（以上次导出/导入时记录的 SHA-1 判断）"""
+        recorded = self._get_meta("text_sha1")
+        return recorded is not None and recorded == file_sha1(text_file)
+
+    def import_text(self, text_file):
+        """清空存储并从 domain name.txt 导入（重复的域名以最后一行为准），返回导入的域名数"""
+        # 批量导入时先去掉排序索引，导入后一次性重建，比逐行维护索引快得多
+        self.conn.execute("DROP INDEX IF EXISTS domain_counts_order")
+        self.conn.execute("DELETE FROM domain_counts")
+        if os.path.exists(text_file):
+            self.conn.executemany("INSERT OR REPLACE INTO domain_counts (domain, count) VALUES (?, ?)",
+                                  iter_text_counts(text_file))
+        self.conn.executescript(_SCHEMA)
+        self._set_meta("text_sha1", file_sha1(text_file) or "")
+        self.conn.commit()
+        return len(self)
+
+    def sync_with_text(self, text_file):
+        """与文本不一致时从文本重新导入；返回是否进行了导入"""
+        if self.is_synced(text_file):
+            return False
+        self.import_text(text_file)
+        return True
+
+    def upsert(self, counts):
+        """把 {域名: 新增计数} 累加进存储（不提交，由 export_text 或 commit 一并提交）"""
+        self.conn.executemany(
+            "INSERT INTO domain_counts (domain, count) VALUES (?, ?) "
+            "ON CONFLICT (domain) DO UPDATE SET count = count + excluded.count",
+            counts.items())
+
+    def upsert_hourly(self, hourly_counts):
+        """把 {(域名, 小时): 新增计数} 累加进小时桶（不提交）；小时格式不符的条目忽略"""
+        rows = []
+        for (domain, hour), count in hourly_counts.items():
+            try:
+                datetime.strptime(hour, "%Y-%m-%dT%H")
+            except (TypeError, ValueError):
+                continue
+            rows.append((hour, domain, count))
+        self.conn.executemany(
+            "INSERT INTO hourly_counts (hour, domain, count) VALUES (?, ?, ?) "
+            "ON CONFLICT (hour, domain) DO UPDATE SET count = count + excluded.count",
+            rows)
+
+    def compact(self, hourly_retention=HOURLY_RETENTION_HOURS, daily_retention=DAILY_RETENTION_DAYS):
+        """把旧的小时桶合并为天桶并删除过期的天桶（不提交），返回 (合并的小时桶行数, 删除的天桶行数)"""
+        newest_hour = self.conn.execute("SELECT MAX(hour) FROM hourly_counts").fetchone()[0]
+        rolled = 0
+        if newest_hour:
+            cutoff = (datetime.strptime(newest_hour, "%Y-%m-%dT%H")
+                      - timedelta(hours=hourly_retention)).strftime("%Y-%m-%dT%H")
+            self.conn.execute(
+                "INSERT INTO daily_counts (day, domain, count) "
+                "SELECT substr(hour, 1, 10), domain, SUM(count) FROM hourly_counts WHERE hour < ? "
+                "GROUP BY substr(hour, 1, 10), domain "
+                "ON CONFLICT (day, domain) DO UPDATE SET count = count + excluded.count",
+                (cutoff,))
+            rolled = self.conn.execute("DELETE FROM hourly_counts WHERE hour < ?", (cutoff,)).rowcount
+        newest_day = self.conn.execute("SELECT MAX(day) FROM daily_counts").fetchone()[0]
+        expired = 0
+        if newest_day:
+            cutoff = (datetime.strptime(newest_day, "%Y-%m-%d")
+                      - timedelta(days=daily_retention)).strftime("%Y-%m-%d")
+            expired = self.conn.execute("DELETE FROM daily_counts WHERE day < ?", (cutoff,)).rowcount
+            self.conn.execute("DELETE FROM rule_hits WHERE day < ?", (cutoff,))
+            self.conn.execute("DELETE FROM attributed_days WHERE day < ?", (cutoff,))
+        return rolled, expired
+
+    def bucket_history_start(self):
+        """分桶数据覆盖的最早日期（"YYYY-MM-DD"），没有分桶数据时返回 None"""
+        days = [row[0][:10] for row in self.conn.execute(
+            "SELECT MIN(day) FROM daily_counts UNION ALL SELECT MIN(hour) FROM hourly_counts") if row[0]]
+        return min(days) if days else None
+
+    def recent_domains(self, days, min_hits=1, now=None):
+        """返回最近 days 天（含今天）内累计查询次数 ≥ min_hits 的域名集合"""
+        now = now or datetime.now()
+        cutoff = (now - timedelta(days=days - 1)).strftime("%Y-%m-%d")
+        rows = self.conn.execute(
+            "SELECT domain FROM ("
+            "  SELECT domain, count FROM daily_counts WHERE day >= ?"
+            "  UNION ALL SELECT domain, count FROM hourly_counts WHERE hour >= ?"
+            ") GROUP BY domain HAVING SUM(count) >= ?",
+            (cutoff, cutoff, min_hits))
+        return {domain for (domain,) in rows}
+
+    def frequent_domains(self, min_hits):
+        """返回累计查询次数 ≥ min_hits 的域名集合"""
+        rows = self.conn.execute("SELECT domain FROM domain_counts WHERE count >= ?", (min_hits,))
+        return {domain for (domain,) in rows}
+
+    def upsert_rule_hits(self, hits):
+        """把 {(规则, 日期): 新增命中次数} 累加进 rule_hits（不提交）；日期格式不符的条目忽略"""
+        rows = []
+        for (rule, day), count in hits.items():
+            try:
+                datetime.strptime(day, "%Y-%m-%d")
+            except (TypeError, ValueError):
+                continue
+            rows.append((day, rule, count))
+        self.conn.executemany(
+            "INSERT INTO rule_hits (day, rule, count) VALUES (?, ?, ?) "
+            "ON CONFLICT (day, rule) DO UPDATE SET count = count + excluded.count",
+            rows)
+
+    def record_attributed_days(self, day_events):
+        """把 {日期: 参与归因的查询次数} 累加进 attributed_days（不提交）；日期格式不符的条目忽略"""
+        rows = []
+        for day, events in day_events.items():
+            try:
+                datetime.strptime(day, "%Y-%m-%d")
+            except (TypeError, ValueError):
+                continue
+            rows.append((day, events))
+        self.conn.executemany(
+            "INSERT INTO attributed_days (day, events) VALUES (?, ?) "
+            "ON CONFLICT (day) DO UPDATE SET events = events + excluded.events",
+            rows)
+
+    def attributed_days(self):
+        """返回 {日期: 参与归因的查询次数}"""
+        return dict(self.conn.execute("SELECT day, events FROM attributed_days"))
+
+    def register_rules(self, rules, day):
+        """登记当前规则列表（不提交）：新规则记为 day 首次出现，已登记的保留原日期，不再出现的规则移除"""
+        self.conn.execute("CREATE TEMP TABLE IF NOT EXISTS current_rules (rule TEXT PRIMARY KEY) WITHOUT ROWID")
+        self.conn.execute("DELETE FROM current_rules")
+        self.conn.executemany("INSERT OR IGNORE INTO current_rules (rule) VALUES (?)", ((rule,) for rule in rules))
+        self.conn.execute("DELETE FROM rule_first_seen WHERE rule NOT IN (SELECT rule FROM current_rules)")
+        added = self.conn.execute(
+            "INSERT OR IGNORE INTO rule_first_seen (rule, day) SELECT rule, ? FROM current_rules", (day,)).rowcount
+        self.conn.execute("DELETE FROM current_rules")
+        return added
+
+    def rule_history_start(self):
+        """开始记录规则命中的日期（最早登记规则的日期），没有记录时返回 None"""
+        return self.conn.execute("SELECT MIN(day) FROM rule_first_seen").fetchone()[0]
+
+    def unhit_rules(self, since):
+        """返回 since（"YYYY-MM-DD"）当天及之前就已登记、且从 since 起没有命中的规则集合"""
+        rows = self.conn.execute(
+            "SELECT rule FROM rule_first_seen WHERE day <= ? "
+            "AND rule NOT IN (SELECT rule FROM rule_hits WHERE day >= ?)",
+            (since, since))
+        return {rule for (rule,) in rows}
+
+    def commit(self):
+        self.conn.commit()
+
+    def iter_sorted(self, limit=None):
+        """按计数降序、域名升序产出 (域名, 计数)；给出 limit 时只取前 limit 个"""
+        if limit is not None:
+            return self.conn.execute(
+                "SELECT domain, count FROM domain_counts ORDER BY count DESC, domain LIMIT ?", (limit,))
+        return self.conn.execute("SELECT domain, count FROM domain_counts ORDER BY count DESC, domain")
+
+    def iter_domains(self):
+        """产出全部域名"""
+        for (domain,) in self.conn.execute("SELECT domain FROM domain_counts"):
+            yield domain
+
+    def export_text(self, text_file, limit=None):
+        """把存储导出为 domain name.txt（先写临时文件再替换），记录其 SHA-1 并提交；返回写出的行数
+
+        给出 limit 时只导出计数最高的 limit 个域名，存储本身不受影响（其余域名的累计计数仍保留）。
+        """
+        digest = hashlib.sha1()
+        rows = 0
+        tmp_file = text_file + ".tmp"
+        cursor = self.iter_sorted(limit)
+        with open(tmp_file, 'wb') as f:
+            while True:
+                batch = cursor.fetchmany(EXPORT_BATCH_ROWS)
+                if not batch:
+                    break
+                data = "".join(f"{domain} {count}\n" for domain, count in batch).encode('utf-8')
+                f.write(data)
+                digest.update(data)
+                rows += len(batch)
+        os.replace(tmp_file, text_file)
+        self._set_meta("text_sha1", digest.hexdigest())
+        self.conn.commit()
+        return rows
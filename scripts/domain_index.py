@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""域名后缀索引：按反向标签（顶级域 -> 子域）查找覆盖某个域名的父域"""
+
+from typing import Dict, Iterable, Iterator, Optional, Set, Tuple
+
+def iter_domain_suffixes(domain: str, include_self: bool = True) -> Iterator[str]:
+    """从顶级域开始依次产出域名后缀：a.b.com -> com, b.com, a.b.com"""
+    pos = len(domain)
+    while True:
+        pos = domain.rfind(".", 0, pos)
+        if pos < 0:
+            break
+        yield domain[pos+1:]
+    if include_self:
+        yield domain
+
+def iter_parent_domains(domain: str) -> Iterator[str]:
+    """依次产出域名的所有父域（不含自身）：a.b.com -> com, b.com"""
+    return iter_domain_suffixes(domain, include_self=False)
+
+def collect_parent_domains(domains: Iterable[str]) -> Set[str]:
+    """收集所有域名的严格父域：a.b.com -> {b.com, com}
+
+    用于反向判断“是否有某个域名落在给定父域之下”，每个后缀只需一次集合查询。
+    从最近的父域开始逐级加入，遇到已收集的后缀即停止（其更上层的父域此前已一并加入），
+    大量域名共享父域时构建开销接近线性。
+    """
+    parents: Set[str] = set()
+    for domain in domains:
+        pos = domain.find(".")
+        while pos >= 0:
+            parent = domain[pos+1:]
+            if parent in parents:
+                break
+            parents.add(parent)
+            pos = domain.find(".", pos + 1)
+    return parents
+
+class DomainSuffixIndex:
+    """基于哈希表的域名后缀索引
+
+    每个域名以完整字符串为键保存；查询时按反向标签逐级拼出后缀并查表，
+    单次查询为 O(标签数)，与索引规模无关。
+    """
+
+    __slots__ = ("_entries",)
+
+    def __init__(self, domains: Iterable[str] = ()):
+        self._entries: Dict[str, object] = {}
+        for domain in domains:
+            self.add(domain)
+
+    def add(self, domain: str, value: object = True):
+        """加入域名及其关联值（已存在时保留先加入的值）"""
+        self._entries.setdefault(domain.lower(), value)
+
+    def get(self, domain: str, default=None):
+        """精确查找域名的关联值"""
+        return self._entries.get(domain.lower(), default)
+
+    def __contains__(self, domain: str) -> bool:
+        return domain.lower() in self._entries
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __iter__(self):
+        return iter(self._entries)
+
+    def find_covering(self, domain: str, include_self: bool = True) -> Optional[Tuple[str, object]]:
+        """返回覆盖该域名的最上层索引项 (后缀, 值)；include_self=False 时只查严格父域"""
+        entries = self._entries
+        for suffix in iter_domain_suffixes(domain.lower(), include_self):
+            if suffix in entries:
+                return suffix, entries[suffix]
+        return None
+
+    def covers(self, domain: str, include_self: bool = True) -> bool:
+        """域名自身（include_self=True 时）或任一父域是否在索引中"""
+        return self.find_covering(domain, include_self) is not None
@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""内存有界的 querylog 事件去重
+
+querylog 基本按时间顺序写入，重复事件（同一域名、时间、客户端、查询类型）通常彼此相邻。
+EventDeduper 只精确保存最近一段时间窗口内的事件键，窗口之外的旧键被淘汰；
+可选的布隆过滤器以固定内存记住所有键，用于判断落在窗口之外的迟到事件。
+
+误判行为：
+- 窗口内的事件判断是精确的；
+- 迟到事件（时间早于窗口）在未启用布隆过滤器时一律按新事件计数，真正重复时会多计一次；
+- 启用布隆过滤器时，迟到事件若命中过滤器则按重复丢弃，存在假阳性（新事件被误丢），
+  概率约为 (1 - e^(-k*n/m))^k，n 为已见键数，m 为位数，k 为哈希函数个数。
+"""
+
+from math import exp, sqrt
+from array import array
+from datetime import datetime
+
+# 时间窗口默认保留的分钟数
+DEFAULT_WINDOW_MINUTES = 60
+# 布隆过滤器每个键在所属 64 位字内置位的个数
+BLOOM_HASHES = 7
+
+class BloomFilter:
+    """固定大小的分块布隆过滤器，键为可哈希对象（只在单个进程内使用，直接借用 Python 的 hash）
+
+    每个键只落在一个 64 位字内，一次哈希即可定出字的位置与字内的 7 个比特，
+    比逐位计算 k 个全局位置快得多；代价是同等内存下误判率略高于标准布隆过滤器。
+    """
+
+    __slots__ = ("words", "count")
+
+    def __init__(self, size_bytes):
+        self.words = array("Q", bytes(max(8, int(size_bytes) // 8 * 8)))
+        self.count = 0
+
+    def _locate(self, key):
+        h = hash(key) & 0xFFFFFFFFFFFFFFFF
+        # 乘法散列后的高位用于选出字内的 7 个比特，低位用于选字
+        g = (h * 0x9E3779B97F4A7C15) >> 64
+        mask = ((1 << (g & 63)) | (1 << (g >> 6 & 63)) | (1 << (g >> 12 & 63)) | (1 << (g >> 18 & 63))
+                | (1 << (g >> 24 & 63)) | (1 << (g >> 30 & 63)) | (1 << (g >> 36 & 63)))
+        return h % len(self.words), mask
+
+    def add(self, key):
+        """加入键，返回加入前是否可能已存在"""
+        index, mask = self._locate(key)
+        word = self.words[index]
+        if word & mask == mask:
+            return True
+        self.words[index] = word | mask
+        self.count += 1
+        return False
+
+    def __contains__(self, key):
+        index, mask = self._locate(key)
+        return self.words[index] & mask == mask
+
+    def size_bytes(self):
+        return len(self.words) * 8
+
+    def expected_false_positive_rate(self):
+        """按当前已加入的键数估算的假阳性概率（每个字内的键数按泊松分布计）"""
+        lam = self.count / len(self.words)
+        rate = 0.0
+        weight = exp(-lam)
+        for x in range(int(lam + 10 * sqrt(lam) + 20)):
+            if x:
+                weight *= lam / x
+            rate += weight * (1 - (1 - 1 / 64) ** (BLOOM_HASHES * x)) ** BLOOM_HASHES
+        return rate
+
+class EventDeduper:
+    """按分钟分桶的滑动窗口去重，可选布隆过滤器兜底
+
+    window_minutes 为精确保留的分钟数（相对于已见到的最新时间）；bloom_mb 为布隆过滤器大小（MB，0 表示不启用）。
+    """
+
+    def __init__(self, window_minutes=DEFAULT_WINDOW_MINUTES, bloom_mb=0):
+        self.window = max(0, int(window_minutes))
+        self.bloom = BloomFilter(int(bloom_mb * 1024 * 1024)) if bloom_mb and bloom_mb > 0 else None
+        # 分钟序号 -> 该分钟内的事件键集合
+        self.buckets = {}
+        self.newest = None
+        # 第一个事件所在的分钟（多进程分片据此找出可能与上一分片重复的事件）
+        self.first = None
+        # 统计：迟到事件数、迟到事件中被判为重复的数量、被淘汰的键数
+        self.late = 0
+        self.late_duplicates = 0
+        self.evicted = 0
+        self._last_prefix = None
+        self._last_minute = None
+
+    def minute(self, timestamp):
+        """把 ISO 时间戳换算为分钟序号（按时间戳中的本地时间，AdGuard Home 同一日志使用同一时区）"""
+        prefix = str(timestamp)[:16]
+        if prefix != self._last_prefix:
+            try:
+                dt = datetime.strptime(prefix, "%Y-%m-%dT%H:%M")
+                self._last_minute = dt.toordinal() * 1440 + dt.hour * 60 + dt.minute
+            except ValueError:
+                # 无法解析的时间戳归入当前最新的分钟
+                self._last_minute = self.newest if self.newest is not None else 0
+            self._last_prefix = prefix
+        return self._last_minute
+
+    def _evict(self):
+        oldest = self.newest - self.window
+        for minute in [m for m in self.buckets if m < oldest]:
+            self.evicted += len(self.buckets.pop(minute))
+
+    def add(self, key, timestamp):
+        """记录事件键，返回是否为新事件（False 表示判为重复）"""
+        minute = self.minute(timestamp)
+        if self.first is None:
+            self.first = minute
+        if self.newest is None or minute > self.newest:
+            self.newest = minute
+            self._evict()
+        if minute < self.newest - self.window:
+            # 迟到事件：窗口已淘汰，只能借助布隆过滤器判断
+            self.late += 1
+            if self.bloom is not None and self.bloom.add(key):
+                self.late_duplicates += 1
+                return False
+            return True
+        # 相同事件的时间戳相同，必然落在同一个分钟桶里
+        bucket = self.buckets.get(minute)
+        if bucket is None:
+            bucket = self.buckets[minute] = set()
+        elif key in bucket:
+            return False
+        bucket.add(key)
+        if self.bloom is not None:
+            self.bloom.add(key)
+        return True
+
+    def window_keys(self, after=None):
+        """窗口内精确保存的键（按分钟排序）；给出 after 时只取晚于该分钟的键"""
+        return [key for minute in sorted(self.buckets) if after is None or minute > after for key in self.buckets[minute]]
+
+    def __len__(self):
+        """窗口内精确保存的键数"""
+        return sum(len(bucket) for bucket in self.buckets.values())
+
+    def stats(self):
+        return {
+            "window_minutes": self.window,
+            "window_keys": len(self),
+            "evicted_keys": self.evicted,
+            "late_events": self.late,
+            "late_duplicates": self.late_duplicates,
+            "bloom_mb": round(self.bloom.size_bytes() / 1024 / 1024, 2) if self.bloom is not None else 0,
+            "bloom_expected_fp_rate": self.bloom.expected_false_positive_rate() if self.bloom is not None else None,
+        }
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""固定内存的近似域名计数：Count-Min Sketch + 热门域名小顶堆
+
+querylog 中 CDN / 追踪类随机标签子域几乎每次都不同，精确计数的 Counter 会随不同域名数无限增长。
+HeavyHitters 只保留：
+- 一个 depth 行、总大小约 sketch_mb MB 的 Count-Min Sketch，估计任意域名的出现次数；
+- 估计次数最高的 top_k 个候选域名及其估计值（小顶堆）；
+- 一个最多 BUFFER_KEYS 个域名的精确预聚合缓冲，写满后批量计入 Sketch，热门域名不必每次都更新 Sketch。
+
+误差行为：
+- 估计值只会偏高不会偏低（采用保守更新，偏差比普通更新小）；
+- 偏高量以高概率不超过 e / width × 总事件数，width 为每行计数器个数；
+- 次数接近第 top_k 名的域名可能被误入或漏出，热门域名的排名与次数基本准确。
+"""
+
+import heapq
+from array import array
+
+# Count-Min Sketch 的行数（哈希函数个数）
+SKETCH_DEPTH = 4
+# 默认 Sketch 大小（MB）
+DEFAULT_SKETCH_MB = 8
+# 预聚合缓冲最多保存的不同域名数
+BUFFER_KEYS = 65536
+
+class CountMinSketch:
+    """保守更新的 Count-Min Sketch，键为可哈希对象（只在单个进程内使用，直接借用 Python 的 hash）"""
+
+    __slots__ = ("table", "depth", "width", "total")
+
+    def __init__(self, size_bytes, depth=SKETCH_DEPTH):
+        itemsize = array("L").itemsize
+        self.depth = max(1, int(depth))
+        self.width = max(1, int(size_bytes) // (itemsize * self.depth))
+        # depth 行计数器连续存放在一个数组中，第 r 行位于 [r * width, (r + 1) * width)
+        self.table = array("L", bytes(self.depth * self.width * itemsize))
+        self.total = 0
+
+    def _indexes(self, key):
+        # 双重散列：由一次 hash 派生出各行的列位置
+        h = hash(key) & 0xFFFFFFFFFFFFFFFF
+        step = ((h * 0x9E3779B97F4A7C15) >> 64) | 1
+        width = self.width
+        return [r * width + (h + r * step) % width for r in range(self.depth)]
+
+    def add(self, key, count=1):
+        """计入 count 次，返回计入后的估计值"""
+        indexes = self._indexes(key)
+        table = self.table
+        estimate = min([table[i] for i in indexes]) + count
+        # 保守更新：只把小于新估计值的计数器抬高到新估计值
+        for i in indexes:
+            if table[i] < estimate:
+                table[i] = estimate
+        self.total += count
+        return estimate
+
+    def estimate(self, key):
+        table = self.table
+        return min([table[i] for i in self._indexes(key)])
+
+    def size_bytes(self):
+        return len(self.table) * self.table.itemsize
+
+    def error_bound(self):
+        """估计值偏高量的上界（以约 1 - e^-depth 的概率成立）"""
+        return 2.718281828459045 / self.width * self.total
+
+class HeavyHitters:
+    """流式统计出现次数最高的 top_k 个域名，内存由 top_k 与 sketch_mb 决定"""
+
+    def __init__(self, top_k, sketch_mb=DEFAULT_SKETCH_MB, depth=SKETCH_DEPTH):
+        self.top_k = max(1, int(top_k))
+        self.sketch = CountMinSketch(int(sketch_mb * 1024 * 1024), depth)
+        # 候选域名 -> 当前估计值；堆中的估计值可能过期（只会偏小），淘汰前再校正
+        self.candidates = {}
+        self.heap = []
+        self.evicted = 0
+        self.buffer = {}
+
+    def add(self, key):
+        """计入一次出现（先记入预聚合缓冲）"""
+        buffer = self.buffer
+        buffer[key] = buffer.get(key, 0) + 1
+        if len(buffer) >= BUFFER_KEYS:
+            self.flush()
+
+    def flush(self):
+        """把预聚合缓冲批量计入 Sketch 与候选堆"""
+        for key, count in self.buffer.items():
+            self._offer(key, count)
+        self.buffer = {}
+
+    def _offer(self, key, count):
+        estimate = self.sketch.add(key, count)
+        candidates = self.candidates
+        if key in candidates:
+            candidates[key] = estimate
+            return
+        heap = self.heap
+        if len(candidates) < self.top_k:
+            candidates[key] = estimate
+            heapq.heappush(heap, (estimate, key))
+            return
+        # 校正堆顶：估计值只增不减，过期的堆顶换成当前值后重新下沉
+        while heap[0][0] != candidates[heap[0][1]]:
+            heapq.heapreplace(heap, (candidates[heap[0][1]], heap[0][1]))
+        if estimate > heap[0][0]:
+            _, dropped = heapq.heapreplace(heap, (estimate, key))
+            del candidates[dropped]
+            candidates[key] = estimate
+            self.evicted += 1
+
+    def top(self):
+        """按估计次数降序、域名升序返回 [(域名, 估计次数), ...]"""
+        self.flush()
+        return sorted(self.candidates.items(), key=lambda x: (-x[1], x[0]))
+
+    def __len__(self):
+        return len(self.candidates)
+
+    def stats(self):
+        self.flush()
+        return {
+            "top_k": self.top_k,
+            "candidates": len(self.candidates),
+            "evicted_candidates": self.evicted,
+            "events": self.sketch.total,
+            "sketch_mb": round(self.sketch.size_bytes() / 1024 / 1024, 2),
+            "sketch_depth": self.sketch.depth,
+            "sketch_width": self.sketch.width,
+            "error_bound": round(self.sketch.error_bound(), 2),
+        }
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""输入指纹：输入与上次运行完全相同时跳过规则生成
+
+合并脚本与精简脚本各自把本次输入（规则源内容、domain name.txt、运行选项）与脚本版本（scripts/*.py 的内容）
+算成一个 SHA-256 指纹，成功写出结果后记入 scripts/logs/fingerprint.json（随规则文件一起入库）。
+下次运行时指纹相同且输出文件未被改动，就跳过解析、去重、写出等耗时阶段，输出文件保持原样，
+工作流也就不会只因文件头的更新时间变化而提交。指纹文件内容只取决于输入，不含时间，未变化时不会产生差异。
+"""
+
+import os
+import glob
+import json
+import hashlib
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+FINGERPRINT_FILE = os.path.join(SCRIPTS_DIR, "logs", "fingerprint.json")
+
+def file_digest(path):
+    """文件内容的 SHA-256，文件不存在时返回 None"""
+    digest = hashlib.sha256()
+    try:
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(block)
+    except (OSError, TypeError):
+        return None
+    return digest.hexdigest()
+
+def lines_digest(lines):
+    """规则行列表的 SHA-256（按行拼接）"""
+    digest = hashlib.sha256()
+    for line in lines:
+        digest.update(line.encode("utf-8", "surrogatepass"))
+        digest.update(b"\n")
+    return digest.hexdigest()
+
+def script_version():
+    """scripts 目录下各脚本内容的 SHA-256，脚本有任何修改都会使指纹失效"""
+    digest = hashlib.sha256()
+    for path in sorted(glob.glob(os.path.join(SCRIPTS_DIR, "*.py"))):
+        digest.update(os.path.basename(path).encode("utf-8"))
+        digest.update((file_digest(path) or "").encode("ascii"))
+    return digest.hexdigest()
+
+def compute_fingerprint(inputs):
+    """把可 JSON 序列化的输入描述（含脚本版本）算成指纹"""
+    payload = json.dumps({"script_version": script_version(), "inputs": inputs},
+                         ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+def load_fingerprints(path=None):
+    try:
+        with open(path or FINGERPRINT_FILE, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return data if isinstance(data, dict) else {}
+
+def get_fingerprint(name, path=None):
+    """读取 name 上次记录的 {"inputs": 指纹, "outputs": {...}}，没有时返回 {}"""
+    entry = load_fingerprints(path).get(name)
+    return entry if isinstance(entry, dict) else {}
+
+def save_fingerprint(name, inputs_fingerprint, outputs=None, path=None):
+    """记录 name 本次的输入指纹与输出内容哈希（先写临时文件再替换）"""
+    path = path or FINGERPRINT_FILE
+    data = load_fingerprints(path)
+    data[name] = {"inputs": inputs_fingerprint, "outputs": outputs or {}}
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp_path = path + ".tmp"
+    try:
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=2, sort_keys=True)
+            f.write("\n")
+        os.replace(tmp_path, path)
+    except OSError as e:
+        print(f"写入输入指纹失败 {path}: {e}")
+
+def output_record(path, written=None):
+    """输出文件的记录：整个文件的 SHA-256，以及 write_rule_file 给出的规则内容哈希（不含文件头）"""
+    record = {"file_sha256": file_digest(path)}
+    if written is not None:
+        record["sha256"] = written["sha256"]
+    return record
+
+def is_unchanged(name, inputs_fingerprint, output_files, path=None):
+    """指纹与上次相同，且各输出文件仍与上次写出的内容一致时返回 True"""
+    recorded = get_fingerprint(name, path)
+    if recorded.get("inputs") != inputs_fingerprint:
+        return False
+    outputs = recorded.get("outputs") or {}
+    for output_file in output_files:
+        record = outputs.get(os.path.basename(output_file)) or {}
+        if record.get("file_sha256") is None or record.get("file_sha256") != file_digest(output_file):
+            return False
+    return True
@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""流水线性能指标：记录各阶段的耗时、CPU 时间、峰值内存与规则进出数量
+
+用法:
+    metrics = PipelineMetrics("adguard_rules_merger")
+    with metrics.stage("dedupe") as st:
+        ...
+        st.rules_in, st.rules_out = len(rules), len(unique)
+    metrics.write()
+
+每次运行输出一个 JSON 文件（默认 scripts/reports/metrics/<脚本>-<时间>.json），
+便于跨运行比较，发现随规则增长而变慢的阶段。
+"""
+
+import os
+import sys
+import json
+import time
+import datetime
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:  # Windows 没有 resource 模块
+    resource = None
+
+# 指标文件默认目录（报告目录不入库，由工作流上传为 artifact）
+METRICS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "reports", "metrics")
+
+def peak_rss_kb():
+    """返回进程迄今为止的峰值常驻内存（KB），不支持的平台返回 None"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS 的 ru_maxrss 单位是字节，Linux 是 KB
+    return peak // 1024 if sys.platform == "darwin" else peak
+
+class StageRecord:
+    """单个阶段的指标记录"""
+
+    __slots__ = ("name", "labels", "wall_time", "cpu_time", "peak_rss_kb", "rules_in", "rules_out")
+
+    def __init__(self, name, labels=None):
+        self.name = name
+        self.labels = labels or {}
+        self.wall_time = 0.0
+        self.cpu_time = 0.0
+        self.peak_rss_kb = None
+        self.rules_in = None
+        self.rules_out = None
+
+    def to_dict(self):
+        record = {
+            "stage": self.name,
+            "wall_time": round(self.wall_time, 6),
+            "cpu_time": round(self.cpu_time, 6),
+            "peak_rss_kb": self.peak_rss_kb,
+            "rules_in": self.rules_in,
+            "rules_out": self.rules_out,
+        }
+        record.update(self.labels)
+        return record
+
+class PipelineMetrics:
+    """收集一次运行中各阶段的指标并写出 JSON"""
+
+    def __init__(self, script_name):
+        self.script_name = script_name
+        self.started_at = datetime.datetime.now()
+        self._start_wall = time.perf_counter()
+        self._start_cpu = time.process_time()
+        self.stages = []
+        self.extra = {}
+
+    @contextmanager
+    def stage(self, name, **labels):
+        """计量 with 块内的阶段；可在块内设置 rules_in / rules_out"""
+        record = StageRecord(name, labels)
+        start_wall = time.perf_counter()
+        start_cpu = time.process_time()
+        try:
+            yield record
+        finally:
+            record.wall_time = time.perf_counter() - start_wall
+            record.cpu_time = time.process_time() - start_cpu
+            record.peak_rss_kb = peak_rss_kb()
+            self.stages.append(record)
+
+    def record(self, name, wall_time, cpu_time=0.0, rules_in=None, rules_out=None, **labels):
+        """直接登记在别处（例如工作线程中）测得的阶段指标"""
+        record = StageRecord(name, labels)
+        record.wall_time = wall_time
+        record.cpu_time = cpu_time
+        record.peak_rss_kb = peak_rss_kb()
+        record.rules_in = rules_in
+        record.rules_out = rules_out
+        self.stages.append(record)
+        return record
+
+    def to_dict(self):
+        return {
+            "script": self.script_name,
+            "started_at": self.started_at.strftime("%Y-%m-%d %H:%M:%S"),
+            "finished_at": datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "wall_time": round(time.perf_counter() - self._start_wall, 6),
+            "cpu_time": round(time.process_time() - self._start_cpu, 6),
+            "peak_rss_kb": peak_rss_kb(),
+            "python": sys.version.split()[0],
+            **self.extra,
+            "stages": [s.to_dict() for s in self.stages],
+        }
+
+    def write(self, path=None):
+        """写出本次运行的指标文件，返回文件路径；失败时只打印警告"""
+        if path is None:
+            stamp = self.started_at.strftime("%Y%m%d-%H%M%S")
+            path = os.path.join(METRICS_DIR, f"{self.script_name}-{stamp}.json")
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(self.to_dict(), f, ensure_ascii=False, indent=2)
+            print(f"性能指标已写入: {path}")
+        except OSError as e:
+            print(f"写入性能指标失败 {path}: {e}")
+        return path
+
+def metrics_path_from_argv(argv):
+    """解析 --metrics 路径参数，未指定时返回 None（使用默认路径）"""
+    if "--metrics" in argv:
+        try:
+            return argv[argv.index("--metrics") + 1]
+        except IndexError:
+            pass
+    return None
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""querylog 字段快速提取：只取聚合需要的 QH / T / IP / QT 四个字段
+
+AdGuard Home 的每条日志还带有较大的 Answer / Result 字段，完整 json.loads 的大部分开销都花在它们上面。
+输入为只包含完整行的 bytes 块，逐行产出 (QH, T, IP, QT)，行无效或不是 JSON 对象时产出 None。
+三种后端：
+- orjson：安装了 orjson 时使用，C 实现的逐行完整解析；
+- regex：纯 Python 后备。整块解码后用一次正则匹配所有按 AdGuard Home 字段顺序写出的行
+  （{"T":..,"QH":..,"QT":.., ... "IP":..}，IP 为顶层最后一个键），并核对行数与各字段出现次数，
+  Result.Rules 等嵌套对象中的同名键不会被当成客户端 IP。块内有任何一行不符
+  （转义字符、非字符串值、顶层缺少字段、其他写法的 JSON）时，该块改为逐行提取，
+  逐行提取无法确定的行再退回 json.loads，三种后端对每一行合法 JSON 的结果一致；
+- json：标准库逐行完整解析（原有实现）。
+"""
+
+import re
+import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# AdGuard Home 写出的一行日志：T、QH、QT 位于行首，IP 位于 Answer / Result 之后、是顶层的最后一个键。
+# 要求 "IP" 紧接整行结尾的 }，合法 JSON 中它只能位于顶层；Result.Rules 等嵌套对象中的 IP 后面还有外层的 }，
+# 不会被当成客户端 IP（嵌套对象之后若没有顶层 IP，该行不匹配，交给逐行提取判定）
+_LINE_PATTERN = r'^\{"T":"([^"\\\n]*)","QH":"([^"\\\n]*)","QT":"([^"\\\n]*)",[^\n]*"IP":"([^"\\\n]*)"\}\r?$'
+_LINE_RE = re.compile(_LINE_PATTERN, re.MULTILINE)
+_LINE_BYTES_RE = re.compile(_LINE_PATTERN.encode("ascii"))
+_LINE_KEYS = ('"T":', '"QH":', '"QT":', '"IP":')
+_LINE_BYTES_KEYS = tuple(key.encode("ascii") for key in _LINE_KEYS)
+# 逐行提取：字段值为不含引号和反斜杠的字符串时，第二、三个分组分别为值与结尾引号；否则二者为空，需要完整解析
+_FIELD_RE = re.compile(rb'"(QH|T|IP|QT)"\s*:\s*(?:"([^"\\]*)(")|)')
+
+def _fields_from_entry(entry):
+    if not isinstance(entry, dict):
+        return None
+    return entry.get('QH'), entry.get('T'), entry.get('IP'), entry.get('QT')
+
+def extract_fields_json(line):
+    """标准库完整解析"""
+    try:
+        entry = json.loads(line.decode('utf-8', 'ignore'))
+    except json.JSONDecodeError:
+        return None
+    return _fields_from_entry(entry)
+
+def extract_fields_orjson(line):
+    """orjson 完整解析；orjson 拒绝的行（如非法 UTF-8）交给标准库按原有方式处理"""
+    try:
+        entry = orjson.loads(line)
+    except orjson.JSONDecodeError:
+        return extract_fields_json(line)
+    return _fields_from_entry(entry)
+
+def extract_fields_regex(line):
+    """单行字节正则提取；无法确定时退回完整解析"""
+    if line[:1] != b"{" or line[-1:] != b"}":
+        line = line.strip()
+        # 只处理完整的 JSON 对象行，截断的半行与非对象行直接交给完整解析判定
+        if line[:1] != b"{" or line[-1:] != b"}":
+            return extract_fields_json(line) if line else None
+    m = _LINE_BYTES_RE.match(line)
+    # 与整块提取相同，各字段只出现一次时才采用正则结果（重复键以完整解析的最后一个值为准）
+    if m is not None and all(line.count(key) == 1 for key in _LINE_BYTES_KEYS):
+        t, qh, qt, ip = m.groups()
+        return (qh.decode('utf-8', 'ignore'), t.decode('utf-8', 'ignore'),
+                ip.decode('utf-8', 'ignore'), qt.decode('utf-8', 'ignore'))
+    # 其他写法：键可能位于嵌套对象中，行内出现嵌套对象时交给完整解析判定层级
+    if line.find(b"{", 1) >= 0:
+        return extract_fields_json(line)
+    values = {}
+    for key, value, quote in _FIELD_RE.findall(line):
+        if not quote or key in values:
+            return extract_fields_json(line)
+        values[key] = value
+    qh = values.get(b"QH")
+    t = values.get(b"T")
+    ip = values.get(b"IP")
+    qt = values.get(b"QT")
+    return (qh.decode('utf-8', 'ignore') if qh is not None else None,
+            t.decode('utf-8', 'ignore') if t is not None else None,
+            ip.decode('utf-8', 'ignore') if ip is not None else None,
+            qt.decode('utf-8', 'ignore') if qt is not None else None)
+
+EXTRACTORS = {
+    "orjson": extract_fields_orjson,
+    "regex": extract_fields_regex,
+    "json": extract_fields_json,
+}
+
+def resolve_backend(backend="auto"):
+    """返回实际使用的后端名称：auto 时优先 orjson，未安装则用 regex；指定 orjson 但未安装时同样退回 regex"""
+    if backend in ("auto", "orjson", None):
+        return "orjson" if orjson is not None else "regex"
+    if backend not in EXTRACTORS:
+        raise ValueError(f"未知的 querylog 解析后端: {backend}（可选: auto, {', '.join(EXTRACTORS)}）")
+    return backend
+
+def _split_lines(chunk):
+    lines = chunk.split(b"\n")
+    if not lines[-1]:
+        lines.pop()
+    return lines
+
+def _match_block(chunk):
+    """整块正则提取，块内每一行都符合 AdGuard Home 的写法时返回字段列表，否则返回 None"""
+    text = chunk.decode('utf-8', 'ignore')
+    records = _LINE_RE.findall(text)
+    line_count = text.count("\n") + (not text.endswith("\n"))
+    if len(records) != line_count:
+        return None
+    # 每个匹配行的各字段至少在顶层出现一次，总次数等于行数即说明没有重复键（嵌套对象中的同名键也算在内）
+    for key in _LINE_KEYS:
+        if text.count(key) != line_count:
+            return None
+    return [(qh, t, ip, qt) for t, qh, qt, ip in records]
+
+def iter_chunk_fields(chunk, backend="regex"):
+    """逐行产出块中每一行的 (QH, T, IP, QT)，无效行产出 None；backend 须为 resolve_backend 的返回值"""
+    if not chunk:
+        return []
+    if backend == "regex":
+        records = _match_block(chunk)
+        if records is not None:
+            return records
+    return map(EXTRACTORS[backend], _split_lines(chunk))
@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""querylog 回放报告：用真实流量比较 Black.txt 与 pure black.txt 的拦截效果
+
+精简脚本按 domain name.txt 把 Black.txt 裁剪为 pure black.txt，这里量化裁剪换来的体积与损失的拦截：
+- querylog 按字节范围分片（与聚合脚本相同的分块读取与字段提取），多进程并行回放；
+- 每个进程为两份规则各建一个 RuleMatcher（见 rule_matcher.py），分片内同一主机名只匹配一次，按查询次数加权统计；
+- 报告每份规则的拦截 / 白名单放行 / 未匹配次数、命中过的规则数、每千条规则拦截的查询数，
+  以及 Black.txt 拦截而 pure black.txt 未拦截的主机名（损失）与反方向的主机名（新增）。
+从未命中的规则逐行写入报告目录下的 "never-hit <规则文件名>"，汇总写入 scripts/reports/replay.json。
+
+用法:
+    python scripts/querylog_replay.py [--logs-dir 目录] [--workers N] [--black 路径] [--pure 路径]
+                                      [--report 路径] [--top N]
+"""
+
+import os
+import sys
+import glob
+import json
+import time
+import datetime
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+import aggregate_domains
+from querylog_fields import resolve_backend
+from rule_matcher import load_matcher, BLOCKED, ALLOWED, NOT_MATCHED
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BLACK_FILE = os.path.join(REPO_ROOT, "Black.txt")
+PURE_BLACK_FILE = os.path.join(REPO_ROOT, "pure black.txt")
+REPORT_FILE = os.path.join(REPO_ROOT, "scripts", "reports", "replay.json")
+# 报告中列出的损失 / 新增主机名与热门规则条数
+TOP_N = 50
+
+# 工作进程中的 [(名称, RuleMatcher), ...]；fork 启动时直接继承主进程已加载的匹配器
+_matchers = []
+
+def _init_worker(lists):
+    if not _matchers:
+        _matchers.extend((name, load_matcher(path)[0]) for name, path in lists)
+
+def replay_shard(task):
+    """回放一个分片：统计各主机名的查询次数，再用每份规则各匹配一次，返回按查询次数加权的统计"""
+    log_file, start, end, backend = task
+    start_wall = time.perf_counter()
+    hosts = Counter()
+    lines = 0
+    for fields in aggregate_domains.iter_log_records(log_file, start, end, backend):
+        lines += 1
+        if fields is not None and fields[0]:
+            hosts[fields[0]] += 1
+
+    results = []
+    for _, matcher in _matchers:
+        verdicts = Counter()
+        rule_hits = Counter()
+        blocked = {}
+        for host, count in hosts.items():
+            result = matcher.classify(host)
+            verdicts[result.verdict] += count
+            if result.rule is not None:
+                rule_hits[result.rule] += count
+            if result.verdict == BLOCKED:
+                blocked[host] = result.rule
+        results.append({"verdicts": verdicts, "rule_hits": rule_hits, "blocked": blocked})
+
+    # 以第一份规则为基准，记录其余各份规则的损失与新增（按 (主机名, 起作用的规则) 计查询次数）
+    base_blocked = results[0]["blocked"] if results else {}
+    for result in results[1:]:
+        blocked = result["blocked"]
+        result["lost"] = Counter({(host, rule): hosts[host] for host, rule in base_blocked.items() if host not in blocked})
+        result["gained"] = Counter({(host, rule): hosts[host] for host, rule in blocked.items() if host not in base_blocked})
+    for result in results:
+        result["blocked_hosts"] = len(result.pop("blocked"))
+    return {"lines": lines, "queries": sum(hosts.values()), "hosts": len(hosts), "results": results,
+            "wall_time": time.perf_counter() - start_wall}
+
+def _merge(total, part):
+    """把一个分片的统计并入汇总"""
+    total["lines"] += part["lines"]
+    total["queries"] += part["queries"]
+    for merged, result in zip(total["results"], part["results"]):
+        for key in ("verdicts", "rule_hits", "lost", "gained"):
+            if key in result:
+                merged.setdefault(key, Counter()).update(result[key])
+
+def _summary(name, path, rules, merged, queries, top):
+    hits = merged["rule_hits"]
+    verdicts = merged["verdicts"]
+    blocked = verdicts[BLOCKED]
+    hit_rules = sum(1 for rule in rules if rule in hits)
+    return {
+        "name": name,
+        "path": path,
+        "rules": len(rules),
+        "queries": queries,
+        "blocked": blocked,
+        "allowed": verdicts[ALLOWED],
+        "not_matched": verdicts[NOT_MATCHED],
+        "block_rate": round(blocked / queries, 6) if queries else 0.0,
+        "hit_rules": hit_rules,
+        "never_hit_rules": len(rules) - hit_rules,
+        # 规则效率：每千条规则拦截的查询数、平均每条命中规则拦截的查询数
+        "blocked_per_1k_rules": round(blocked * 1000 / len(rules), 2) if rules else 0.0,
+        "blocked_per_hit_rule": round(blocked / hit_rules, 2) if hit_rules else 0.0,
+        "top_rules": hits.most_common(top),
+    }
+
+def _host_list(counter, top):
+    return [{"host": host, "rule": rule, "queries": count} for (host, rule), count in counter.most_common(top)]
+
+def run_replay(logs_dir=None, workers=None, lists=None, report_file=None, top=TOP_N, backend=None):
+    """回放 logs_dir 中的全部 querylog*.json，打印并写出报告，返回报告字典
+
+    lists 为 [(名称, 规则文件), ...]，第一份为比较基准，默认 Black.txt 与 pure black.txt。
+    """
+    lists = lists or [("Black.txt", BLACK_FILE), ("pure black.txt", PURE_BLACK_FILE)]
+    report_file = report_file or REPORT_FILE
+    log_files = sorted(glob.glob(os.path.join(logs_dir or aggregate_domains.LOGS_DIR, "querylog*.json")))
+    if not log_files:
+        print("No querylog files found.")
+        return None
+    missing = [path for _, path in lists if not os.path.exists(path)]
+    if missing:
+        print(f"规则文件不存在: {', '.join(missing)}")
+        return None
+
+    start = time.perf_counter()
+    loaded = []
+    for name, path in lists:
+        matcher, rules = load_matcher(path)
+        loaded.append((name, path, rules))
+        _matchers.append((name, matcher))
+        print(f"已加载 {name}: {len(rules)} 条规则参与匹配，跳过条件修饰符规则 {matcher.counts['unsupported']} 条")
+    load_seconds = time.perf_counter() - start
+
+    backend = resolve_backend(backend or aggregate_domains.QUERYLOG_BACKEND)
+    ranges = [(f, 0, os.path.getsize(f)) for f in log_files]
+    total_bytes = sum(end for _, _, end in ranges)
+    workers = workers or os.cpu_count() or 1
+    if workers > 1 and total_bytes >= aggregate_domains.PARALLEL_MIN_BYTES:
+        shards = aggregate_domains.plan_log_shards(ranges, workers)
+    else:
+        workers, shards = 1, ranges
+    tasks = [(f, s, e, backend) for f, s, e in shards]
+    print(f"回放 {len(log_files)} 个 querylog（{total_bytes / 1024 / 1024:.1f} MB），{len(shards)} 个分片，{workers} 个进程")
+
+    replay_start = time.perf_counter()
+    total = {"lines": 0, "queries": 0, "results": [{"verdicts": Counter(), "rule_hits": Counter()} for _ in lists]}
+    try:
+        if workers > 1:
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                     initargs=([(name, path) for name, path, _ in loaded],)) as executor:
+                for part in executor.map(replay_shard, tasks):
+                    _merge(total, part)
+        else:
+            for task in tasks:
+                _merge(total, replay_shard(task))
+    finally:
+        _matchers.clear()
+    replay_seconds = time.perf_counter() - replay_start
+
+    queries = total["queries"]
+    summaries = [_summary(name, path, rules, merged, queries, top)
+                 for (name, path, rules), merged in zip(loaded, total["results"])]
+    report = {
+        "generated_at": datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "log_files": [os.path.basename(f) for f in log_files],
+        "log_bytes": total_bytes,
+        "lines": total["lines"],
+        "queries": queries,
+        "workers": workers,
+        "load_seconds": round(load_seconds, 3),
+        "replay_seconds": round(replay_seconds, 3),
+        "lists": summaries,
+        "comparisons": [],
+    }
+    base = summaries[0]
+    for summary, merged in zip(summaries[1:], total["results"][1:]):
+        lost = merged.get("lost", Counter())
+        gained = merged.get("gained", Counter())
+        report["comparisons"].append({
+            "baseline": base["name"],
+            "candidate": summary["name"],
+            # 体积与拦截覆盖率：候选规则数占基准的比例、候选拦截查询数占基准的比例
+            "size_ratio": round(summary["rules"] / base["rules"], 6) if base["rules"] else 0.0,
+            "coverage": round(summary["blocked"] / base["blocked"], 6) if base["blocked"] else 0.0,
+            "lost_queries": sum(lost.values()),
+            "lost_hosts": len(lost),
+            "gained_queries": sum(gained.values()),
+            "gained_hosts": len(gained),
+            "top_lost": _host_list(lost, top),
+            "top_gained": _host_list(gained, top),
+        })
+
+    _print_report(report, top)
+    _write_report(report, report_file, loaded, total["results"])
+    return report
+
+def _print_report(report, top):
+    rate = report["lines"] / report["replay_seconds"] if report["replay_seconds"] else 0.0
+    print(f"共 {report['lines']} 行、{report['queries']} 次查询，回放耗时 {report['replay_seconds']:.2f} 秒（{rate:,.0f} 行/秒）")
+    for s in report["lists"]:
+        print(f"{s['name']}: {s['rules']} 条规则，拦截 {s['blocked']}（{s['block_rate']:.2%}），白名单放行 {s['allowed']}，"
+              f"未匹配 {s['not_matched']}；命中过 {s['hit_rules']} 条，从未命中 {s['never_hit_rules']} 条，"
+              f"每千条规则拦截 {s['blocked_per_1k_rules']} 次")
+    for c in report["comparisons"]:
+        print(f"{c['candidate']} 相对 {c['baseline']}: 规则数 {c['size_ratio']:.2%}，拦截覆盖率 {c['coverage']:.2%}，"
+              f"少拦截 {c['lost_queries']} 次（{c['lost_hosts']} 个主机名），多拦截 {c['gained_queries']} 次（{c['gained_hosts']} 个主机名）")
+        for item in c["top_lost"][:min(top, 10)]:
+            print(f"  {item['queries']:>8}  {item['host']}  ({item['rule']})")
+
+def _write_report(report, report_file, loaded, results):
+    """写出 JSON 报告，以及每份规则从未命中的规则列表"""
+    report_dir = os.path.dirname(os.path.abspath(report_file))
+    try:
+        os.makedirs(report_dir, exist_ok=True)
+        for summary, (name, _, rules), merged in zip(report["lists"], loaded, results):
+            hits = merged["rule_hits"]
+            never_hit_file = os.path.join(report_dir, f"never-hit {name}")
+            with open(never_hit_file, "w", encoding="utf-8") as f:
+                for rule in rules:
+                    if rule not in hits:
+                        f.write(rule + "\n")
+            summary["never_hit_file"] = never_hit_file
+        with open(report_file, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"回放报告已写入: {report_file}")
+    except OSError as e:
+        print(f"写入回放报告失败 {report_file}: {e}")
+
+if __name__ == "__main__":
+    def _arg(flag, default=None):
+        if flag in sys.argv:
+            try:
+                return sys.argv[sys.argv.index(flag) + 1]
+            except IndexError:
+                pass
+        return default
+
+    workers = None
+    top = TOP_N
+    try:
+        if _arg("--workers"):
+            workers = int(_arg("--workers"))
+        if _arg("--top"):
+            top = int(_arg("--top"))
+    except ValueError:
+        print("--workers / --top 参数无效，使用默认值")
+    lists = [("Black.txt", _arg("--black", BLACK_FILE)), ("pure black.txt", _arg("--pure", PURE_BLACK_FILE))]
+    run_replay(_arg("--logs-dir"), workers, lists, _arg("--report"), top)
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""规则命中归因：把 querylog 中的查询次数归到 Black.txt 里起决定作用的规则上，按天累计进计数存储
+
+- 聚合脚本统计出本次新增的 (域名, 小时) 计数后，每个域名经 RuleMatcher（后缀哈希表 + 结果缓存）只匹配一次，
+  次数按日志中的日期计入 (规则, 日期)，保存在 domain_count_store 的 rule_hits 表中；
+- 同时记录每条规则首次出现在规则列表中的日期（rule_first_seen 表），新加入的规则不会因“还没来得及命中”被删除；
+- 合并脚本与精简脚本的 --drop-unhit-days N 删除截至最近一次归因日期的 N 天内没有命中、且至少 N 天前就已在列表中的规则；
+- 删除前确认命中记录可信，否则不删除任何规则：最近一次归因不早于 MAX_ATTRIBUTION_AGE_DAYS 天前，窗口内每一天都有日志
+  参与归因（日志收集中断、缓存丢失后这些天没有命中不能说明规则无用），且待删除的规则不超过列表的 MAX_DROP_RATIO；
+- 待删除的规则逐行写入 scripts/reports 下的 "unhit <规则文件名>"，--drop-unhit-dry-run 时只写报告不删除。
+合并脚本删除的规则另存于 DROPPED_RULES_FILE，聚合时一并参与归因：这些规则重新出现流量后，下次合并时会恢复。
+"""
+
+import os
+from collections import Counter
+from datetime import datetime, timedelta
+from domain_count_store import DomainCountStore, STORE_FILE
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# 归因使用的规则列表
+ATTRIBUTION_RULES_FILE = os.path.join(REPO_ROOT, "Black.txt")
+# 合并脚本按 --drop-unhit-days 删除的规则（不入库）
+DROPPED_RULES_FILE = os.path.join(REPO_ROOT, "scripts", "cache", "unhit_dropped.txt")
+# 待删除规则报告所在目录
+REPORT_DIR = os.path.join(REPO_ROOT, "scripts", "reports")
+# 最近一次归因距今超过该天数时认为日志收集已中断，不删除规则
+MAX_ATTRIBUTION_AGE_DAYS = 1
+# 单次最多删除的规则比例，超过时认为命中记录不可信，不删除规则（--drop-unhit-max-percent 调整）
+MAX_DROP_RATIO = 0.1
+
+def load_attribution_matcher(paths=None):
+    """加载归因用的规则（Black.txt 与合并脚本删除的规则），返回 (RuleMatcher, 参与匹配的规则列表)；
+    Black.txt 不存在时返回 (None, [])"""
+    # rule_matcher 依赖合并脚本的规则解析，合并脚本又依赖本模块，这里延迟导入
+    from rule_matcher import load_matcher
+    paths = paths or [ATTRIBUTION_RULES_FILE, DROPPED_RULES_FILE]
+    if not os.path.exists(paths[0]):
+        return None, []
+    return load_matcher([path for path in paths if os.path.exists(path)])
+
+def attribute_hits(matcher, counts, day=None):
+    """把计数归到起决定作用的规则上，返回 {(规则, 日期): 次数}
+
+    counts 为 {(域名, 小时): 次数}（小时格式 "YYYY-MM-DDTHH"，取前 10 位为日期）；
+    给出 day 时 counts 为 {域名: 次数}，全部计入 day（近似模式没有时间分桶）。
+    """
+    hits = Counter()
+    classify = matcher.classify
+    for key, count in counts.items():
+        domain, bucket_day = (key, day) if day is not None else (key[0], str(key[1])[:10])
+        rule = classify(domain).rule
+        if rule is not None:
+            hits[rule, bucket_day] += count
+    return hits
+
+def load_unhit_rules(days, store_file=None, now=None):
+    """返回截至最近一次归因日期的 days 天内没有命中、且窗口开始时就已在规则列表中的规则集合
+
+    计数存储不存在、最近一次归因早于 MAX_ATTRIBUTION_AGE_DAYS 天前、窗口内有哪天没有日志参与归因，
+    或归因记录不足 days 天时打印提示并返回 None（调用方不应删除任何规则）。
+    """
+    store_file = store_file or STORE_FILE
+    if not os.path.exists(store_file):
+        print(f"计数存储不存在（{store_file}），没有规则命中记录，不删除规则")
+        return None
+    now = now or datetime.now()
+    with DomainCountStore(store_file) as store:
+        covered = store.attributed_days()
+        last = max(covered) if covered else None
+        oldest_allowed = (now - timedelta(days=MAX_ATTRIBUTION_AGE_DAYS)).strftime("%Y-%m-%d")
+        if last is None or last < oldest_allowed:
+            print(f"最近一次规则命中归因为 {last or '无'}，早于 {oldest_allowed}，日志收集可能已中断，不删除规则")
+            return None
+        last_day = datetime.strptime(last, "%Y-%m-%d")
+        window = [(last_day - timedelta(days=offset)).strftime("%Y-%m-%d") for offset in range(days - 1, -1, -1)]
+        missing = [day for day in window if day not in covered]
+        if missing:
+            print(f"最近 {days} 天中有 {len(missing)} 天没有日志参与归因（{missing[0]} 等），不删除规则")
+            return None
+        cutoff = window[0]
+        start = store.rule_history_start()
+        if start is None or start > cutoff:
+            print(f"规则命中记录不足 {days} 天（最早 {start or '无'}），不删除规则")
+            return None
+        unhit = store.unhit_rules(cutoff)
+    print(f"{cutoff} 至 {last} 没有命中的规则: {len(unhit)} 条")
+    return unhit
+
+def select_unhit_rules(rules, unhit_rules, name, max_ratio=None, dry_run=False, report_dir=None):
+    """从 rules 中按原顺序挑出要删除的未命中规则
+
+    候选规则逐行写入 report_dir 下的 "unhit <name>"；dry_run 为 True，或候选规则超过 rules 的 max_ratio
+    （默认 MAX_DROP_RATIO）时只报告，返回空列表。
+    """
+    max_ratio = MAX_DROP_RATIO if max_ratio is None else max_ratio
+    candidates = [rule for rule in rules if rule in unhit_rules]
+    report_file = os.path.join(report_dir or REPORT_DIR, f"unhit {name}")
+    try:
+        os.makedirs(os.path.dirname(report_file), exist_ok=True)
+        with open(report_file, "w", encoding="utf-8") as f:
+            for rule in candidates:
+                f.write(rule + "\n")
+        print(f"{name} 中未命中的规则 {len(candidates)} 条，已写入 {report_file}")
+    except OSError as e:
+        print(f"写入未命中规则报告失败 {report_file}: {e}")
+    if dry_run:
+        print("仅报告未命中的规则（--drop-unhit-dry-run），不删除")
+        return []
+    if candidates and len(candidates) > len(rules) * max_ratio:
+        print(f"未命中的规则占 {len(candidates) / len(rules):.1%}，超过单次删除上限 {max_ratio:.0%}，"
+              f"命中记录可能不完整，不删除规则")
+        return []
+    return candidates
+
+def save_dropped_rules(rules, path=None):
+    """记录合并脚本删除的规则，供聚合脚本继续归因；没有删除的规则时移除该文件"""
+    path = path or DROPPED_RULES_FILE
+    if not rules:
+        if os.path.exists(path):
+            os.remove(path)
+        return
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        for rule in rules:
+            f.write(rule + "\n")
+    os.replace(tmp_path, path)
@@ -0,0 +1,538 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""本地规则匹配：离线判断主机名会被 Black.txt / pure black.txt 拦截还是放行
+
+规则经 adguard_rules_merger.parse_rule 解析后分为两类：
+- ||domain^、@@||domain^、纯域名行与 hosts 行放入哈希表，查询时按后缀逐级查表，单次查询为 O(标签数)；
+- 通配规则（如 *-ad.sm.cn*）、不是合法域名的无锚点模式（如 -ad.sm.cn、.x.com，按子串匹配）与 /正则/ 规则转换为正则。规则中一定出现的字面串（如 -ad.sm.cn）不短于 GRAM_SIZE 时，
+  按其中一个子串登记，主机名只需确认包含相同子串的少数规则；找不到字面串的规则每 REGEX_BATCH_SIZE 条合并成一个正则，
+  一次 search 判断整批是否命中，命中后才在该批中逐条确认是哪条规则。
+
+优先级与 AdGuard Home 一致：@@...$important > ...$important > @@ 白名单 > 普通拦截。
+hosts 行与纯域名行（整行是合法域名）只匹配域名本身，||domain^ 同时匹配全部子域。
+带 $client、$dnstype、$denyallow 等条件修饰符的规则取决于客户端或查询类型，离线无法判断，加载时跳过并计数。
+同一主机名的结果会缓存，回放 querylog 时重复的域名只匹配一次。
+合并脚本写出的快照（见 rule_snapshot.py）与规则文件一致时，load_matcher 直接加载其中的解析结果，不再逐行解析。
+
+用法:
+    python scripts/rule_matcher.py [--rules 规则文件]... 主机名 ...
+    python scripts/rule_matcher.py [--rules 规则文件]... < 主机名列表
+    python scripts/rule_matcher.py [--rules 规则文件]... --querylog [--logs-dir 目录] [--top N]
+
+默认使用仓库根目录的 Black.txt；--querylog 回放目录中所有 querylog*.json（默认 scripts/logs），输出拦截统计。
+"""
+
+import os
+import re
+import sys
+import glob
+import time
+from collections import Counter
+from typing import Iterable, Iterator, List, NamedTuple, Optional, Tuple
+from adguard_rules_merger import parse_rule
+from domain_index import iter_domain_suffixes
+from rule_snapshot import (RuleSnapshot, open_snapshot, rule_flags, KIND_PATTERN, KIND_EXACT, KIND_SUFFIX,
+                           KIND_SKIP, KIND_SHIFT, KIND_MASK, FLAG_REGEX, FLAG_INVALID)
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BLACK_FILE = os.path.join(REPO_ROOT, "Black.txt")
+LOGS_DIR = os.path.join(REPO_ROOT, "scripts", "logs")
+
+# 每个合并正则包含的规则数
+REGEX_BATCH_SIZE = 256
+# 字面预筛选的子串长度：规则必含的字面串不短于该长度时按其中一个子串建索引
+GRAM_SIZE = 5
+# 结果缓存最多保存的主机名数，写满后整体清空
+CACHE_SIZE = 1 << 20
+# 离线可以判断的修饰符
+SUPPORTED_MODIFIERS = frozenset(("important",))
+# 可放入后缀哈希表的域名（不含通配、锚点与分隔符）
+_HASHABLE_DOMAIN_RE = re.compile(r'[A-Za-z0-9_.-]+\.[A-Za-z0-9_.-]+')
+# 纯域名行：各级标签由字母、数字、_ 与 - 组成且不以 - 开头或结尾（AdGuard Home 按域名精确匹配，其余无锚点模式按子串匹配）
+_DOMAIN_NAME_RE = re.compile(r'(?:[A-Za-z0-9_](?:[A-Za-z0-9_-]{0,61}[A-Za-z0-9_])?\.)*'
+                             r'[A-Za-z0-9_](?:[A-Za-z0-9_-]{0,61}[A-Za-z0-9_])?\.?')
+
+BLOCKED = "blocked"
+ALLOWED = "allowed"
+NOT_MATCHED = "none"
+
+# 优先级（数值越小越优先），偶数为放行
+TIER_ALLOW_IMPORTANT = 0
+TIER_BLOCK_IMPORTANT = 1
+TIER_ALLOW = 2
+TIER_BLOCK = 3
+_NO_TIER = 4
+
+class MatchResult(NamedTuple):
+    """匹配结果：verdict 为 blocked / allowed / none，rule 为起决定作用的规则文本"""
+    verdict: str
+    rule: Optional[str] = None
+
+_NO_MATCH = MatchResult(NOT_MATCHED)
+# 无法编译的正则规则以永不匹配的正则代替
+_NEVER = re.compile(r"(?!)")
+
+def pattern_to_regex(pattern: str) -> str:
+    """把 AdGuard 通配规则的模式部分转换为匹配主机名的正则
+
+    || 匹配主机名开头或某一级标签开头，| 匹配开头或结尾，* 匹配任意字符，
+    ^ 为分隔符（主机名中只会出现在结尾）；没有锚点时按子串匹配。
+    """
+    prefix = ""
+    if pattern.startswith("||"):
+        prefix, pattern = r"(?:^|\.)", pattern[2:]
+    elif pattern.startswith("|"):
+        prefix, pattern = "^", pattern[1:]
+    suffix = ""
+    if pattern.endswith("|"):
+        suffix, pattern = "$", pattern[:-1]
+    body = "".join(".*" if ch == "*" else r"(?:[^\w.%-]|$)" if ch == "^" else re.escape(ch) for ch in pattern)
+    return prefix + body + suffix
+
+def split_modifiers(body: str, is_regex: bool) -> Tuple[str, Tuple[str, ...]]:
+    """拆分规则主体与修饰符；正则规则只在结尾的 / 之后查找 $，避免误拆正则中的 $"""
+    if is_regex:
+        end = body.rfind("/")
+        dollar = body.find("$", end) if end > 0 else -1
+    else:
+        dollar = body.find("$")
+    if dollar < 0:
+        return body, ()
+    modifiers = tuple(x.strip() for x in body[dollar+1:].split(",") if x.strip())
+    return body[:dollar], modifiers
+
+def _skip_quantifier(regex: str, i: int) -> int:
+    """跳过位置 i 处的量词（含 {m,n} 与随后的 ? / +），返回量词之后的位置"""
+    if regex[i] == "{":
+        end = regex.find("}", i)
+        i = end if end >= 0 else i
+    i += 1
+    if i < len(regex) and regex[i] in "?+":
+        i += 1
+    return i
+
+def required_literal(regex: str) -> str:
+    """返回正则匹配时一定出现的最长字面串（小写），无法确定时返回空字符串
+
+    只做保守分析：含分支 | 时直接放弃；括号内、字符类、可选（? * {m,n}）的字符都不计入。
+    """
+    best = run = ""
+    depth = 0
+    i, n = 0, len(regex)
+    while i < n:
+        ch = regex[i]
+        piece = None
+        if ch == "\\" and i + 1 < n:
+            # \. \- 等转义为字面字符，\d \b \1 等为字符类、断言或反向引用
+            if not regex[i+1].isalnum():
+                piece = regex[i+1]
+            i += 2
+        elif ch == "[":
+            i += 1
+            if i < n and regex[i] == "^":
+                i += 1
+            if i < n and regex[i] == "]":
+                i += 1
+            while i < n and regex[i] != "]":
+                i += 2 if regex[i] == "\\" else 1
+            i += 1
+        elif ch == "|":
+            return ""
+        else:
+            if ch == "(":
+                depth += 1
+            elif ch == ")":
+                depth -= 1
+            elif ch not in ".^$*+?{}":
+                piece = ch
+            i += 1
+        if i < n and regex[i] in "?*{":
+            piece = None
+        if piece is not None and depth == 0:
+            run += piece.lower()
+        else:
+            run = ""
+        if len(run) > len(best):
+            best = run
+        if i < n and regex[i] in "?*+{":
+            i = _skip_quantifier(regex, i)
+            run = ""
+    return best
+
+def load_rule_lines(path: str) -> Iterator[str]:
+    """逐行读取规则文件（去掉 BOM 与行尾空白），文件头注释由解析阶段跳过"""
+    with open(path, "r", encoding="utf-8-sig", errors="ignore") as f:
+        for line in f:
+            yield line.rstrip()
+
+def classify_rule(rule: str):
+    """解析一条规则，返回 (标志, 规则文本, 匹配键, 必含字面串)；注释与空行返回 None
+
+    标志即快照中的标志字节（优先级、类别与 FLAG_* 位，见 rule_snapshot.py）。KIND_EXACT / KIND_SUFFIX 的匹配键为小写域名，
+    KIND_PATTERN 为转换后的正则（字面串用于预筛选），KIND_SKIP 为去掉 @@ 与修饰符后的模式部分。
+    """
+    c = parse_rule(rule)
+    if not c.text or c.is_comment:
+        return None
+    text = c.text
+    if c.is_hosts:
+        return rule_flags(KIND_EXACT, TIER_BLOCK, text), text, c.domain.lower(), ""
+
+    body = text[2:] if c.is_whitelist else text
+    is_regex = body.startswith("/") and len(body) > 1
+    pattern, modifiers = split_modifiers(body, is_regex)
+    names = {m.lstrip("~").split("=", 1)[0] for m in modifiers}
+    important = "important" in names
+    if c.is_whitelist:
+        tier = TIER_ALLOW_IMPORTANT if important else TIER_ALLOW
+    else:
+        tier = TIER_BLOCK_IMPORTANT if important else TIER_BLOCK
+    if not names <= SUPPORTED_MODIFIERS:
+        return rule_flags(KIND_SKIP, tier, text, is_regex), text, pattern, ""
+
+    # ||domain^ 与 ||domain^|：后缀哈希表
+    if pattern.startswith("||") and (pattern.endswith("^") or pattern.endswith("^|")):
+        domain = pattern[2:pattern.rindex("^")]
+        if _HASHABLE_DOMAIN_RE.fullmatch(domain):
+            return rule_flags(KIND_SUFFIX, tier, text), text, domain.lower(), ""
+    # 纯域名行：与 hosts 行一样只匹配域名本身（全为数字的视为 IP 等模式，按子串匹配）
+    elif (not is_regex and len(pattern) <= 253 and _DOMAIN_NAME_RE.fullmatch(pattern)
+          and not pattern.replace(".", "").isdigit()):
+        return rule_flags(KIND_EXACT, tier, text), text, pattern.rstrip(".").lower(), ""
+
+    if is_regex:
+        if not pattern.endswith("/") or len(pattern) < 3:
+            return rule_flags(KIND_SKIP, tier, text, True, invalid=True), text, pattern, ""
+        regex = pattern[1:-1]
+        return rule_flags(KIND_PATTERN, tier, text, True), text, regex, required_literal(regex)
+    literal = max(re.split(r"[*^|]", pattern), key=len).lower()
+    return rule_flags(KIND_PATTERN, tier, text), text, pattern_to_regex(pattern), literal
+
+class RuleMatcher:
+    """规则集的主机名匹配器；先 add_rules 加载规则，再调用 classify / classify_many"""
+
+    def __init__(self, rules: Iterable[str] = ()):
+        # 主机名 -> (优先级, 规则)；同一键只保留优先级最高（数值最小）的规则
+        self._exact = {}
+        self._suffix = {}
+        # 有必含字面串的正则规则：子串 -> [[优先级, 正则, 单条正则, 规则, 字面串], ...]，每条规则只登记在最少规则共用的子串下
+        self._grams = {}
+        # 其余正则规则按优先级待合并的 (正则, 规则)，编译后的批次为 [(优先级, 合并正则, [[优先级, 正则, 单条正则, 规则], ...]), ...]
+        self._pending = {tier: [] for tier in range(_NO_TIER)}
+        self._batches = None
+        # 已登记的 (优先级, 正则)，重复的正则规则只登记一次
+        self._regex_keys = set()
+        self._cache = {}
+        self.cache_misses = 0
+        self.counts = Counter()
+        self.add_rules(rules)
+
+    @classmethod
+    def from_files(cls, paths: Iterable[str]) -> "RuleMatcher":
+        matcher = cls()
+        for path in paths:
+            matcher.add_rules(load_rule_lines(path))
+        return matcher
+
+    def _put(self, table, domain, tier, rule):
+        current = table.get(domain)
+        if current is None or tier < current[0]:
+            table[domain] = (tier, rule)
+
+    def add_rule(self, rule: str) -> bool:
+        """加载一条规则（文本），已缓存的匹配结果随之失效
+
+        返回规则是否参与匹配：注释、空行、条件修饰符规则与格式不完整的正则返回 False。
+        """
+        entry = classify_rule(rule)
+        if entry is None:
+            return False
+        self._cache.clear()
+        return self._add_entry(*entry)
+
+    def add_snapshot(self, snapshot: RuleSnapshot) -> List[str]:
+        """加载快照中的规则（直接使用解析结果，不再解析文本），返回参与匹配的规则"""
+        self._cache.clear()
+        exact, suffix = self._exact, self._suffix
+        exact_kind, suffix_kind = KIND_EXACT << KIND_SHIFT, KIND_SUFFIX << KIND_SHIFT
+        added = []
+        append = added.append
+        hosts = domains = 0
+        for rule, key, literal, flags in zip(snapshot.rules(), snapshot.keys(), snapshot.literals(), snapshot.flags):
+            # 域名规则占绝大多数，直接写入哈希表（同 _put）
+            kind = flags & KIND_MASK
+            if kind == suffix_kind:
+                table = suffix
+                domains += 1
+            elif kind == exact_kind:
+                table = exact
+                hosts += 1
+            else:
+                if self._add_entry(flags, rule, key, literal):
+                    append(rule)
+                continue
+            tier = flags & 3
+            current = table.get(key)
+            if current is None or tier < current[0]:
+                table[key] = (tier, rule)
+            append(rule)
+        self.counts["hosts"] += hosts
+        self.counts["domain"] += domains
+        return added
+
+    def _add_entry(self, flags, rule, key, literal) -> bool:
+        kind = flags >> KIND_SHIFT & 3
+        tier = flags & 3
+        if kind == KIND_EXACT:
+            self._put(self._exact, key, tier, rule)
+            self.counts["hosts"] += 1
+            return True
+        if kind == KIND_SUFFIX:
+            self._put(self._suffix, key, tier, rule)
+            self.counts["domain"] += 1
+            return True
+        if kind == KIND_SKIP:
+            self.counts["invalid" if flags & FLAG_INVALID else "unsupported"] += 1
+            return False
+
+        self.counts["regex" if flags & FLAG_REGEX else "wildcard"] += 1
+        if (tier, key) in self._regex_keys:
+            return True
+        self._regex_keys.add((tier, key))
+        if len(literal) >= GRAM_SIZE:
+            # 登记在当前规则最少的子串下（遇到尚无规则的子串即停止）
+            grams = self._grams
+            gram = None
+            fewest = None
+            for i in range(len(literal) - GRAM_SIZE + 1):
+                candidate = literal[i:i + GRAM_SIZE]
+                bucket = grams.get(candidate)
+                if bucket is None:
+                    gram = candidate
+                    break
+                if fewest is None or len(bucket) < fewest:
+                    gram, fewest = candidate, len(bucket)
+            grams.setdefault(gram, []).append([tier, key, None, rule, literal])
+        else:
+            self._pending[tier].append((key, rule))
+            self._batches = None
+        return True
+
+    def add_rules(self, rules: Iterable[str]):
+        for rule in rules:
+            self.add_rule(rule)
+
+    def _compile_batch(self, tier, batch):
+        """合并编译一批正则；失败时先剔除无法编译的规则再合并，仍失败（如含行内全局标志）时该批逐条匹配
+
+        返回 (合并正则或 None, [[优先级, 正则, 单条正则或 None, 规则], ...], 有效规则)；单条正则在合并正则命中后才编译。
+        """
+        try:
+            combined = re.compile("|".join(f"(?:{regex})" for regex, _ in batch), re.IGNORECASE)
+            return combined, [[tier, regex, None, rule] for regex, rule in batch], batch
+        except re.error:
+            pass
+        entries = []
+        for regex, rule in batch:
+            try:
+                entries.append([tier, regex, re.compile(regex, re.IGNORECASE), rule])
+            except re.error:
+                self.counts["invalid"] += 1
+        valid = [(regex, rule) for _, regex, _, rule in entries]
+        try:
+            combined = re.compile("|".join(f"(?:{regex})" for regex, _ in valid), re.IGNORECASE) if valid else None
+        except re.error:
+            combined = None
+        return combined, entries, valid
+
+    def _compile(self):
+        """按优先级把没有必含字面串的正则规则每 REGEX_BATCH_SIZE 条合并成一批"""
+        batches = []
+        for tier in range(_NO_TIER):
+            pending = self._pending[tier]
+            valid = []
+            for start in range(0, len(pending), REGEX_BATCH_SIZE):
+                combined, entries, batch_valid = self._compile_batch(tier, pending[start:start + REGEX_BATCH_SIZE])
+                valid.extend(batch_valid)
+                if entries:
+                    batches.append((tier, combined, entries))
+            # 无效规则只统计一次
+            self._pending[tier] = valid
+        self._batches = batches
+        return batches
+
+    def _search(self, entry, host: str) -> bool:
+        """用单条正则确认命中；首次使用时才编译，无法编译的规则计数后不再匹配"""
+        compiled = entry[2]
+        if compiled is None:
+            try:
+                compiled = re.compile(entry[1], re.IGNORECASE)
+            except re.error:
+                self.counts["invalid"] += 1
+                compiled = _NEVER
+            entry[2] = compiled
+        return compiled.search(host) is not None
+
+    def _match(self, host: str) -> MatchResult:
+        best = self._exact.get(host)
+        suffix_table = self._suffix
+        for suffix in iter_domain_suffixes(host):
+            hit = suffix_table.get(suffix)
+            if hit is not None and (best is None or hit[0] < best[0]):
+                best = hit
+        best_tier = best[0] if best is not None else _NO_TIER
+        # 字面预筛选：只确认登记在主机名所含子串下的正则规则，且只看优先级高于当前结果的
+        grams = self._grams
+        if grams and best_tier:
+            seen = set()
+            for i in range(len(host) - GRAM_SIZE + 1):
+                gram = host[i:i + GRAM_SIZE]
+                bucket = grams.get(gram)
+                if bucket is None or gram in seen:
+                    continue
+                seen.add(gram)
+                for entry in bucket:
+                    # 先确认主机名包含完整的字面串，再运行正则
+                    if entry[0] < best_tier and entry[4] in host and self._search(entry, host):
+                        best, best_tier = (entry[0], entry[3]), entry[0]
+        # 其余正则按批匹配，同样只检查优先级更高的批次
+        for tier, combined, entries in self._batches if self._batches is not None else self._compile():
+            if tier >= best_tier:
+                break
+            if combined is not None and combined.search(host) is None:
+                continue
+            for entry in entries:
+                if self._search(entry, host):
+                    best, best_tier = (tier, entry[3]), tier
+                    break
+        if best is None:
+            return _NO_MATCH
+        return MatchResult(ALLOWED if best[0] % 2 == 0 else BLOCKED, best[1])
+
+    def classify(self, hostname: str) -> MatchResult:
+        """判断单个主机名，返回 MatchResult"""
+        cache = self._cache
+        result = cache.get(hostname)
+        if result is None:
+            self.cache_misses += 1
+            result = self._match(hostname.strip().rstrip(".").lower())
+            if len(cache) >= CACHE_SIZE:
+                cache.clear()
+            cache[hostname] = result
+        return result
+
+    def classify_many(self, hostnames: Iterable[str]) -> Iterator[Tuple[str, MatchResult]]:
+        """批量判断，逐个产出 (主机名, MatchResult)"""
+        classify = self.classify
+        for hostname in hostnames:
+            yield hostname, classify(hostname)
+
+    def stats(self):
+        batches = self._batches if self._batches is not None else self._compile()
+        indexed = sum(len(bucket) for bucket in self._grams.values())
+        return {
+            "domain_keys": len(self._suffix),
+            "hosts_keys": len(self._exact),
+            "regex_indexed": indexed,
+            "regex_batched": sum(len(entries) for _, _, entries in batches),
+            "regex_batches": len(batches),
+            **self.counts,
+        }
+
+def load_matcher(paths, snapshot_file: str = None):
+    """加载一个或多个规则文件，返回 (RuleMatcher, 参与匹配的规则列表（去重，保持文件中的顺序）)
+
+    合并脚本写出的快照（见 rule_snapshot.py）与某个文件的当前内容一致时，该文件直接从快照加载。
+    """
+    if isinstance(paths, str):
+        paths = [paths]
+    matcher = RuleMatcher()
+    rules = {}
+    for path in paths:
+        snapshot = open_snapshot(path, snapshot_file)
+        if snapshot is not None:
+            with snapshot:
+                rules.update(dict.fromkeys(matcher.add_snapshot(snapshot)))
+            continue
+        for line in load_rule_lines(path):
+            if matcher.add_rule(line):
+                rules.setdefault(line.strip(), None)
+    return matcher, list(rules)
+
+def iter_querylog_hosts(logs_dir: str) -> Iterator[str]:
+    """依次产出目录中各 querylog*.json 每条有效记录的 QH 字段"""
+    from aggregate_domains import iter_log_records, QUERYLOG_BACKEND
+    from querylog_fields import resolve_backend
+    backend = resolve_backend(QUERYLOG_BACKEND)
+    for log_file in sorted(glob.glob(os.path.join(logs_dir, "querylog*.json"))):
+        for fields in iter_log_records(log_file, backend=backend):
+            if fields is not None and fields[0]:
+                yield fields[0]
+
+def replay(matcher: RuleMatcher, hostnames: Iterable[str], top: int = 10):
+    """统计一批主机名的拦截情况并打印摘要，返回统计字典"""
+    start = time.perf_counter()
+    misses = matcher.cache_misses
+    verdicts = Counter()
+    blocked_rules = Counter()
+    total = 0
+    for _, result in matcher.classify_many(hostnames):
+        total += 1
+        verdicts[result.verdict] += 1
+        if result.verdict == BLOCKED:
+            blocked_rules[result.rule] += 1
+    elapsed = time.perf_counter() - start
+    summary = {
+        "queries": total,
+        "matched_hosts": matcher.cache_misses - misses,
+        "blocked": verdicts[BLOCKED],
+        "allowed": verdicts[ALLOWED],
+        "not_matched": verdicts[NOT_MATCHED],
+        "seconds": round(elapsed, 3),
+        "top_rules": blocked_rules.most_common(top),
+    }
+    rate = total / elapsed if elapsed > 0 else 0.0
+    print(f"共 {total} 次查询（实际匹配 {summary['matched_hosts']} 个主机名，其余命中缓存），拦截 {summary['blocked']}，"
+          f"白名单放行 {summary['allowed']}，未匹配 {summary['not_matched']}")
+    if total:
+        print(f"拦截率 {summary['blocked'] / total:.2%}，耗时 {elapsed:.2f} 秒（{rate:,.0f} 条/秒）")
+    for rule, count in summary["top_rules"]:
+        print(f"  {count:>8}  {rule}")
+    return summary
+
+def _argv_values(flag: str) -> List[str]:
+    """取出所有 flag 后的参数值（可重复出现）"""
+    return [sys.argv[i + 1] for i, arg in enumerate(sys.argv[:-1]) if arg == flag]
+
+if __name__ == "__main__":
+    rule_files = _argv_values("--rules") or [BLACK_FILE]
+    logs_dir = (_argv_values("--logs-dir") or [LOGS_DIR])[-1]
+    top = 10
+    if "--top" in sys.argv:
+        try:
+            top = int(sys.argv[sys.argv.index("--top") + 1])
+        except (IndexError, ValueError):
+            print("--top 参数无效，使用默认值 10")
+    valued = {"--rules", "--logs-dir", "--top"}
+    hostnames = [arg for i, arg in enumerate(sys.argv[1:], 1)
+                 if not arg.startswith("--") and sys.argv[i - 1] not in valued]
+
+    missing = [path for path in rule_files if not os.path.exists(path)]
+    if missing:
+        print(f"规则文件不存在: {', '.join(missing)}")
+        sys.exit(1)
+    load_start = time.perf_counter()
+    matcher = load_matcher(rule_files)[0]
+    stats = matcher.stats()
+    print(f"已加载规则: 域名 {stats['domain_keys'] + stats['hosts_keys']} 个，正则/通配 "
+          f"{stats['regex_indexed'] + stats['regex_batched']} 条（字面预筛选 {stats['regex_indexed']} 条，"
+          f"其余 {stats['regex_batches']} 批），跳过条件修饰符规则 {stats.get('unsupported', 0)} 条，"
+          f"耗时 {time.perf_counter() - load_start:.2f} 秒")
+
+    if "--querylog" in sys.argv:
+        replay(matcher, iter_querylog_hosts(logs_dir), top)
+    elif hostnames:
+        for hostname, result in matcher.classify_many(hostnames):
+            print(f"{hostname}\t{result.verdict}\t{result.rule or ''}")
+    else:
+        replay(matcher, (line.strip() for line in sys.stdin if line.strip()), top)
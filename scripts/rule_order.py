@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""规则输出顺序：一次排序产出最终顺序，不再先升序排序再整表倒序
+
+可选顺序：
+- reverse-lexical：按规则文本降序（原有输出顺序，默认）；
+- lexical：按规则文本升序；
+- hits：按 domain name.txt 的查询次数降序，规则的次数为其域名及所有子域名的次数之和，热门规则位于文件顶部；
+- domain：按反向域名分组（com.example、com.example.ads ...），同一站点的规则相邻，新增或删除规则时差异集中。
+hits 与 domain 中次数相同、域名相同的规则再按反向域名与规则文本排序，输出顺序稳定。
+"""
+
+import re
+from typing import Dict, Iterable, List, Mapping, Optional
+from domain_index import iter_domain_suffixes
+
+ORDER_MODES = ("reverse-lexical", "lexical", "hits", "domain")
+DEFAULT_ORDER = "reverse-lexical"
+
+# 规则中的域名部分：去掉 @@、|、||、协议与开头的 * . - 后，到 ^ / $ : | * 为止
+_RULE_DOMAIN_RE = re.compile(r'^(?:@@)?\|{0,2}(?:[a-z][a-z0-9+.-]*://)?[*.-]*([^\^/$:|*\s]+)', re.IGNORECASE)
+
+def rule_domain(rule: str) -> str:
+    """提取规则的域名（小写），正则规则等没有域名的返回空字符串"""
+    match = _RULE_DOMAIN_RE.match(rule)
+    return match.group(1).lower() if match else ""
+
+def reversed_domain(domain: str) -> str:
+    """按标签反转域名：ads.example.com -> com.example.ads"""
+    return ".".join(reversed(domain.split(".")))
+
+def count_rule_hits(rule_domains: Iterable[str], domain_counts: Mapping[str, int]) -> Dict[str, int]:
+    """统计每个规则域名覆盖的查询次数（自身与所有子域名之和），只为出现在规则中的域名建表"""
+    hits = dict.fromkeys(rule_domains, 0)
+    for domain, count in domain_counts.items():
+        for suffix in iter_domain_suffixes(domain):
+            if suffix in hits:
+                hits[suffix] += count
+    return hits
+
+def order_rules(rules: Iterable[str], mode: str = DEFAULT_ORDER,
+                domain_counts: Optional[Mapping[str, int]] = None) -> List[str]:
+    """按 mode 对规则排序并返回新列表；hits 模式需要 domain_counts（域名 -> 查询次数）"""
+    if mode not in ORDER_MODES:
+        raise ValueError(f"未知的规则输出顺序: {mode}（可选: {', '.join(ORDER_MODES)}）")
+    if mode == "reverse-lexical":
+        return sorted(rules, reverse=True)
+    if mode == "lexical":
+        return sorted(rules)
+    domains = {rule: rule_domain(rule) for rule in rules}
+    if mode == "domain":
+        return sorted(domains, key=lambda rule: (reversed_domain(domains[rule]), rule))
+    hits = count_rule_hits(set(domains.values()), domain_counts or {})
+    return sorted(domains, key=lambda rule: (-hits[domains[rule]], reversed_domain(domains[rule]), rule))
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""本地规则文件的映射读取：Black.txt、White.txt 等在字节层面删去注释行，只解码保留下来的内容
+
+- 文件整体 mmap，按 BLOCK_SIZE 切成以换行结尾的 memoryview 块，不读入整份文件、也不先切成全部行的列表；
+  处理过的页随即交还内核，多百万行的规则文件读取时常驻内存基本只有结果列表本身；
+- 每块先用字节正则删去以注释字符开头的行（注释不解码、不产生任何对象），剩余内容整块解码、按行切分；
+- 解码后仍按文本规则复核：去掉首尾空白与 BOM、丢弃空行与去掉行首空白后以注释字符开头的行
+  （行首带空白的注释、Unicode 空白、BOM 与无效字节只有解码后才能确定），结果与按文本逐行 strip 后过滤完全一致。
+逐行切片在 Python 层的开销远大于解码本身，这里以块为单位交给 C 层完成，每行只产生最终保留的字符串。
+"""
+
+import os
+import re
+import mmap
+from itertools import filterfalse
+from operator import methodcaller
+from typing import Iterator, List
+
+# 每块的大致字节数（块在其后第一个换行处结束）；块越大，解码与切分的临时对象越多
+BLOCK_SIZE = 256 * 1024
+BOM = "\ufeff"
+
+# 注释字符集合 -> 编译后的删除正则
+_COMMENT_PATTERNS = {}
+
+def _comment_pattern(comment_prefixes: str):
+    pattern = _COMMENT_PATTERNS.get(comment_prefixes)
+    if pattern is None:
+        chars = b"".join(re.escape(ch.encode("ascii")) for ch in comment_prefixes)
+        # 以换行符开头便于正则引擎直接跳到下一个换行；行首即为注释字符的行连同其前的换行一起删去
+        pattern = re.compile(rb"\n[" + chars + rb"][^\r\n]*")
+        _COMMENT_PATTERNS[comment_prefixes] = pattern
+    return pattern
+
+def iter_blocks(path: str, block_size: int = None) -> Iterator[memoryview]:
+    """映射读取 path，逐块产出以换行结尾（最后一块除外）的 memoryview 切片；空文件不产出
+
+    切片只在下一次迭代前有效，调用方需要保留内容时应自行复制。
+    """
+    block_size = block_size or BLOCK_SIZE
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    # 只读映射的页可随时丢弃，需要时内核会从文件重新读入（Windows 等平台没有 madvise）
+    release = getattr(mapped, "madvise", None) if hasattr(mmap, "MADV_DONTNEED") else None
+    with mapped, memoryview(mapped) as view:
+        size = len(mapped)
+        start = released = 0
+        while start < size:
+            end = mapped.find(b"\n", min(start + block_size, size) - 1)
+            end = size if end < 0 else end + 1
+            with view[start:end] as block:
+                yield block
+            start = end
+            boundary = end - end % mmap.PAGESIZE
+            if release is not None and boundary > released:
+                release(mmap.MADV_DONTNEED, released, boundary - released)
+                released = boundary
+
+def read_rule_lines(path: str, comment_prefixes: str = "", block_size: int = None) -> List[str]:
+    """读取规则文件，返回去掉首尾空白与 BOM 后非空、且不以 comment_prefixes 中字符开头的行
+
+    comment_prefixes 为 ASCII 注释字符（如 "!#"）；这些字符开头的行在字节层面删去，不解码。
+    """
+    pattern = _comment_pattern(comment_prefixes) if comment_prefixes else None
+    is_comment = methodcaller("startswith", tuple(comment_prefixes))
+    rules = []
+    for block in iter_blocks(path, block_size):
+        # 每块首行前没有换行，不在正则删除之列，由下面的文本复核过滤
+        data = pattern.sub(b"", block) if pattern is not None else block
+        text = str(data, "utf-8", "ignore")
+        if "\r" in text:
+            # 与文本模式的通用换行一致：只有 \r\n、\r、\n 是换行（str.splitlines 还会在 \x0b、\x85 等处切分）
+            text = text.replace("\r\n", "\n").replace("\r", "\n")
+        lines = filter(None, map(str.strip, text.split("\n")))
+        if BOM in text:
+            # 少见：BOM 去掉后才能判断是否为空行或注释
+            lines = filter(None, (line.lstrip(BOM) for line in lines))
+        rules.extend(filterfalse(is_comment, lines) if comment_prefixes else lines)
+    return rules
@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""合并规则的二进制快照：后续阶段映射读取解析结果，不再逐行重新解析 Black.txt
+
+合并脚本写出 Black.txt 后，把其中的规则连同解析结果写入 scripts/cache/Black.snapshot（不入库）：
+- 字符串表：规则文本按文件顺序以换行拼接（规则本身不含换行），整块解码后按换行切分即得规则列表；
+- 匹配键表：与规则一一对应，hosts / 纯域名规则与 ||domain^ 规则为小写域名（即域名索引，可直接放入精确或后缀哈希表），
+  通配与 /正则/ 规则为转换后的正则，条件修饰符规则为模式部分；
+- 字面串表：通配与正则规则中一定出现的字面串（规则匹配据此预筛选），其余规则为空；
+- 规则标志：每条规则一个字节，低 2 位为匹配优先级，其后 2 位为类别（见 KIND_*），再往后为 FLAG_* 标志位。
+解析结果由 rule_matcher.classify_rule 给出，规则匹配加载快照时不再解析规则、转换正则。
+文件头记录生成快照时 Black.txt 的字节数、SHA-256 与脚本版本，读取时与当前文件及脚本比对：Black.txt 被改动、
+解析逻辑有变化、快照过期或缺失时 open_snapshot 返回 None，调用方回退到解析文本。
+
+布局：文件头 HEADER（小端）| 规则标志（每条 1 字节）| 字符串表 | 匹配键表 | 字面串表
+"""
+
+import os
+import mmap
+import struct
+from typing import List, Optional
+import input_fingerprint
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SNAPSHOT_FILE = os.path.join(REPO_ROOT, "scripts", "cache", "Black.snapshot")
+
+MAGIC = b"AGRSNAP\0"
+# 格式变化时递增，旧快照随之失效
+VERSION = 1
+# 魔数、版本、源文件字节数、源文件 SHA-256、脚本版本、规则数、字符串表 / 匹配键表 / 字面串表字节数
+HEADER = struct.Struct("<8sIQ32s32sIIII")
+
+# 规则类别（标志字节的第 2、3 位）
+KIND_PATTERN = 0  # 通配或 /正则/ 规则，匹配键为模式部分
+KIND_EXACT = 1    # hosts 与纯域名规则，只匹配域名本身
+KIND_SUFFIX = 2   # ||domain^ 规则，匹配域名及其子域
+KIND_SKIP = 3     # 带条件修饰符（离线无法判断）或格式不完整的规则
+KIND_SHIFT = 2
+KIND_MASK = 3 << KIND_SHIFT
+# 其余标志位
+FLAG_REGEX = 1 << 4      # /正则/ 规则
+FLAG_PIPE = 1 << 5       # 以 | 开头（精简脚本按域名筛选的规则）
+FLAG_EXCEPTION = 1 << 6  # 以 @ 开头（白名单规则，精简脚本不取）
+FLAG_INVALID = 1 << 7    # 格式不完整的正则（KIND_SKIP）
+
+def rule_flags(kind: int, tier: int, text: str, is_regex: bool = False, invalid: bool = False) -> int:
+    """组合规则的标志字节"""
+    flags = tier | kind << KIND_SHIFT
+    if is_regex:
+        flags |= FLAG_REGEX
+    if invalid:
+        flags |= FLAG_INVALID
+    if text.startswith("|"):
+        flags |= FLAG_PIPE
+    elif text.startswith("@"):
+        flags |= FLAG_EXCEPTION
+    return flags
+
+def select_flags(flags, predicate) -> bytes:
+    """按标志字节逐条给出 0/1 选择序列（可交给 itertools.compress）；bytes.translate 在 C 层完成，不逐条调用 predicate"""
+    return bytes(flags).translate(bytes(1 if predicate(value) else 0 for value in range(256)))
+
+def write_snapshot(rules, source_file: str, path: str = None) -> int:
+    """解析 rules（source_file 中的规则，按文件顺序）写出快照，返回写入的规则数
+
+    注释与空行不写入。source_file 须已写出完毕，快照记录其当前的字节数与 SHA-256。
+    """
+    # rule_matcher 依赖合并脚本的规则解析，合并脚本又依赖本模块，这里延迟导入
+    from rule_matcher import classify_rule
+    path = path or SNAPSHOT_FILE
+    flags = bytearray()
+    columns = ([], [], [])
+    for rule in rules:
+        entry = classify_rule(rule)
+        if entry is None:
+            continue
+        flags.append(entry[0])
+        for column, value in zip(columns, entry[1:]):
+            column.append(value)
+    blobs = ["\n".join(column).encode("utf-8", "surrogatepass") for column in columns]
+    header = HEADER.pack(MAGIC, VERSION, os.path.getsize(source_file),
+                         bytes.fromhex(input_fingerprint.file_digest(source_file)),
+                         bytes.fromhex(input_fingerprint.script_version()), len(flags), *(len(blob) for blob in blobs))
+
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp_path = path + ".tmp"
+    try:
+        with open(tmp_path, "wb") as f:
+            f.write(header)
+            f.write(flags)
+            for blob in blobs:
+                f.write(blob)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return len(flags)
+
+class RuleSnapshot:
+    """映射读取的快照；flags 为标志字节的只读视图，rules() / keys() / literals() 整块解码对应的字符串表"""
+
+    def __init__(self, path: str):
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            if len(self._mmap) < HEADER.size:
+                raise ValueError("快照文件不完整")
+            magic, version, self.source_size, source_sha256, script_version, self.count, *sizes = \
+                HEADER.unpack_from(self._mmap)
+            if magic != MAGIC or version != VERSION:
+                raise ValueError("快照格式不匹配")
+            if len(self._mmap) != HEADER.size + self.count + sum(sizes):
+                raise ValueError("快照文件不完整")
+        except ValueError:
+            self._mmap.close()
+            raise
+        self.source_sha256 = source_sha256.hex()
+        self.script_version = script_version.hex()
+        view = memoryview(self._mmap)
+        start = HEADER.size
+        self.flags = view[start:start + self.count]
+        start += self.count
+        self._columns = []
+        for size in sizes:
+            self._columns.append(view[start:start + size])
+            start += size
+        self._view = view
+
+    def __len__(self):
+        return self.count
+
+    def _column(self, index) -> List[str]:
+        # 各列以换行分隔，空列表与只含一个空串的列表按规则数区分
+        return str(self._columns[index], "utf-8", "surrogatepass").split("\n") if self.count else []
+
+    def rules(self) -> List[str]:
+        """全部规则文本（按文件顺序）"""
+        return self._column(0)
+
+    def keys(self) -> List[str]:
+        """与 rules() 一一对应的匹配键"""
+        return self._column(1)
+
+    def literals(self) -> List[str]:
+        """与 rules() 一一对应的必含字面串"""
+        return self._column(2)
+
+    def close(self):
+        # 先释放全部视图，mmap 才能关闭
+        for view in (self.flags, *self._columns, self._view):
+            view.release()
+        self._mmap.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+def open_snapshot(source_file: str, path: str = None) -> Optional[RuleSnapshot]:
+    """打开与 source_file 当前内容一致的快照；快照不存在、已过期或无法读取时返回 None"""
+    path = path or SNAPSHOT_FILE
+    if not os.path.exists(path) or not os.path.exists(source_file):
+        return None
+    try:
+        snapshot = RuleSnapshot(path)
+    except (OSError, ValueError):
+        return None
+    try:
+        if (snapshot.source_size != os.path.getsize(source_file)
+                or snapshot.source_sha256 != input_fingerprint.file_digest(source_file)
+                or snapshot.script_version != input_fingerprint.script_version()):
+            snapshot.close()
+            return None
+    except OSError:
+        snapshot.close()
+        return None
+    return snapshot
+
+def ensure_snapshot(source_file: str, path: str = None) -> bool:
+    """快照与 source_file 不一致时按文件内容重新生成；返回是否重新生成"""
+    snapshot = open_snapshot(source_file, path)
+    if snapshot is not None:
+        snapshot.close()
+        return False
+    with open(source_file, "r", encoding="utf-8-sig", errors="ignore") as f:
+        write_snapshot(f, source_file, path)
+    return True
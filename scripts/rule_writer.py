@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""规则文件的原子写出：Black.txt、White.txt、pure black.txt 共用
+
+- 规则按 WRITE_CHUNK_LINES 行拼接、编码成大块，不再逐行 write，每块编码后立即写入临时文件，不在内存中保留整份输出；
+- 遍历规则时同时统计各部分的非空行数与内容的 SHA-256，文件头里的规则数不必再单独数一遍；
+- 文件头取决于规则数，规则先写入同目录下的临时文件，内容与上次相同时直接删除；否则写出文件头后
+  把规则分块复制到其后，fsync 后再原子替换目标文件，中途崩溃或超时只会留下旧文件，不会留下半截文件。
+"""
+
+import os
+import codecs
+import shutil
+import hashlib
+
+# 每次拼接写出的规则行数
+WRITE_CHUNK_LINES = 65536
+# 把规则复制到文件头之后时每次读写的字节数
+COPY_BUFFER_BYTES = 1024 * 1024
+
+def _fsync_dir(path):
+    """把目录项的更新落盘（不支持的平台上忽略）"""
+    try:
+        fd = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+def write_rule_file(path, sections, header=None, bom=True, unchanged_sha256=None):
+    """把若干部分规则（如黑名单、白名单）依次写入 path，跳过空行
+
+    header 为可调用对象，接收各部分的非空规则数列表，返回文件头各行（不含换行符），写在规则之前；
+    bom=True 时与原有文件一样以 UTF-8 BOM 开头。
+    unchanged_sha256 为上次写出的规则内容哈希：本次内容相同且文件存在时不改写文件（文件头的更新时间也保持不变）。
+    返回 {"counts": 各部分规则数, "sha256": 规则内容（不含文件头）的 SHA-256, "bytes": 文件字节数, "skipped": 是否未改写}。
+    """
+    body_path = path + ".body.tmp"
+    tmp_path = path + ".tmp"
+    try:
+        with open(body_path, "wb") as body:
+            counts, sha256, body_size = _write_sections(body, sections)
+        if unchanged_sha256 is not None and sha256 == unchanged_sha256 and os.path.exists(path):
+            return {"counts": counts, "sha256": sha256, "bytes": os.path.getsize(path), "skipped": True}
+
+        head = b""
+        if header is not None:
+            head = "".join(line + "\n" for line in header(counts)).encode("utf-8")
+        if bom:
+            head = codecs.BOM_UTF8 + head
+        with open(tmp_path, "wb") as f:
+            f.write(head)
+            with open(body_path, "rb") as body:
+                shutil.copyfileobj(body, f, COPY_BUFFER_BYTES)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    finally:
+        for leftover in (body_path, tmp_path):
+            if os.path.exists(leftover):
+                os.remove(leftover)
+    _fsync_dir(path)
+    return {"counts": counts, "sha256": sha256, "bytes": len(head) + body_size, "skipped": False}
+
+def _write_sections(f, sections):
+    """把各部分的非空规则分块写入 f，返回 (各部分规则数, 内容 SHA-256, 写入字节数)"""
+    counts = []
+    digest = hashlib.sha256()
+    size = 0
+    for rules in sections:
+        count = 0
+        batch = []
+        for rule in rules:
+            if str(rule).strip():
+                batch.append(rule)
+                if len(batch) >= WRITE_CHUNK_LINES:
+                    chunk = ("\n".join(batch) + "\n").encode("utf-8")
+                    f.write(chunk)
+                    digest.update(chunk)
+                    size += len(chunk)
+                    count += len(batch)
+                    batch = []
+        if batch:
+            chunk = ("\n".join(batch) + "\n").encode("utf-8")
+            f.write(chunk)
+            digest.update(chunk)
+            size += len(chunk)
+            count += len(batch)
+        counts.append(count)
+    return counts, digest.hexdigest(), size
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""在同一进程中依次运行 规则合并 -> 域名聚合 -> 规则精简
+
+分别运行三个脚本时，精简脚本要重新读取并解析合并脚本刚写出的 Black.txt / White.txt，
+还会再下载一次合并脚本已经获取过的秋风规则与 GitHub520 hosts。
+这里把合并结果（规则列表与各源的下载结果）直接交给精简脚本，省去重复的读取、解析与网络请求；
+三个脚本仍可单独运行。复用的规则源已经过合并脚本的清洗（包括去掉 "规则  # 注释" 形式的行内注释），
+除这类行外，输出与分别运行时一致。
+
+用法:
+    python scripts/run_pipeline.py [--timestamp "YYYY-MM-DD HH:MM:SS"] [--offline] [--no-white-file] [--force]
+                                    [--drop-unhit-days N [--drop-unhit-max-percent P] [--drop-unhit-dry-run]]
+
+合并与精简两步在输入未变化时各自跳过（见 input_fingerprint.py），--force 强制全部重新生成。
+"""
+
+import sys
+import time
+import adguard_rules_merger
+import aggregate_domains
+from adguard_rules_simplifier import AdGuardRulesSimplifier
+
+def run_pipeline(override_time: str = None, offline=False, generate_white_file=True, force=False,
+                 drop_unhit_days: int = None, drop_unhit_dry_run=False, drop_unhit_max_ratio: float = None):
+    """运行完整流水线；各脚本仍各自写出性能指标文件
+
+    drop_unhit_days 同时传给合并与精简两步，删除最近 N 天没有命中的黑名单规则（见 rule_hits.py）；
+    drop_unhit_dry_run / drop_unhit_max_ratio 分别为只报告不删除、单次删除比例上限。
+    """
+    start = time.perf_counter()
+    print("=== 1/3 规则合并 ===")
+    merged = adguard_rules_merger.main(generate_white_file, override_time, offline, force=force,
+                                      drop_unhit_days=drop_unhit_days, drop_unhit_dry_run=drop_unhit_dry_run,
+                                      drop_unhit_max_ratio=drop_unhit_max_ratio)
+
+    print("\n=== 2/3 域名聚合 ===")
+    aggregate_domains.main()
+
+    print("\n=== 3/3 规则精简 ===")
+    simplifier = AdGuardRulesSimplifier()
+    simplifier.force = force
+    simplifier.drop_unhit_days = drop_unhit_days
+    simplifier.drop_unhit_dry_run = drop_unhit_dry_run
+    simplifier.drop_unhit_max_ratio = drop_unhit_max_ratio
+    inputs = {
+        # 秋风规则与 GitHub520 hosts 同时也是合并脚本的规则源，直接复用其下载结果
+        "source_rules": adguard_rules_merger.source_rules_by_url(
+            merged["sources"], (simplifier.autumn_url, simplifier.github_url)),
+    }
+    # 合并脚本跳过处理时没有内存中的结果，由精简脚本读取未变化的 Black.txt / White.txt
+    if not merged["skipped"]:
+        inputs["black_rules"] = merged["blacklist"]
+        if merged["white_file"]:
+            inputs["whitelist_rules"] = merged["whitelist"]
+    # 更新时间与 Black.txt 头部一致：合并脚本写出了 Black.txt 时直接使用其更新时间；
+    # 跳过处理时 Black.txt 保留原来的头部，传 None 由精简脚本从头部读取，避免未变化的运行改写时间
+    simplifier.run(None if merged["skipped"] else merged["updated_time"], inputs=inputs)
+
+    print(f"\n流水线完成，总耗时 {time.perf_counter() - start:.2f} 秒")
+
+if __name__ == "__main__":
+    override_time = None
+    if "--timestamp" in sys.argv:
+        try:
+            override_time = sys.argv[sys.argv.index("--timestamp") + 1]
+        except IndexError:
+            pass
+    # --offline：合并脚本只使用 scripts/cache 中的源缓存
+    # --no-white-file：不生成 White.txt（精简脚本也不追加白名单）
+    # --drop-unhit-days N：删除最近 N 天没有命中的黑名单规则
+    drop_unhit_days = None
+    if "--drop-unhit-days" in sys.argv:
+        try:
+            drop_unhit_days = int(sys.argv[sys.argv.index("--drop-unhit-days") + 1])
+        except (IndexError, ValueError):
+            pass
+    # --drop-unhit-max-percent P：待删除的规则超过 P% 时不删除；--drop-unhit-dry-run：只报告不删除
+    drop_unhit_max_ratio = None
+    if "--drop-unhit-max-percent" in sys.argv:
+        try:
+            drop_unhit_max_ratio = float(sys.argv[sys.argv.index("--drop-unhit-max-percent") + 1]) / 100
+        except (IndexError, ValueError):
+            pass
+    # --force：输入未变化时也重新生成
+    run_pipeline(override_time, offline="--offline" in sys.argv,
+                 generate_white_file="--no-white-file" not in sys.argv, force="--force" in sys.argv,
+                 drop_unhit_days=drop_unhit_days, drop_unhit_dry_run="--drop-unhit-dry-run" in sys.argv,
+                 drop_unhit_max_ratio=drop_unhit_max_ratio)